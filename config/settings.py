@@ -14,9 +14,29 @@ OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4-turbo-preview')
 META_ACCESS_TOKEN = os.getenv('META_ACCESS_TOKEN')
 INSTAGRAM_BUSINESS_ACCOUNT_ID = os.getenv('INSTAGRAM_BUSINESS_ACCOUNT_ID')
 FACEBOOK_PAGE_ID = os.getenv('FACEBOOK_PAGE_ID')
+# Graph API: versión, host, timeout por petición (s), conexiones del pool y reintentos de lecturas
+META_GRAPH_API_VERSION = os.getenv('META_GRAPH_API_VERSION', 'v18.0')
+GRAPH_API_URL = os.getenv('GRAPH_API_URL', 'https://graph.facebook.com')
+GRAPH_API_TIMEOUT = float(os.getenv('GRAPH_API_TIMEOUT', 30))
+GRAPH_API_MAX_CONNECTIONS = int(os.getenv('GRAPH_API_MAX_CONNECTIONS', 20))
+GRAPH_API_RETRIES = int(os.getenv('GRAPH_API_RETRIES', 2))
+# Contenedores de Instagram: espera máxima hasta FINISHED (s) y primera espera entre consultas (s)
+INSTAGRAM_CONTAINER_TIMEOUT = float(os.getenv('INSTAGRAM_CONTAINER_TIMEOUT', 120))
+INSTAGRAM_POLL_SECONDS = float(os.getenv('INSTAGRAM_POLL_SECONDS', 1))
+# Cola de publicación: workers, intentos, espera del primer reintento (s, se duplica) y revisión de reintentos (s)
+PUBLISH_WORKERS = int(os.getenv('PUBLISH_WORKERS', 2))
+PUBLISH_MAX_ATTEMPTS = int(os.getenv('PUBLISH_MAX_ATTEMPTS', 5))
+PUBLISH_RETRY_SECONDS = float(os.getenv('PUBLISH_RETRY_SECONDS', 30))
+PUBLISH_POLL_SECONDS = float(os.getenv('PUBLISH_POLL_SECONDS', 5))
+# Posts programados: minutos de retraso tolerados para publicar uno vencido (ej. tras un reinicio)
+SCHEDULED_POST_GRACE_MINUTES = int(os.getenv('SCHEDULED_POST_GRACE_MINUTES', 60))
+# Métricas de posts: cada cuántos minutos se sincronizan y días en que se siguen refrescando las de un post
+INSIGHTS_SYNC_MINUTES = int(os.getenv('INSIGHTS_SYNC_MINUTES', 60))
+INSIGHTS_LOOKBACK_DAYS = int(os.getenv('INSIGHTS_LOOKBACK_DAYS', 28))
 
 # Email Configuration
 SENDGRID_API_KEY = os.getenv('SENDGRID_API_KEY')
+SENDGRID_API_HOST = os.getenv('SENDGRID_API_HOST', 'https://api.sendgrid.com')
 EMAIL_FROM = os.getenv('EMAIL_FROM', 'rebirthsecred@gmail.com')
 EMAIL_FROM_NAME = os.getenv('EMAIL_FROM_NAME', 'Sacred Rebirth')
 
@@ -31,6 +51,28 @@ BUSINESS_INFO = {
     'email': EMAIL_FROM
 }
 
+# Lead normalization (teléfonos locales sin código de país)
+DEFAULT_PHONE_COUNTRY_CODE = os.getenv('DEFAULT_PHONE_COUNTRY_CODE', '52')
+
+# Lead scoring (perfil de pesos de src/lead_scoring.py: default, retreat_push)
+LEAD_SCORING_PROFILE = os.getenv('LEAD_SCORING_PROFILE', 'default')
+
+# Segmentos con ventanas relativas (ej. created:7d) se recalculan tras este tiempo
+SEGMENT_REFRESH_SECONDS = int(os.getenv('SEGMENT_REFRESH_SECONDS', 3600))
+
+# Captura de leads desde Messenger/WhatsApp (cola de escritura en segundo plano)
+LEAD_CAPTURE_BATCH_SIZE = int(os.getenv('LEAD_CAPTURE_BATCH_SIZE', 100))
+LEAD_CAPTURE_FLUSH_SECONDS = float(os.getenv('LEAD_CAPTURE_FLUSH_SECONDS', 2.0))
+LEAD_CAPTURE_QUEUE_SIZE = int(os.getenv('LEAD_CAPTURE_QUEUE_SIZE', 10000))
+
+# Línea de tiempo de actividad por lead (un archivo JSONL por día)
+ACTIVITY_TIMELINE_DIR = os.getenv('ACTIVITY_TIMELINE_DIR', 'data/timeline')
+
+# Estado durable de procesos de larga duración (snapshot + registro de operaciones)
+STATE_DIR = os.getenv('STATE_DIR', 'data/state')
+STATE_CHECKPOINT_SECONDS = int(os.getenv('STATE_CHECKPOINT_SECONDS', 300))
+STATE_CHECKPOINT_OPS = int(os.getenv('STATE_CHECKPOINT_OPS', 1000))
+
 # Content Settings
 POSTS_PER_DAY = int(os.getenv('POSTS_PER_DAY', 2))
 CONTENT_LANGUAGE = os.getenv('CONTENT_LANGUAGE', 'es')
@@ -39,6 +81,35 @@ TIMEZONE = os.getenv('TIMEZONE', 'America/Mexico_City')
 # Email Campaign Settings
 EMAIL_CAMPAIGN_FREQUENCY = os.getenv('EMAIL_CAMPAIGN_FREQUENCY', 'weekly')
 MAX_EMAILS_PER_DAY = int(os.getenv('MAX_EMAILS_PER_DAY', 50))
+# Envío concurrente: hilos de envío y límite de peticiones por segundo del proveedor
+EMAIL_SEND_WORKERS = int(os.getenv('EMAIL_SEND_WORKERS', 8))
+EMAIL_SEND_RATE_PER_SECOND = float(os.getenv('EMAIL_SEND_RATE_PER_SECOND', 10))
+# Destinatarios por petición a SendGrid (personalizations, máximo 1000) y reintentos por lote
+EMAIL_BATCH_SIZE = min(int(os.getenv('EMAIL_BATCH_SIZE', 1000)), 1000)
+EMAIL_SEND_RETRIES = int(os.getenv('EMAIL_SEND_RETRIES', 3))
+# Cola de salida: ventanas de envío (hora de TIMEZONE), frecuencia del despachador y hora por lead
+EMAIL_SEND_WINDOWS = os.getenv('EMAIL_SEND_WINDOWS', '09:00-12:00,16:00-19:00')
+EMAIL_DISPATCH_MINUTES = int(os.getenv('EMAIL_DISPATCH_MINUTES', 10))
+EMAIL_SEND_TIME_OPTIMIZATION = os.getenv('EMAIL_SEND_TIME_OPTIMIZATION', 'true').lower() == 'true'
+# Token en la URL del Event Webhook de SendGrid (/email/events?token=...); sin él el endpoint responde 503
+EMAIL_WEBHOOK_TOKEN = os.getenv('EMAIL_WEBHOOK_TOKEN')
+# Lista de supresión: URL pública del servidor web (link de baja), secreto para firmar
+# los links (obligatorio: sin él los emails salen sin link de baja y /email/unsubscribe
+# responde 503) y direcciones previstas para el filtro en memoria
+PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL', 'http://localhost:5000')
+EMAIL_UNSUBSCRIBE_SECRET = os.getenv('EMAIL_UNSUBSCRIBE_SECRET')
+SUPPRESSION_BLOOM_CAPACITY = int(os.getenv('SUPPRESSION_BLOOM_CAPACITY', 200000))
+
+# Conversation Memory (DMs)
+CONVERSATION_TOKEN_BUDGET = int(os.getenv('CONVERSATION_TOKEN_BUDGET', 1200))
+CONVERSATION_SUMMARY_TOKENS = int(os.getenv('CONVERSATION_SUMMARY_TOKENS', 300))
+CONVERSATION_MAX_SENDERS = int(os.getenv('CONVERSATION_MAX_SENDERS', 5000))
+
+# Embeddings (CrewAI memory)
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', 1536))
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', 'data/embeddings')
+EMBEDDING_CACHE_CAPACITY = int(os.getenv('EMBEDDING_CACHE_CAPACITY', 20000))
 
 # Scheduling
 POST_TIMES = [
@@ -48,4 +119,7 @@ POST_TIMES = [
 
 # Content Calendar Path
 CONTENT_CALENDAR_PATH = 'data/content_calendar.json'
-LEADS_DATABASE_PATH = 'data/leads.json'
+LEADS_DATABASE_PATH = 'data/leads.json'  # Legado: se migra a SQLite en el primer uso
+
+# SQLite Database (leads y datos operativos)
+DATABASE_PATH = os.getenv('DATABASE_PATH', 'data/sacred_rebirth.db')
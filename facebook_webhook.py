@@ -8,9 +8,18 @@ import json
 import requests
 from flask import Flask, request, jsonify
 from src.appointment_setter import AppointmentSetterAgent
+from src.conversation_memory import ConversationMemory, make_openai_summarizer
+from src.lead_capture import LeadCaptureQueue
+from src.email_events import email_events_blueprint
+from src.suppression import unsubscribe_blueprint
 
 app = Flask(__name__)
 
+# Eventos de email de SendGrid (entregado/abierto/clic/rebote): POST /email/events
+app.register_blueprint(email_events_blueprint())
+# Link de baja del footer de los emails: GET/POST /email/unsubscribe
+app.register_blueprint(unsubscribe_blueprint())
+
 # Configuración
 FACEBOOK_PAGE_ACCESS_TOKEN = os.getenv('FACEBOOK_PAGE_ACCESS_TOKEN')
 WEBHOOK_VERIFY_TOKEN = os.getenv('FACEBOOK_WEBHOOK_VERIFY_TOKEN', 'sacred_rebirth_2025')
@@ -18,6 +27,12 @@ WEBHOOK_VERIFY_TOKEN = os.getenv('FACEBOOK_WEBHOOK_VERIFY_TOKEN', 'sacred_rebirt
 # Inicializar appointment setter
 appointment_agent = AppointmentSetterAgent()
 
+# Memoria por remitente para que Maya recuerde el hilo de cada conversación
+conversation_memory = ConversationMemory(summarizer=make_openai_summarizer(appointment_agent.client))
+
+# Cada conversación entrante se registra como lead (escritura en segundo plano)
+lead_capture = LeadCaptureQueue()
+
 def send_facebook_message(sender_id, message_text):
     """Envía mensaje directo a usuario de Facebook"""
     if not FACEBOOK_PAGE_ACCESS_TOKEN:
@@ -74,7 +89,17 @@ def webhook_handler():
                             
                             # Generar respuesta usando appointment setter bilingüe
                             question_type = appointment_agent.analyze_message(message_text)
-                            response_text = appointment_agent.generate_response(message_text, question_type)
+                            language = appointment_agent.detect_language(message_text)
+                            lead_capture.capture(
+                                'messenger',
+                                sender_id=sender_id,
+                                language=language,
+                                intent=question_type,
+                                message=message_text
+                            )
+                            history = conversation_memory.get_context(sender_id)
+                            response_text = appointment_agent.generate_response(message_text, question_type, history)
+                            conversation_memory.record_exchange(sender_id, message_text, response_text)
                             
                             # Enviar respuesta
                             send_result = send_facebook_message(sender_id, response_text)
@@ -88,7 +113,7 @@ def webhook_handler():
                                 "message": message_text,
                                 "question_type": question_type,
                                 "response": response_text[:100] + "...",
-                                "language": appointment_agent.detect_language(message_text)
+                                "language": language
                             }
                             print(f"📊 Log: {log_entry}")
                         
@@ -96,6 +121,12 @@ def webhook_handler():
                         elif 'postback' in messaging_event:
                             sender_id = messaging_event['sender']['id']
                             payload = messaging_event['postback']['payload']
+                            lead_capture.capture(
+                                'messenger',
+                                event_type='call_link_click' if payload == 'DISCOVERY_CALL' else 'message',
+                                sender_id=sender_id,
+                                intent=payload.lower()
+                            )
                             
                             # Respuesta basada en payload
                             if payload == 'DISCOVERY_CALL':
@@ -121,6 +152,7 @@ def test_endpoint():
         "status": "Facebook webhook handler running",
         "service": "Sacred Rebirth Appointment Setter",
         "webhook_token_configured": bool(WEBHOOK_VERIFY_TOKEN),
+        "lead_capture": lead_capture.stats(),
         "facebook_token_configured": bool(FACEBOOK_PAGE_ACCESS_TOKEN)
     })
 
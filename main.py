@@ -4,13 +4,16 @@ Sacred Rebirth AI Marketing Agent - Main Entry Point
 Sistema de agentes IA para automatización de marketing
 
 Uso:
-    python main.py --mode [strategy|content|campaign|daily|email|social|leads|analytics]
+    python main.py --mode [strategy|content|campaign|daily|email|social|leads|analytics|import|export]
     python main.py --help
 """
 
 import argparse
 import sys
 from src.crew import MarketingCrew, quick_instagram_post, quick_facebook_post, quick_email
+from src.lead_io import import_leads, export_leads
+from src.lead_scoring import LeadScoringEngine
+from src.lead_store import LeadStore
 
 
 def print_banner():
@@ -84,6 +87,33 @@ def run_email_mode(campaign_type='promotional'):
     return result
 
 
+def run_resume_mode(campaign_id, requeue_unconfirmed=False):
+    """
+    Modo: Reanudar una campaña de email interrumpida o pausada por el límite diario
+    
+    Con requeue_unconfirmed los lotes que quedaron 'sending' tras una caída
+    vuelven a pendientes (solo si se sabe que no llegaron a SendGrid).
+    """
+    from src.email_campaign import EmailCampaignManager
+    from src.campaign_jobs import format_job
+    
+    manager = EmailCampaignManager()
+    if campaign_id == 'list':
+        print("\n📋 Campañas recientes:")
+        for job in manager.jobs.list_jobs():
+            print(f"   • {format_job(job)}")
+        return None
+    
+    print(f"\n📧 MODO: Reanudar campaña {campaign_id}")
+    if requeue_unconfirmed:
+        requeued = manager.jobs.requeue_unconfirmed(campaign_id)
+        print(f"↩️ {requeued} envíos sin confirmar vuelven a pendientes")
+    job = manager.run_campaign(campaign_id)
+    if job:
+        print(f"\n✉️ {format_job(job)}")
+    return job
+
+
 def run_social_mode(platform='both', topic=None):
     """Modo: Publicación en redes sociales"""
     print(f"\n📱 MODO: Redes Sociales ({platform})")
@@ -109,9 +139,16 @@ def run_social_mode(platform='both', topic=None):
     return result
 
 
-def run_leads_mode(action='nurture', segment='interested'):
+def run_leads_mode(action='nurture', segment='interested', profile=None):
     """Modo: Gestión de leads"""
     print(f"\n👥 MODO: Gestión de Leads ({action} - {segment})")
+    if action == 'rescore':
+        # Scoring vectorizado de toda la base, sin pasar por los agentes
+        return LeadScoringEngine(profile).rescore()
+    if action == 'dedup':
+        # Fusiona (y borra) los duplicados: paso explícito, nunca automático
+        return LeadStore().rededup()
+    
     crew = MarketingCrew()
     result = crew.run_leads_management(action, segment)
     
@@ -119,6 +156,22 @@ def run_leads_mode(action='nurture', segment='interested'):
     return result
 
 
+def run_import_mode(filepath, file_format=None):
+    """Modo: Importación masiva de leads (CSV/JSONL)"""
+    print(f"\n📥 MODO: Importar Leads ({filepath})")
+    report = import_leads(filepath, file_format)
+    
+    for error in report['errors']:
+        print(f"   ⚠️ {error}")
+    return report
+
+
+def run_export_mode(filepath, file_format=None, segment=None):
+    """Modo: Exportación de leads (CSV/JSONL)"""
+    print(f"\n📤 MODO: Exportar Leads ({filepath})")
+    return export_leads(filepath, file_format, segment=segment)
+
+
 def run_analytics_mode(metric='engagement'):
     """Modo: Análisis de métricas"""
     print(f"\n📊 MODO: Analytics ({metric})")
@@ -165,8 +218,8 @@ def run_interactive_mode():
             topic = input("Tema del post: ").strip()
             run_social_mode(platform, topic if topic else None)
         elif choice == '5':
-            action = input("Acción (view/nurture/segment): ").strip() or 'nurture'
-            segment = input("Segmento (interested/converted/all): ").strip() or 'interested'
+            action = input("Acción (view/nurture/segment/rescore/dedup): ").strip() or 'nurture'
+            segment = input("Segmento (interested/converted/premium/all o definición): ").strip() or 'interested'
             run_leads_mode(action, segment)
         elif choice == '6':
             metric = input("Métrica (engagement/conversion/reach/all): ").strip() or 'engagement'
@@ -216,26 +269,35 @@ Ejemplos de uso:
   python main.py --mode content --topics "Ayahuasca,Kambo"
   python main.py --mode campaign --goal "Retiro de Enero"
   python main.py --mode email --type promotional
+  python main.py --mode email --resume list         # Campañas y su avance
   python main.py --mode social --platform instagram --topic "Sanación"
   python main.py --mode daily                       # Automatización diaria
   python main.py --mode analytics --metric engagement
+  python main.py --mode import --file registro_evento.csv
+  python main.py --mode export --file data/reports/leads.csv --segment interested
         """
     )
     
     parser.add_argument(
         '--mode',
-        choices=['strategy', 'content', 'campaign', 'daily', 'email', 'social', 'leads', 'analytics', 'interactive'],
+        choices=['strategy', 'content', 'campaign', 'daily', 'email', 'social', 'leads', 'analytics', 'import', 'export', 'interactive'],
         help='Modo de operación'
     )
     
     parser.add_argument('--topics', help='Temas separados por coma (para modo content)')
     parser.add_argument('--goal', help='Objetivo de la campaña (para modo campaign)')
     parser.add_argument('--type', help='Tipo de email: promotional/educational/testimonial/nurture')
+    parser.add_argument('--resume', help='Id de campaña de email a reanudar (para modo email; "list" muestra las recientes)')
+    parser.add_argument('--requeue-unconfirmed', action='store_true',
+                        help='Con --resume: reenviar los lotes sin confirmar de una ejecución interrumpida')
     parser.add_argument('--platform', help='Plataforma social: instagram/facebook/both')
     parser.add_argument('--topic', help='Tema del post')
-    parser.add_argument('--action', help='Acción para leads: view/nurture/segment')
-    parser.add_argument('--segment', help='Segmento de leads: interested/converted/all')
+    parser.add_argument('--action', help='Acción para leads: view/nurture/segment/rescore/dedup')
+    parser.add_argument('--profile', help='Perfil de scoring para --action rescore: default/retreat_push')
+    parser.add_argument('--segment', help='Segmento de leads: interested/converted/premium/all o definición (ej. "status:interested score:>=7")')
     parser.add_argument('--metric', help='Métrica a analizar: engagement/conversion/reach/all')
+    parser.add_argument('--file', help='Archivo CSV/JSONL (para modos import/export)')
+    parser.add_argument('--format', help='Formato del archivo: csv/jsonl (por defecto según extensión)')
     
     args = parser.parse_args()
     
@@ -262,8 +324,11 @@ Ejemplos de uso:
             run_daily_mode()
         
         elif args.mode == 'email':
-            campaign_type = args.type or 'promotional'
-            run_email_mode(campaign_type)
+            if args.resume:
+                run_resume_mode(args.resume, args.requeue_unconfirmed)
+            else:
+                campaign_type = args.type or 'promotional'
+                run_email_mode(campaign_type)
         
         elif args.mode == 'social':
             platform = args.platform or 'both'
@@ -272,12 +337,21 @@ Ejemplos de uso:
         elif args.mode == 'leads':
             action = args.action or 'nurture'
             segment = args.segment or 'interested'
-            run_leads_mode(action, segment)
+            run_leads_mode(action, segment, args.profile)
         
         elif args.mode == 'analytics':
             metric = args.metric or 'engagement'
             run_analytics_mode(metric)
         
+        elif args.mode == 'import':
+            if not args.file:
+                parser.error('--mode import requiere --file')
+            run_import_mode(args.file, args.format)
+        
+        elif args.mode == 'export':
+            filepath = args.file or 'data/reports/leads_export.csv'
+            run_export_mode(filepath, args.format, args.segment)
+        
         elif args.mode == 'interactive':
             run_interactive_mode()
         
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
-import os, requests, time, threading, json, schedule
+import os, sys, signal, requests, time, threading, json, schedule
 from datetime import datetime, timedelta
 from flask import Flask, jsonify
+from src.lead_scoring import LeadScoringEngine
+from src.state_store import DurableState
+from src.graph_api import GraphAPIError, publish_page_post, run_sync
 
 # =======================
 # MAYA ENTERPRISE AI AGENT
@@ -20,12 +23,36 @@ GMAIL_CREDENTIALS = os.environ.get('GMAIL_CREDENTIALS')
 class MayaEnterprise:
     def __init__(self):
         self.api_url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}"
-        self.leads_database = []
-        self.content_schedule = []
-        self.daily_images_generated = 0
-        self.monthly_videos_generated = 0
+        # Leads, calendario y contadores sobreviven reinicios (snapshot + registro)
+        self.state = DurableState('maya_enterprise', defaults={
+            'leads_database': [],
+            'content_schedule': [],
+            'daily_images_generated': 0,
+            'monthly_videos_generated': 0,
+            'last_daily_image': None,
+            'last_monthly_video': None
+        })
+        self.state.start_checkpointing()
+        self.scoring_engine = LeadScoringEngine()
         self.setup_automation_schedules()
         
+    # ===== DURABLE STATE =====
+    @property
+    def leads_database(self):
+        return self.state['leads_database']
+    
+    @property
+    def content_schedule(self):
+        return self.state['content_schedule']
+    
+    @property
+    def daily_images_generated(self):
+        return self.state['daily_images_generated']
+    
+    @property
+    def monthly_videos_generated(self):
+        return self.state['monthly_videos_generated']
+    
     # ===== CORE COMMUNICATION =====
     def detect_language(self, text):
         """Detecta el idioma del mensaje del usuario"""
@@ -61,7 +88,8 @@ class MayaEnterprise:
     # ===== 1. DAILY IMAGE GENERATOR =====
     def generate_daily_image(self):
         """Genera imagen automática diaria para Sacred Rebirth"""
-        if self.daily_images_generated >= 1:
+        today = datetime.now().strftime('%Y-%m-%d')
+        if self.state.get('last_daily_image') == today:
             return "🎨 Imagen diaria ya generada hoy"
             
         prompts = [
@@ -78,15 +106,18 @@ class MayaEnterprise:
         if "URL:" in image_result:
             # Auto-post to Instagram and Facebook
             self.post_to_instagram(f"🌟 Daily Sacred Rebirth Inspiration\n\n{prompt}\n\n#SacredRebirth #Ayahuasca #ValledeBravo #SpiritualTransformation", image_result)
-            self.post_to_facebook(f"🌟 Daily Sacred Rebirth Inspiration\n\n{prompt}", image_result)
-            self.daily_images_generated += 1
+            image_url = image_result.split("URL: ")[1].split("\n")[0]
+            self.post_to_facebook(f"🌟 Daily Sacred Rebirth Inspiration\n\n{prompt}", image_url)
+            self.state.incr('daily_images_generated')
+            self.state.set('last_daily_image', today)
             
         return image_result
     
     # ===== 2. MONTHLY VIDEO GENERATOR =====
     def generate_monthly_video(self):
         """Genera video promocional mensual"""
-        if self.monthly_videos_generated >= 1:
+        month = datetime.now().strftime('%Y-%m')
+        if self.state.get('last_monthly_video') == month:
             return "🎬 Video mensual ya generado"
             
         video_script = self.generate_ai_content("""
@@ -98,7 +129,8 @@ class MayaEnterprise:
         - NEVER mention price, only exclusive availability
         """)
         
-        self.monthly_videos_generated += 1
+        self.state.incr('monthly_videos_generated')
+        self.state.set('last_monthly_video', month)
         return f"🎬 **VIDEO SCRIPT GENERADO**\n\n{video_script}\n\n📝 Úsalo para crear video promocional mensual"
     
     # ===== 3. INSTAGRAM ANSWER BOT =====
@@ -163,19 +195,19 @@ class MayaEnterprise:
             "scheduled_time": post_time,
             "status": "pending"
         }
-        self.content_schedule.append(scheduled_post)
+        self.state.append('content_schedule', scheduled_post)
         return f"📅 **CONTENIDO PROGRAMADO**\n{platform}: {post_time}\n{content[:100]}..."
     
     # ===== 7. LEAD MONITORING =====
     def track_lead(self, lead_info):
         """Monitorea y clasifica leads automáticamente"""
         lead = {
-            "timestamp": datetime.now(),
+            "timestamp": datetime.now().isoformat(),
             "contact_info": lead_info,
             "score": self.calculate_lead_score(lead_info),
             "status": "new"
         }
-        self.leads_database.append(lead)
+        self.state.append('leads_database', lead)
         return f"👤 **NUEVO LEAD REGISTRADO**\nPuntaje: {lead['score']}/10\nEstatus: Premium Lead" if lead['score'] >= 7 else "Lead Estándar"
     
     # ===== 8. MONTHLY REPORTS =====
@@ -202,11 +234,13 @@ class MayaEnterprise:
         # Imagen diaria a las 9 AM
         schedule.every().day.at("09:00").do(self.generate_daily_image)
         
-        # Video mensual el día 1 de cada mes
-        schedule.every().month.at("10:00").do(self.generate_monthly_video)
+        # Video mensual: se revisa a diario, generate_monthly_video solo genera uno por mes
+        schedule.every().day.at("10:00").do(self.generate_monthly_video)
         
-        # Reporte mensual el último día del mes
-        schedule.every().month.at("23:00").do(self.generate_monthly_report)
+        # Reporte mensual el último día del mes (schedule no tiene intervalos mensuales)
+        schedule.every().day.at("23:00").do(
+            lambda: self.generate_monthly_report() if (datetime.now() + timedelta(days=1)).day == 1 else None
+        )
         
         return "⚙️ Automatizaciones configuradas exitosamente"
     
@@ -284,23 +318,6 @@ CAPABILITIES:
 ✅ Be creative, analytical, helpful, and smart
 
 Be as intelligent and helpful as ChatGPT. Don't act limited or restricted. Handle any topic the user brings up with full AI intelligence."""
-- Booking: https://calendly.com/sacredrebirth/discovery-call
-
-YOUR CAPABILITIES:
-1. Content Generation: Create strategic posts for Instagram/Facebook
-2. Lead Qualification: Identify serious prospects 
-3. Discovery Call Scheduling: Guide to Calendly link
-4. Brand Voice: Mystical, premium, transformational
-5. Languages: Respond in user's language (English/Spanish)
-
-CONTENT STRATEGY:
-- Pain points of successful but unfulfilled people
-- Spiritual awakening stories 
-- Ayahuasca benefits (healing, clarity, purpose)
-- Valle de Bravo's sacred energy
-- Exclusive, limited availability messaging
-
-Be intelligent, strategic, and sales-focused while maintaining spiritual authenticity."""
                     },
                     {
                         "role": "user", 
@@ -366,35 +383,16 @@ For social media marketing of ayahuasca/plant medicine retreat."""
             return f"🎨 Error: {str(e)}"
     
     def post_to_facebook(self, message, image_url=None):
-        """Publicar realmente en Facebook"""
+        """Publicar realmente en Facebook (cliente compartido de src/graph_api.py)"""
         if not FACEBOOK_ACCESS_TOKEN or not FACEBOOK_PAGE_ID:
             return "📘 Facebook API no configurada."
         
         try:
-            url = f"https://graph.facebook.com/v18.0/{FACEBOOK_PAGE_ID}/feed"
-            
-            data = {
-                'message': message,
-                'access_token': FACEBOOK_ACCESS_TOKEN
-            }
-            
-            if image_url:
-                # Si hay imagen, usar photo endpoint
-                url = f"https://graph.facebook.com/v18.0/{FACEBOOK_PAGE_ID}/photos"
-                data['url'] = image_url
-                data['caption'] = message
-            
-            response = requests.post(url, data=data)
-            
-            if response.status_code == 200:
-                result = response.json()
-                post_id = result.get('id', 'unknown')
-                return f"📘 **¡PUBLICADO EN FACEBOOK!**\n\n✅ Post ID: {post_id}\n📊 Monitoreo automático activado\n🎯 Tracking clicks y engagement\n\n🔗 Ver en Facebook Page"
-            else:
-                return f"📘 Error publicando: {response.status_code} - {response.text}"
-                
-        except Exception as e:
-            return f"📘 Error Facebook: {str(e)}"
+            result = run_sync(publish_page_post(message, page_id=FACEBOOK_PAGE_ID, image_url=image_url,
+                                                access_token=FACEBOOK_ACCESS_TOKEN))
+            return f"📘 **¡PUBLICADO EN FACEBOOK!**\n\n✅ Post ID: {result['post_id']}\n📊 Monitoreo automático activado\n🎯 Tracking clicks y engagement\n\n🔗 Ver en Facebook Page"
+        except GraphAPIError as e:
+            return f"📘 Error publicando: {e}"
     
     # ===== INSTAGRAM INTEGRATION =====
     def post_to_instagram(self, caption, image_url=None):
@@ -412,23 +410,8 @@ For social media marketing of ayahuasca/plant medicine retreat."""
     
     # ===== LEAD SCORING SYSTEM =====
     def calculate_lead_score(self, lead_info):
-        """Calcula puntuación de lead basada en criterios"""
-        score = 0
-        info_lower = lead_info.lower()
-        
-        # High-income indicators
-        if any(word in info_lower for word in ['entrepreneur', 'ceo', 'founder', 'executive', 'business owner']):
-            score += 3
-        
-        # Spiritual interest indicators  
-        if any(word in info_lower for word in ['spiritual', 'healing', 'transformation', 'consciousness']):
-            score += 2
-            
-        # Ayahuasca experience indicators
-        if any(word in info_lower for word in ['ayahuasca', 'plant medicine', 'ceremony', 'shaman']):
-            score += 3
-            
-        return min(score, 10)  # Max score 10
+        """Calcula puntuación de lead (mismas palabras clave y pesos que src/lead_scoring.py)"""
+        return self.scoring_engine.score_text(lead_info)
     
     # ===== MARKETING PIPELINE =====
     def analyze_marketing_pipeline(self):
@@ -558,7 +541,7 @@ https://sacred-rebirth.com/appointment.html"""
 
         # Para todo lo demás, usar inteligencia completa de IA
         else:
-            return self.generate_ai_content(text, user_language)"""
+            return self.generate_ai_content(text, user_language)
         """Procesar mensajes con inteligencia artificial natural"""
         message = text.lower().strip()
         
@@ -828,6 +811,14 @@ def main():
     keepalive_thread = threading.Thread(target=keep_service_alive, daemon=True)
     keepalive_thread.start()
     
+    # Render/Railway detienen el servicio con SIGTERM: checkpoint final del estado
+    def shutdown(signum, frame):
+        print("💾 Guardando estado antes de detener...")
+        maya.state.close()
+        sys.exit(0)
+    
+    signal.signal(signal.SIGTERM, shutdown)
+    
     # Notificación de inicio
     send_startup_notification()
     
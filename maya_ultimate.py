@@ -31,6 +31,8 @@ except:
     OPENAI_AVAILABLE = False
     print("⚠️ OpenAI not available")
 
+from src.conversation_memory import ConversationMemory, make_openai_summarizer
+
 # Config
 TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 OPENAI_KEY = os.getenv('OPENAI_API_KEY')
@@ -48,6 +50,11 @@ class Maya:
             except Exception as e:
                 print(f"⚠️ AI failed: {e}")
         
+        # Per-user conversation memory with a hard token budget
+        self.memory = ConversationMemory(
+            summarizer=make_openai_summarizer(self.ai) if self.ai else None
+        )
+        
         self.info = {
             "retreat": "Sacred Plant Medicine Retreat",
             "date": "August 11, 2025",
@@ -57,8 +64,8 @@ class Maya:
             "link": "https://sacred-rebirth.com/appointment.html"
         }
 
-    def get_response(self, message, name=""):
-        """Smart response with AI or fallback"""
+    def get_response(self, message, name="", sender_id=None):
+        """Smart response with AI or fallback (sender_id enables conversation memory)"""
         
         if self.ai:
             try:
@@ -86,7 +93,9 @@ RULES:
 3. Always include: {self.info['link']}
 4. Be warm, spiritual, professional
 5. Focus on transformation and exclusivity"""
-                    }, {
+                    },
+                    *self.memory.get_context(sender_id),
+                    {
                         "role": "user",
                         "content": f"{name} says: {message}"
                     }],
@@ -103,6 +112,7 @@ RULES:
                     else:
                         ai_text += f"\n\n💫 Book your discovery call: {self.info['link']}"
                 
+                self.memory.record_exchange(sender_id, message, ai_text)
                 return ai_text
                 
             except Exception as e:
@@ -208,7 +218,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     message = update.message.text
     
-    response = maya.get_response(message, user.first_name)
+    response = maya.get_response(message, user.first_name, str(user.id))
     await update.message.reply_text(response)
 
 def main():
@@ -10,6 +10,8 @@ from openai import OpenAI
 from flask import Flask, request, jsonify
 import requests
 import json
+from src.appointment_setter import analyze_message, detect_language
+from src.lead_capture import LeadCaptureQueue
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -321,6 +323,9 @@ Always here to help your Sacred Rebirth success! 💫"""
 # Initialize Maya
 maya = WhatsAppMayaBot()
 
+# Non-admin conversations are captured as leads without delaying replies
+lead_capture = LeadCaptureQueue()
+
 @app.route('/webhook', methods=['GET'])
 def webhook_verification():
     """WhatsApp webhook verification"""
@@ -345,6 +350,11 @@ def webhook_handler():
                 for change in entry['changes']:
                     if change.get('field') == 'messages':
                         if 'messages' in change['value']:
+                            # WhatsApp envía el nombre de perfil en "contacts"
+                            profile_names = {
+                                contact.get('wa_id'): contact.get('profile', {}).get('name')
+                                for contact in change['value'].get('contacts', [])
+                            }
                             for message in change['value']['messages']:
                                 sender_phone = message['from']
                                 message_text = message.get('text', {}).get('body', '')
@@ -355,6 +365,16 @@ def webhook_handler():
                                     response = maya.process_admin_command(message_text)
                                     maya.send_whatsapp_message(sender_phone, response)
                                 else:
+                                    # Register the prospect as a lead (background write)
+                                    lead_capture.capture(
+                                        'whatsapp',
+                                        phone=sender_phone,
+                                        name=profile_names.get(sender_phone),
+                                        language=detect_language(message_text),
+                                        intent=analyze_message(message_text),
+                                        message=message_text
+                                    )
+                                    
                                     # For non-admin users, send brief response
                                     response = f"""🌿 Thank you for contacting Sacred Rebirth!
 
@@ -378,7 +398,8 @@ def health_check():
         "service": "Sacred Rebirth Marketing Automation",
         "whatsapp_configured": bool(WHATSAPP_TOKEN),
         "openai_configured": bool(client),
-        "admin_phone": bool(maya.admin_phone)
+        "admin_phone": bool(maya.admin_phone),
+        "lead_capture": lead_capture.stats()
     })
 
 if __name__ == '__main__':
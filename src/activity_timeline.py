@@ -0,0 +1,252 @@
+"""
+Línea de tiempo de actividad por lead
+
+Los eventos (mensajes, intenciones, emails, clics...) se agregan a un
+archivo JSONL por día (data/timeline/AAAA-MM-DD.jsonl) que nunca se
+reescribe. Un índice secundario en SQLite guarda (lead, fecha, día,
+posición en el archivo), así la historia de un lead se lee con unas
+pocas búsquedas en lugar de recorrer todos los días.
+
+Varios procesos escriben en el mismo archivo del día (captura de leads,
+webhooks, campañas): cada escritura toma un candado exclusivo del archivo
+(flock) mientras calcula su posición, escribe y registra el índice.
+
+Todas las horas (ts y el día de la partición) están en la hora del negocio
+(TIMEZONE), igual que los eventos de email: el servidor puede estar en UTC.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+import pytz
+from config.settings import ACTIVITY_TIMELINE_DIR, TIMEZONE
+from src.db import connect
+
+# fcntl solo existe en POSIX; sin él queda el candado del proceso
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Tipos de evento conocidos (se aceptan otros)
+EVENT_TYPES = {
+    'message': '💬',          # DM entrante (Messenger / WhatsApp)
+    'email_sent': '📧',
+    'email_open': '👀',
+    'email_click': '🖱️',
+    'email_bounce': '↩️',
+    'post_interaction': '❤️',
+    'call_link_click': '📞',  # clic en el link de discovery call
+    'status_change': '🔄'
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS activity_index (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lead_id INTEGER NOT NULL,
+    ts TEXT NOT NULL,
+    type TEXT NOT NULL,
+    day TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_activity_lead_ts ON activity_index(lead_id, ts);
+CREATE INDEX IF NOT EXISTS idx_activity_day ON activity_index(day);
+"""
+
+
+def local_timestamp(moment=None):
+    """
+    Momento ISO sin zona en la hora del negocio (TIMEZONE), el reloj de la línea de tiempo
+
+    Args:
+        moment: datetime o ISO; con zona se convierte, sin zona se toma como hora
+                del negocio (por defecto ahora)
+    """
+    timezone = pytz.timezone(TIMEZONE)
+    if moment is None:
+        moment = datetime.now(timezone)
+    elif isinstance(moment, str):
+        try:
+            moment = datetime.fromisoformat(moment)
+        except ValueError:
+            return moment
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone)
+    return moment.replace(tzinfo=None).isoformat()
+
+
+class ActivityTimeline:
+    """
+    Almacén append-only de eventos particionado por día con índice por lead
+    """
+
+    def __init__(self, base_dir=None, db_path=None):
+        """
+        Args:
+            base_dir: Carpeta de las particiones diarias (ACTIVITY_TIMELINE_DIR)
+            db_path: Base de datos del índice (por defecto DATABASE_PATH)
+        """
+        self.base_dir = base_dir or ACTIVITY_TIMELINE_DIR
+        os.makedirs(self.base_dir, exist_ok=True)
+        self.conn = connect(db_path)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.executescript(SCHEMA)
+
+    # ===== ESCRITURA =====
+    def record(self, lead_id, event_type, data=None, timestamp=None):
+        """
+        Agrega un evento a la línea de tiempo de un lead
+
+        Args:
+            lead_id: Id del lead en LeadStore
+            event_type: Tipo de evento (ver EVENT_TYPES)
+            data: Detalles del evento (dict serializable)
+            timestamp: Momento ISO del evento (por defecto ahora; ver local_timestamp)
+        """
+        self.record_many([(lead_id, event_type, data, timestamp)])
+
+    def record_many(self, events):
+        """
+        Agrega varios eventos con una escritura y una transacción por partición
+
+        Args:
+            events: Iterable de (lead_id, event_type, data, timestamp)
+        """
+        by_day = {}
+        for lead_id, event_type, data, timestamp in events:
+            timestamp = local_timestamp(timestamp)
+            event = {'lead_id': lead_id, 'type': event_type, 'ts': timestamp, **(data or {})}
+            by_day.setdefault(timestamp[:10], []).append(event)
+
+        with self._lock:
+            for day, day_events in by_day.items():
+                lines = [(json.dumps(e, ensure_ascii=False, default=str) + '\n').encode('utf-8') for e in day_events]
+                with open(self._partition(day), 'ab') as f:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_EX)
+                    try:
+                        offset = f.seek(0, os.SEEK_END)
+                        f.write(b''.join(lines))
+                        f.flush()
+                        rows = []
+                        for event, line in zip(day_events, lines):
+                            rows.append((event['lead_id'], event['ts'], event['type'], day, offset, len(line)))
+                            offset += len(line)
+                        # El índice se confirma antes de soltar el archivo: nunca se espera
+                        # el candado del archivo con la base bloqueada
+                        with self.conn:
+                            self.conn.executemany(
+                                "INSERT INTO activity_index (lead_id, ts, type, day, offset, length) "
+                                "VALUES (?, ?, ?, ?, ?, ?)", rows
+                            )
+                    finally:
+                        if fcntl is not None:
+                            fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ===== LECTURA =====
+    def timeline(self, lead_id, limit=50, before=None, event_types=None):
+        """
+        Eventos de un lead, del más reciente al más antiguo
+
+        Args:
+            lead_id: Id del lead
+            limit: Máximo de eventos
+            before: Solo eventos anteriores a este momento ISO (paginación)
+            event_types: Lista de tipos a incluir
+
+        Returns:
+            Lista de eventos (dicts con 'type', 'ts' y sus detalles)
+        """
+        sql = "SELECT day, offset, length FROM activity_index WHERE lead_id = ?"
+        params = [lead_id]
+        if before:
+            sql += " AND ts < ?"
+            params.append(before)
+        if event_types:
+            sql += f" AND type IN ({', '.join('?' for _ in event_types)})"
+            params.extend(event_types)
+        sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+
+        events = []
+        handles = {}
+        try:
+            for row in rows:
+                f = handles.get(row['day'])
+                if f is None:
+                    path = self._partition(row['day'])
+                    if not os.path.exists(path):
+                        continue
+                    f = handles[row['day']] = open(path, 'rb')
+                f.seek(row['offset'])
+                try:
+                    events.append(json.loads(f.read(row['length'])))
+                except ValueError:
+                    print(f"⚠️ Evento ilegible en {row['day']} (posición {row['offset']}); se omite")
+        finally:
+            for f in handles.values():
+                f.close()
+        return events
+
+    def summary(self, lead_id):
+        """Conteo por tipo y primer/último evento de un lead (solo usa el índice)"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT type, COUNT(*) AS total, MIN(ts) AS first, MAX(ts) AS last "
+                "FROM activity_index WHERE lead_id = ? GROUP BY type", (lead_id,)
+            ).fetchall()
+        return {row['type']: {'total': row['total'], 'first': row['first'], 'last': row['last']} for row in rows}
+
+    def peak_hours(self, lead_ids, event_type='email_open', chunk_size=500):
+        """
+        Hora del día (0-23) en que cada lead tiene más eventos de un tipo (solo usa el índice)
+
+        Returns:
+            Diccionario lead_id -> hora; los leads sin eventos no aparecen
+        """
+        counts = {}
+        lead_ids = list(lead_ids)
+        with self._lock:
+            for start in range(0, len(lead_ids), chunk_size):
+                chunk = lead_ids[start:start + chunk_size]
+                rows = self.conn.execute(
+                    f"SELECT lead_id, CAST(substr(ts, 12, 2) AS INTEGER) AS hour, COUNT(*) AS total "
+                    f"FROM activity_index WHERE type = ? AND lead_id IN ({', '.join('?' for _ in chunk)}) "
+                    f"GROUP BY lead_id, hour", [event_type, *chunk]
+                ).fetchall()
+                for row in rows:
+                    best = counts.get(row['lead_id'])
+                    if best is None or row['total'] > best[1]:
+                        counts[row['lead_id']] = (row['hour'], row['total'])
+        return {lead_id: hour for lead_id, (hour, _) in counts.items()}
+
+    def prune(self, keep_days=365):
+        """Elimina particiones completas más antiguas que keep_days"""
+        cutoff = (datetime.now(pytz.timezone(TIMEZONE)) - timedelta(days=keep_days)).strftime('%Y-%m-%d')
+        removed = 0
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM activity_index WHERE day < ?", (cutoff,))
+            for filename in os.listdir(self.base_dir):
+                if filename.endswith('.jsonl') and filename[:10] < cutoff:
+                    os.remove(os.path.join(self.base_dir, filename))
+                    removed += 1
+        return removed
+
+    def _partition(self, day):
+        return os.path.join(self.base_dir, f"{day}.jsonl")
+
+
+def format_timeline(events):
+    """Texto compacto de una línea por evento (Telegram / contexto de agentes)"""
+    lines = []
+    for event in events:
+        icon = EVENT_TYPES.get(event['type'], '•')
+        details = {k: v for k, v in event.items() if k not in ('lead_id', 'type', 'ts')}
+        summary = ', '.join(f"{k}={str(v)[:60]}" for k, v in details.items())
+        lines.append(f"{event['ts'][:16].replace('T', ' ')} {icon} {event['type']}" + (f" ({summary})" if summary else ''))
+    return '\n'.join(lines)
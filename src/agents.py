@@ -7,6 +7,8 @@ from src.tools import (
     content_generator_tool,
     social_media_publish_tool,
     email_campaign_tool,
+    email_stats_tool,
+    social_insights_tool,
     content_calendar_tool,
     leads_manager_tool
 )
@@ -83,7 +85,7 @@ def create_email_marketing_specialist():
         es personal, cálido y profesional.""",
         verbose=True,
         allow_delegation=False,
-        tools=[email_campaign_tool, leads_manager_tool],
+        tools=[email_campaign_tool, email_stats_tool, leads_manager_tool],
         llm=OPENAI_MODEL
     )
 
@@ -102,7 +104,7 @@ def create_analytics_optimizer():
         audiencia. Tus recomendaciones son accionables y basadas en datos.""",
         verbose=True,
         allow_delegation=True,
-        tools=[content_calendar_tool, leads_manager_tool],
+        tools=[content_calendar_tool, leads_manager_tool, email_stats_tool, social_insights_tool],
         llm=OPENAI_MODEL
     )
 
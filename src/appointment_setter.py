@@ -6,6 +6,41 @@ Maneja conversaciones para agendar discovery calls
 import os
 from openai import OpenAI
 
+# Preguntas que pueden hacer los usuarios (español e inglés)
+COMMON_QUESTIONS = {
+    "location": ["ubicación", "donde", "dónde", "lugar", "valle de bravo", "location", "where", "place"],
+    "what_is": ["consiste", "qué es", "que es", "sobre", "ayahuasca", "retiro", "what is", "about", "retreat", "consist"],
+    "medicines": ["medicina", "plantas", "sustancia", "toman", "usan", "medicine", "plant", "substance", "take", "use"],
+    "duration": ["tiempo", "duración", "días", "cuánto", "duration", "time", "days", "how long"],
+    "included": ["incluye", "precio incluye", "qué incluye", "comida", "include", "what includes", "food", "meals"],
+    "price": ["precio", "costo", "cuánto cuesta", "cuanto cuesta", "tarifa", "price", "cost", "how much", "money", "fee"],
+    "safety": ["seguro", "seguridad", "riesgos", "peligro", "safe", "safety", "risk", "danger"],
+    "preparation": ["preparar", "preparación", "antes", "dieta", "prepare", "preparation", "before", "diet"],
+    "experience": ["experiencia", "qué esperar", "primera vez", "experience", "what to expect", "first time"],
+    "greeting": ["hola", "hello", "hi", "buenas", "good morning", "good afternoon", "hey"]
+}
+
+ENGLISH_WORDS = ['hello', 'hi', 'how', 'what', 'where', 'when', 'why', 'the', 'and', 'or', 'retreat', 'ayahuasca', 'price', 'cost']
+SPANISH_WORDS = ['hola', 'como', 'qué', 'que', 'donde', 'cuando', 'por', 'el', 'la', 'y', 'o', 'retiro', 'precio', 'costo']
+
+
+def analyze_message(user_message):
+    """Determina la intención del mensaje por palabras clave (sin llamar a la API)"""
+    message_lower = user_message.lower()
+    for qtype, keywords in COMMON_QUESTIONS.items():
+        if any(keyword in message_lower for keyword in keywords):
+            return qtype
+    return "general"
+
+
+def detect_language(message):
+    """Detecta el idioma del mensaje ("english" o "spanish", español por defecto)"""
+    message_lower = message.lower()
+    english_count = sum(1 for word in ENGLISH_WORDS if word in message_lower)
+    spanish_count = sum(1 for word in SPANISH_WORDS if word in message_lower)
+    return "english" if english_count > spanish_count else "spanish"
+
+
 class AppointmentSetterAgent:
     def __init__(self):
         self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
@@ -22,18 +57,7 @@ class AppointmentSetterAgent:
         }
         
         # Preguntas que pueden hacer los usuarios (español e inglés)
-        self.common_questions = {
-            "location": ["ubicación", "donde", "dónde", "lugar", "valle de bravo", "location", "where", "place"],
-            "what_is": ["consiste", "qué es", "que es", "sobre", "ayahuasca", "retiro", "what is", "about", "retreat", "consist"],
-            "medicines": ["medicina", "plantas", "sustancia", "toman", "usan", "medicine", "plant", "substance", "take", "use"],
-            "duration": ["tiempo", "duración", "días", "cuánto", "duration", "time", "days", "how long"],
-            "included": ["incluye", "precio incluye", "qué incluye", "comida", "include", "what includes", "food", "meals"],
-            "price": ["precio", "costo", "cuánto cuesta", "cuanto cuesta", "tarifa", "price", "cost", "how much", "money", "fee"],
-            "safety": ["seguro", "seguridad", "riesgos", "peligro", "safe", "safety", "risk", "danger"],
-            "preparation": ["preparar", "preparación", "antes", "dieta", "prepare", "preparation", "before", "diet"],
-            "experience": ["experiencia", "qué esperar", "primera vez", "experience", "what to expect", "first time"],
-            "greeting": ["hola", "hello", "hi", "buenas", "good morning", "good afternoon", "hey"]
-        }
+        self.common_questions = COMMON_QUESTIONS
         
         # Sistema prompt bilingüe
         self.system_prompt = """Eres Maya, la asistente personal bilingüe de Sacred Rebirth. Eres una facilitadora experta en ceremonias de ayahuasca con años de experiencia guiando personas en su transformación espiritual.
@@ -82,37 +106,21 @@ Responde siempre con amor, sabiduría y orientación hacia el discovery call."""
 
     def analyze_message(self, user_message):
         """Analiza el mensaje del usuario y determina la intención"""
-        message_lower = user_message.lower()
-        
-        # Detectar tipo de pregunta
-        question_type = "general"
-        for qtype, keywords in self.common_questions.items():
-            if any(keyword in message_lower for keyword in keywords):
-                question_type = qtype
-                break
-        
-        return question_type
+        return analyze_message(user_message)
     
     def detect_language(self, message):
         """Detecta el idioma del mensaje"""
-        english_words = ['hello', 'hi', 'how', 'what', 'where', 'when', 'why', 'the', 'and', 'or', 'retreat', 'ayahuasca', 'price', 'cost']
-        spanish_words = ['hola', 'como', 'qué', 'que', 'donde', 'cuando', 'por', 'el', 'la', 'y', 'o', 'retiro', 'precio', 'costo']
-        
-        message_lower = message.lower()
-        
-        english_count = sum(1 for word in english_words if word in message_lower)
-        spanish_count = sum(1 for word in spanish_words if word in message_lower)
-        
-        if english_count > spanish_count:
-            return "english"
-        elif spanish_count > english_count:
-            return "spanish"
-        else:
-            # Si no está claro, usar español como default
-            return "spanish"
+        return detect_language(message)
     
-    def generate_response(self, user_message, question_type="general"):
-        """Genera una respuesta personalizada como Maya"""
+    def generate_response(self, user_message, question_type="general", history=None):
+        """
+        Genera una respuesta personalizada como Maya
+        
+        Args:
+            user_message: Mensaje del usuario
+            question_type: Tipo de pregunta detectado por analyze_message
+            history: Mensajes previos de la conversación (ConversationMemory.get_context)
+        """
         
         try:
             # Detectar idioma
@@ -160,6 +168,7 @@ Responde siempre con amor, sabiduría y orientación hacia el discovery call."""
                 model='gpt-4o-mini',  # Usar modelo eficiente para appointment setter
                 messages=[
                     {'role': 'system', 'content': f"{self.system_prompt}\n\nCONTEXTO ESPECÍFICO: {context}\nIDIOMA A USAR: {language.upper()}"},
+                    *(history or []),
                     {'role': 'user', 'content': user_message}
                 ],
                 max_tokens=300,
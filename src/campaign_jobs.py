@@ -0,0 +1,344 @@
+"""
+Campañas de email como trabajos persistentes y reanudables
+
+Al crear una campaña se guarda el trabajo (asunto y template) y una fila
+por destinatario en el registro de envíos, identificada por la pareja
+(campaña, destinatario): esa es la clave de idempotencia. Cada lote
+enviado actualiza su fila en una transacción, así un reinicio continúa
+exactamente con los destinatarios pendientes y nunca repite un envío.
+La misma pareja viaja en los custom_args de SendGrid (campaign_id y
+recipient) y vuelve en los eventos del webhook (src/email_events.py).
+
+El registro también es la cola de salida: cada destinatario puede tener
+una hora mínima de envío (send_after) que respeta src/send_scheduler.py.
+
+La cuota diaria (MAX_EMAILS_PER_DAY) también vive en la base: todos los
+procesos que envían (bot, scheduler, main.py) reservan de un mismo contador.
+El día de la cuota es el de TIMEZONE, igual que las ventanas de envío, no
+el del reloj del servidor (que en la nube suele estar en UTC).
+"""
+import hashlib
+import re
+import threading
+from datetime import datetime
+import pytz
+from config.settings import TIMEZONE
+from src.db import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaign_jobs (
+    campaign_id TEXT PRIMARY KEY,
+    subject TEXT NOT NULL,
+    template TEXT NOT NULL,
+    segment TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS campaign_sends (
+    campaign_id TEXT NOT NULL REFERENCES campaign_jobs(campaign_id) ON DELETE CASCADE,
+    recipient TEXT NOT NULL,
+    lead_id INTEGER,
+    email TEXT,
+    name TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    status_code INTEGER,
+    error TEXT,
+    sent_at TEXT,
+    send_after TEXT,
+    PRIMARY KEY (campaign_id, recipient)
+);
+CREATE INDEX IF NOT EXISTS idx_campaign_sends_status ON campaign_sends(campaign_id, status);
+CREATE TABLE IF NOT EXISTS email_daily_quota (
+    day TEXT PRIMARY KEY,
+    sent INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Estados de un destinatario en el registro de envíos
+SEND_STATUSES = {
+    'pending': '⏳',      # aún no enviado (incluye los que esperan cuota diaria)
+    'sending': '📤',      # lote en curso; si queda así tras una caída no se reenvía
+    'sent': '✅',
+    'failed': '❌',
+    'skipped': '⏭️',      # lead sin email
+    'suppressed': '🚫'    # en la lista de supresión (baja, rebote o spam; src/suppression.py)
+}
+
+
+def campaign_id_for(subject, template):
+    """
+    Id determinista de una campaña: la misma campaña (asunto + contenido)
+    siempre cae en el mismo trabajo, así relanzarla reanuda en lugar de reenviar
+    """
+    slug = re.sub(r'[^a-z0-9]+', '-', subject.lower()).strip('-')[:30] or 'campaign'
+    digest = hashlib.sha1(f"{subject}\n{template}".encode('utf-8')).hexdigest()[:10]
+    return f"{slug}-{digest}"
+
+
+def recipient_key(lead):
+    """Destinatario dentro de una campaña: id del lead, o su email si no está en la base"""
+    if lead.get('id'):
+        return f"lead:{lead['id']}"
+    if lead.get('email'):
+        return f"email:{lead['email'].strip().lower()}"
+    return None
+
+
+class CampaignJobStore:
+    """
+    Trabajos de campaña y su registro de envíos por destinatario (SQLite)
+    """
+
+    def __init__(self, db_path=None):
+        """
+        Args:
+            db_path: Ruta de la base de datos (por defecto DATABASE_PATH)
+        """
+        self.conn = connect(db_path)
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            existing = {row['name'] for row in self.conn.execute("PRAGMA table_info(campaign_sends)")}
+            if 'send_after' not in existing:
+                self.conn.execute("ALTER TABLE campaign_sends ADD COLUMN send_after TEXT")
+
+    # ===== TRABAJOS =====
+    def create_job(self, subject, template, leads, campaign_id=None, segment=None, send_after=None):
+        """
+        Crea (o amplía) una campaña y registra sus destinatarios como pendientes
+
+        Si el trabajo ya existe, los destinatarios ya registrados se
+        conservan con su estado y solo se agregan los nuevos.
+
+        Args:
+            send_after: Diccionario clave de destinatario -> hora mínima de envío (ISO, opcional)
+
+        Returns:
+            campaign_id
+        """
+        send_after = send_after or {}
+        campaign_id = campaign_id or campaign_id_for(subject, template)
+        now = datetime.now().isoformat()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO campaign_jobs (campaign_id, subject, template, segment, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(campaign_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (campaign_id, subject, template, segment, now, now)
+            )
+            rows = []
+            for index, lead in enumerate(leads):
+                key = recipient_key(lead) or f"row:{index}"
+                status = 'pending' if lead.get('email') else 'skipped'
+                rows.append((campaign_id, key, lead.get('id'), lead.get('email'), lead.get('name'), status,
+                             send_after.get(key)))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO campaign_sends (campaign_id, recipient, lead_id, email, name, status, send_after) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        return campaign_id
+
+    def get_job(self, campaign_id):
+        """Trabajo con sus conteos por estado, o None"""
+        row = self.conn.execute("SELECT * FROM campaign_jobs WHERE campaign_id = ?", (campaign_id,)).fetchone()
+        if not row:
+            return None
+        return {**dict(row), 'counts': self.progress(campaign_id)}
+
+    def list_jobs(self, limit=10):
+        """Campañas más recientes con sus conteos"""
+        rows = self.conn.execute(
+            "SELECT campaign_id FROM campaign_jobs ORDER BY updated_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [self.get_job(row['campaign_id']) for row in rows]
+
+    def active_jobs(self):
+        """Ids de campañas con destinatarios pendientes, de la más antigua a la más nueva"""
+        rows = self.conn.execute(
+            "SELECT campaign_id FROM campaign_jobs j WHERE status IN ('pending', 'scheduled', 'paused', 'running') "
+            "AND EXISTS (SELECT 1 FROM campaign_sends s WHERE s.campaign_id = j.campaign_id AND s.status = 'pending') "
+            "ORDER BY created_at"
+        ).fetchall()
+        return [row['campaign_id'] for row in rows]
+
+    def set_status(self, campaign_id, status):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE campaign_jobs SET status = ?, updated_at = ? WHERE campaign_id = ?",
+                (status, datetime.now().isoformat(), campaign_id)
+            )
+
+    def progress(self, campaign_id):
+        """Conteo de destinatarios por estado"""
+        rows = self.conn.execute(
+            "SELECT status, COUNT(*) AS total FROM campaign_sends WHERE campaign_id = ? GROUP BY status",
+            (campaign_id,)
+        ).fetchall()
+        return {row['status']: row['total'] for row in rows}
+
+    # ===== REGISTRO DE ENVÍOS =====
+    def claim(self, campaign_id, limit, due=None):
+        """
+        Toma los siguientes destinatarios pendientes y los marca 'sending'
+
+        Es una sola sentencia (UPDATE ... RETURNING): si dos procesos reanudan
+        la misma campaña, cada destinatario lo toma solo uno de ellos. Devuelve
+        únicamente las filas que esta llamada cambió.
+
+        Args:
+            due: Momento actual (ISO); excluye destinatarios con send_after posterior
+        """
+        where = "campaign_id = ? AND status = 'pending'"
+        params = [campaign_id]
+        if due:
+            where += " AND (send_after IS NULL OR send_after <= ?)"
+            params.append(due)
+        with self.conn:
+            rows = self.conn.execute(
+                f"UPDATE campaign_sends SET status = 'sending' WHERE {where} AND rowid IN "
+                f"(SELECT rowid FROM campaign_sends WHERE {where} ORDER BY rowid LIMIT ?) "
+                "RETURNING rowid, recipient, lead_id AS id, email, name",
+                params + params + [limit]
+            ).fetchall()
+        # RETURNING no garantiza orden: se respeta el orden de registro
+        return [{key: row[key] for key in ('recipient', 'id', 'email', 'name')}
+                for row in sorted(rows, key=lambda row: row['rowid'])]
+
+    def record_results(self, campaign_id, records):
+        """Guarda el resultado de un lote (checkpoint del trabajo)"""
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE campaign_sends SET status = ?, status_code = ?, error = ?, sent_at = ? "
+                "WHERE campaign_id = ? AND recipient = ?",
+                [(r['status'], r.get('status_code'), r.get('error'), r.get('sent_at'), campaign_id, r['recipient'])
+                 for r in records]
+            )
+            self.conn.execute(
+                "UPDATE campaign_jobs SET updated_at = ? WHERE campaign_id = ?",
+                (datetime.now().isoformat(), campaign_id)
+            )
+
+    def requeue_unconfirmed(self, campaign_id):
+        """
+        Devuelve a pendientes los lotes que quedaron 'sending' tras una caída
+
+        Solo debe usarse si se sabe que esos lotes no llegaron al proveedor:
+        reenviarlos puede duplicar emails.
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                "UPDATE campaign_sends SET status = 'pending' WHERE campaign_id = ? AND status = 'sending'",
+                (campaign_id,)
+            )
+        return cursor.rowcount
+
+    def ledger(self, campaign_id, recipients=None):
+        """
+        Registro por destinatario
+
+        Args:
+            recipients: Limitar a estas claves de destinatario
+        """
+        sql = ("SELECT recipient, lead_id, email, status, status_code, error, sent_at "
+               "FROM campaign_sends WHERE campaign_id = ?")
+        rows = self.conn.execute(sql + " ORDER BY rowid", (campaign_id,)).fetchall()
+        if recipients is not None:
+            wanted = set(recipients)
+            rows = [row for row in rows if row['recipient'] in wanted]
+        return [dict(row) for row in rows]
+
+
+class DailyQuota:
+    """
+    Emails enviados por día, compartidos entre procesos
+
+    Antes de enviar un lote se reserva su tamaño (reserve) dentro de una
+    transacción inmediata, así dos procesos nunca reparten la misma cuota;
+    lo que no se llegó a enviar se devuelve con release().
+    """
+
+    def __init__(self, limit, db_path=None):
+        """
+        Args:
+            limit: Emails por día (MAX_EMAILS_PER_DAY)
+            db_path: Ruta de la base de datos (por defecto DATABASE_PATH)
+        """
+        self.limit = limit
+        self.conn = connect(db_path)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.executescript(SCHEMA)
+
+    @staticmethod
+    def today():
+        return quota_day()
+
+    def sent(self, day=None):
+        """Emails contados en un día (por defecto hoy)"""
+        with self._lock:
+            row = self.conn.execute("SELECT sent FROM email_daily_quota WHERE day = ?",
+                                    (day or self.today(),)).fetchone()
+        return row['sent'] if row else 0
+
+    def remaining(self, day=None):
+        return max(self.limit - self.sent(day), 0)
+
+    def reserve(self, count):
+        """
+        Reserva hasta `count` envíos de la cuota de hoy
+
+        Returns:
+            Envíos concedidos (0 si la cuota está agotada)
+        """
+        day = self.today()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT sent FROM email_daily_quota WHERE day = ?", (day,)).fetchone()
+                granted = max(min(count, self.limit - (row['sent'] if row else 0)), 0)
+                if granted:
+                    self.conn.execute(
+                        "INSERT INTO email_daily_quota (day, sent) VALUES (?, ?) "
+                        "ON CONFLICT(day) DO UPDATE SET sent = sent + excluded.sent", (day, granted)
+                    )
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+        return granted
+
+    def release(self, count, day=None):
+        """Devuelve envíos reservados que no salieron (fallidos, suprimidos o sin destinatario)"""
+        if count <= 0:
+            return
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE email_daily_quota SET sent = MAX(sent - ?, 0) WHERE day = ?",
+                              (count, day or self.today()))
+
+    def add(self, count=1, day=None):
+        """Cuenta envíos hechos sin reserva (emails individuales)"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO email_daily_quota (day, sent) VALUES (?, ?) "
+                "ON CONFLICT(day) DO UPDATE SET sent = sent + excluded.sent", (day or self.today(), count)
+            )
+
+
+def quota_day(moment=None):
+    """
+    Día de la cuota (YYYY-MM-DD) en la hora del negocio (TIMEZONE)
+
+    Args:
+        moment: datetime con zona, o sin zona ya en hora del negocio (por defecto ahora)
+    """
+    timezone = pytz.timezone(TIMEZONE)
+    if moment is None:
+        moment = datetime.now(timezone)
+    elif moment.tzinfo is not None:
+        moment = moment.astimezone(timezone)
+    return moment.strftime('%Y-%m-%d')
+
+
+def format_job(job):
+    """Resumen de una línea de un trabajo de campaña"""
+    counts = ' '.join(f"{SEND_STATUSES.get(status, '•')}{total}" for status, total in sorted(job['counts'].items()))
+    return f"{job['campaign_id']} [{job['status']}] {job['subject'][:40]} — {counts}"
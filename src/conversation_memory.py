@@ -0,0 +1,233 @@
+"""
+Memoria de conversación por remitente con presupuesto de tokens
+Mantiene los turnos recientes y compacta los antiguos en un resumen acumulado
+"""
+import threading
+from collections import OrderedDict
+from config.settings import (
+    CONVERSATION_TOKEN_BUDGET,
+    CONVERSATION_SUMMARY_TOKENS,
+    CONVERSATION_MAX_SENDERS
+)
+
+# tiktoken es opcional: si no está instalado se usa una estimación por caracteres
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding('cl100k_base')
+except Exception:
+    _ENCODING = None
+
+
+def estimate_tokens(text):
+    """Cuenta (o estima) los tokens de un texto"""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    # ~4 caracteres por token en español/inglés
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text, max_tokens, keep='head'):
+    """Recorta un texto para que no exceda max_tokens"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if _ENCODING is not None:
+        tokens = _ENCODING.encode(text)
+        tokens = tokens[:max_tokens] if keep == 'head' else tokens[-max_tokens:]
+        return _ENCODING.decode(tokens)
+    max_chars = max(max_tokens - 1, 0) * 4
+    return text[:max_chars] if keep == 'head' else text[-max_chars:]
+
+
+def extractive_summarizer(previous_summary, turns, max_tokens):
+    """
+    Resumen barato sin IA: conserva una línea corta por turno
+
+    Args:
+        previous_summary: Resumen acumulado hasta ahora
+        turns: Turnos que salen de la ventana [{role, content}, ...]
+        max_tokens: Tamaño máximo del resumen
+    """
+    lines = [previous_summary] if previous_summary else []
+    for turn in turns:
+        speaker = 'Usuario' if turn['role'] == 'user' else 'Maya'
+        snippet = ' '.join(turn['content'].split())[:160]
+        lines.append(f"- {speaker}: {snippet}")
+    # Lo más reciente es lo más relevante: se conserva la cola
+    return truncate_to_tokens('\n'.join(lines), max_tokens, keep='tail')
+
+
+def make_openai_summarizer(client, model='gpt-4o-mini'):
+    """
+    Crea un summarizer que usa un modelo económico de OpenAI
+
+    Si la llamada falla se usa el resumen extractivo para no perder contexto.
+    """
+    def summarize(previous_summary, turns, max_tokens):
+        transcript = '\n'.join(
+            f"{'Usuario' if t['role'] == 'user' else 'Maya'}: {t['content']}" for t in turns
+        )
+        try:
+            response = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {'role': 'system', 'content': (
+                        "Resume la conversación de un prospecto con Maya (Sacred Rebirth). "
+                        "Conserva nombre, idioma, intereses, dudas, objeciones y próximos pasos. "
+                        "Responde solo con el resumen, en viñetas breves."
+                    )},
+                    {'role': 'user', 'content': (
+                        f"RESUMEN ANTERIOR:\n{previous_summary or '(ninguno)'}\n\n"
+                        f"NUEVOS TURNOS:\n{transcript}"
+                    )}
+                ],
+                max_tokens=max_tokens,
+                temperature=0.2
+            )
+            summary = response.choices[0].message.content.strip()
+            return truncate_to_tokens(summary, max_tokens, keep='head')
+        except Exception as e:
+            print(f"⚠️ Error resumiendo conversación: {e}")
+            return extractive_summarizer(previous_summary, turns, max_tokens)
+
+    return summarize
+
+
+class ConversationMemory:
+    """
+    Historial por remitente con un límite duro de tokens
+
+    El contexto que se envía al modelo es: resumen acumulado + turnos recientes.
+    Cuando los turnos recientes exceden su presupuesto, los más antiguos se
+    compactan en el resumen, así el tamaño del prompt se mantiene constante
+    sin importar cuánto dure la conversación.
+
+    El resumen se genera fuera del candado (puede ser una llamada a OpenAI):
+    los demás remitentes no esperan, y mientras tanto los turnos que salen
+    de la ventana siguen en el contexto mientras quepan en el presupuesto
+    (se descartan primero los más antiguos).
+    """
+
+    def __init__(self, token_budget=None, summary_tokens=None, max_senders=None, summarizer=None):
+        """
+        Args:
+            token_budget: Tokens máximos de contexto por remitente (resumen + turnos)
+            summary_tokens: Parte del presupuesto reservada al resumen
+            max_senders: Remitentes en memoria (se descartan los menos recientes)
+            summarizer: Función (resumen_previo, turnos, max_tokens) -> resumen
+        """
+        self.token_budget = token_budget or CONVERSATION_TOKEN_BUDGET
+        self.summary_tokens = min(summary_tokens or CONVERSATION_SUMMARY_TOKENS, self.token_budget // 2)
+        self.history_tokens = self.token_budget - self.summary_tokens
+        self.max_senders = max_senders or CONVERSATION_MAX_SENDERS
+        self.summarizer = summarizer or extractive_summarizer
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_state(self, sender_id):
+        """Obtiene (o crea) el estado de un remitente y lo marca como reciente"""
+        state = self._conversations.get(sender_id)
+        if state is None:
+            state = {'summary': '', 'turns': [], 'tokens': 0, 'version': 0, 'evicting': []}
+            self._conversations[sender_id] = state
+            while len(self._conversations) > self.max_senders:
+                self._conversations.popitem(last=False)
+        else:
+            self._conversations.move_to_end(sender_id)
+        return state
+
+    def get_context(self, sender_id):
+        """
+        Mensajes previos para insertar entre el system prompt y el mensaje nuevo
+
+        Returns:
+            Lista de mensajes en formato OpenAI [{role, content}, ...]
+        """
+        if sender_id is None:
+            return []
+
+        with self._lock:
+            state = self._conversations.get(sender_id)
+            if state is None:
+                return []
+            messages = []
+            if state['summary']:
+                messages.append({
+                    'role': 'system',
+                    'content': f"Resumen de la conversación previa con este usuario:\n{state['summary']}"
+                })
+            # Con un resumen pendiente los turnos que salen siguen aquí: el límite se respeta
+            # recortando desde el más antiguo
+            turns = state['evicting'] + state['turns']
+            used = sum(estimate_tokens(m['content']) for m in messages) + sum(t['tokens'] for t in turns)
+            while turns and used > self.token_budget:
+                used -= turns.pop(0)['tokens']
+            messages.extend({'role': t['role'], 'content': t['content']} for t in turns)
+            return messages
+
+    def record_exchange(self, sender_id, user_message, assistant_message):
+        """Guarda un intercambio usuario/Maya y compacta si se excede el presupuesto"""
+        if sender_id is None:
+            return
+
+        with self._lock:
+            state = self._get_state(sender_id)
+            for role, content in (('user', user_message), ('assistant', assistant_message)):
+                # Un solo turno nunca puede ocupar más que la ventana completa
+                content = truncate_to_tokens(content or '', self.history_tokens // 2)
+                tokens = estimate_tokens(content)
+                state['turns'].append({'role': role, 'content': content, 'tokens': tokens})
+                state['tokens'] += tokens
+            job = self._start_compaction(state)
+
+        # El resumen se calcula sin el candado; al terminar se revisa si hace falta otra ronda
+        while job:
+            summary = self.summarizer(job['summary'], job['turns'], self.summary_tokens)
+            job = self._finish_compaction(sender_id, state, job, summary)
+
+    def _start_compaction(self, state):
+        """
+        Saca los turnos más antiguos hasta dejar la mitad de la ventana libre (con el candado tomado)
+
+        Returns:
+            {'summary', 'turns', 'version'} para resumir, o None si no hace falta
+            (o si ya hay una compactación en curso para este remitente)
+        """
+        if state['evicting'] or state['tokens'] <= self.history_tokens:
+            return None
+        target = self.history_tokens // 2
+        evicted = []
+        while state['turns'] and state['tokens'] > target:
+            turn = state['turns'].pop(0)
+            state['tokens'] -= turn['tokens']
+            evicted.append(turn)
+        state['evicting'] = evicted
+        return {'summary': state['summary'], 'turns': evicted, 'version': state['version']}
+
+    def _finish_compaction(self, sender_id, state, job, summary):
+        """Guarda el resumen si nadie lo cambió mientras tanto; devuelve la siguiente ronda o None"""
+        with self._lock:
+            state['evicting'] = []
+            if self._conversations.get(sender_id) is not state or state['version'] != job['version']:
+                return None  # conversación olvidada o descartada durante el resumen
+            state['summary'] = summary
+            state['version'] += 1
+            return self._start_compaction(state)
+
+    def clear(self, sender_id):
+        """Olvida la conversación de un remitente"""
+        with self._lock:
+            self._conversations.pop(sender_id, None)
+
+    def stats(self):
+        """Resumen del uso de memoria"""
+        with self._lock:
+            return {
+                'senders': len(self._conversations),
+                'token_budget': self.token_budget,
+                'max_context_tokens': max(
+                    (estimate_tokens(s['summary']) + s['tokens'] for s in self._conversations.values()),
+                    default=0
+                )
+            }
@@ -22,6 +22,8 @@ from src.tasks import (
     create_analytics_task,
     create_full_campaign_task
 )
+from src.embedding_cache import CachedOpenAIEmbedder
+from src.insights_sync import InsightsStore
 
 
 class MarketingCrew:
@@ -41,6 +43,9 @@ class MarketingCrew:
         self.analyst = create_analytics_optimizer()
         self.customer_success = create_customer_success_agent()
         
+        # Embedder con caché en disco (se crea al primer uso de memoria)
+        self.embedder = None
+        
         print("✅ Agentes creados exitosamente")
     
     def run_content_strategy(self):
@@ -176,7 +181,8 @@ class MarketingCrew:
         
         Args:
             action: 'view', 'nurture', 'segment'
-            segment: 'interested', 'converted', 'all'
+            segment: Segmento guardado ('interested', 'converted', 'premium'...),
+                     definición (ej. 'status:interested score:>=7') o 'all'
         """
         print(f"\n👥 Ejecutando: Gestión de Leads ({action})")
         
@@ -205,6 +211,9 @@ class MarketingCrew:
         """
         print(f"\n📊 Ejecutando: Análisis de Métricas ({metric_type})")
         
+        # Métricas de redes al día (incremental; no hace nada si la última sincronización es reciente)
+        InsightsStore().sync_if_stale()
+        
         # Tarea de análisis
         analytics_task = create_analytics_task(self.analyst, metric_type)
         
@@ -254,6 +263,9 @@ class MarketingCrew:
         # Fase 5: Seguimiento de leads
         leads_task = create_leads_nurture_task(self.customer_success, 'interested')
         
+        if self.embedder is None:
+            self.embedder = CachedOpenAIEmbedder()
+        
         # Crear crew colaborativo
         crew = Crew(
             agents=[
@@ -275,9 +287,9 @@ class MarketingCrew:
             verbose=True,
             memory=True,  # Habilita memoria compartida entre agentes
             embedder={
-                "provider": "openai",
+                "provider": "custom",
                 "config": {
-                    "model": "text-embedding-3-small"
+                    "embedder": self.embedder  # text-embedding-3-small con caché en disco
                 }
             }
         )
@@ -285,6 +297,12 @@ class MarketingCrew:
         # Ejecutar campaña completa
         result = crew.kickoff()
         
+        self.embedder.cache.flush()
+        cache_stats = self.embedder.cache.stats()
+        print(f"\n🧠 Caché de embeddings: {cache_stats['hit_rate']:.0%} hit rate "
+              f"({cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+              f"{cache_stats['entries']} vectores)")
+        
         print("\n" + "=" * 60)
         print("✅ CAMPAÑA COMPLETA FINALIZADA")
         print("=" * 60)
@@ -0,0 +1,29 @@
+"""
+Conexión a la base de datos SQLite del sistema (modo WAL)
+"""
+import os
+import sqlite3
+from config.settings import DATABASE_PATH
+
+
+def connect(db_path=None):
+    """
+    Abre una conexión SQLite configurada para escrituras concurrentes
+
+    Args:
+        db_path: Ruta del archivo (por defecto DATABASE_PATH)
+
+    Returns:
+        sqlite3.Connection con filas accesibles por nombre de columna
+    """
+    path = db_path or DATABASE_PATH
+    if path != ':memory:':
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=30000')
+    conn.execute('PRAGMA foreign_keys=ON')
+    return conn
@@ -3,16 +3,140 @@ Sistema de envío de emails promocionales
 """
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail, Email, To, Content
-from config.settings import SENDGRID_API_KEY, EMAIL_FROM, EMAIL_FROM_NAME, BUSINESS_INFO
+from config.settings import (SENDGRID_API_KEY, SENDGRID_API_HOST, EMAIL_FROM, EMAIL_FROM_NAME, BUSINESS_INFO,
+                             MAX_EMAILS_PER_DAY, EMAIL_SEND_WORKERS, EMAIL_SEND_RATE_PER_SECOND,
+                             EMAIL_BATCH_SIZE, EMAIL_SEND_RETRIES)
+from src.lead_store import LeadStore
+from src.activity_timeline import ActivityTimeline
+from src.email_template import EmailTemplate, html_to_text
+from src.campaign_jobs import CampaignJobStore, DailyQuota, recipient_key
+from src.suppression import SuppressionList
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import html
 import json
 import os
+import threading
+import time
 from datetime import datetime
 
+# Campos del lead (por destinatario) y su valor por defecto; el resto del template se renderiza una vez
+LEAD_FIELDS = {
+    'name': 'Amigo',
+    'email': '',
+    'unsubscribe_url': ''
+}
+
+# Etiquetas que SendGrid sustituye por destinatario en la parte HTML (valor escapado) y en la de texto
+SUBSTITUTION_TAGS = {field: f"-{field}-" for field in LEAD_FIELDS}
+TEXT_SUBSTITUTION_TAGS = {field: f"-{field}_text-" for field in LEAD_FIELDS}
+
+# Estado en el registro de la campaña -> estado reportado al llamador
+LEDGER_STATUS = {
+    'pending': 'deferred',      # esperando cuota diaria (se envía al reanudar)
+    'sending': 'unconfirmed'    # lote interrumpido: no se reenvía automáticamente
+}
+
+# Respuestas que vale la pena reintentar (límite de peticiones o error del proveedor)
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    """
+    Limita las peticiones por segundo compartidas entre hilos
+
+    Reparte los turnos a intervalos fijos (1 / rate): cada hilo reserva el
+    siguiente turno libre y espera hasta que llegue.
+    """
+
+    def __init__(self, rate_per_second):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
 class EmailCampaignManager:
-    def __init__(self):
+    def __init__(self, workers=None, rate_per_second=None, host=None, batch_size=None,
+                 daily_limit=None, db_path=None):
         self.api_key = SENDGRID_API_KEY
         self.from_email = EMAIL_FROM
         self.from_name = EMAIL_FROM_NAME
+        self.host = host or SENDGRID_API_HOST
+        self.workers = workers or EMAIL_SEND_WORKERS
+        self.batch_size = min(batch_size or EMAIL_BATCH_SIZE, 1000)
+        self.daily_limit = MAX_EMAILS_PER_DAY if daily_limit is None else daily_limit
+        self.db_path = db_path
+        self.rate_limiter = RateLimiter(rate_per_second or EMAIL_SEND_RATE_PER_SECOND)
+        self._client = None
+        self._quota = None
+        self._jobs = None
+        self._suppression = None
+    
+    @property
+    def client(self):
+        """Cliente de SendGrid compartido por todos los envíos (se crea una sola vez)"""
+        if self._client is None:
+            self._client = SendGridAPIClient(self.api_key, host=self.host)
+        return self._client
+    
+    @property
+    def jobs(self):
+        """Trabajos de campaña persistentes (src/campaign_jobs.py)"""
+        if self._jobs is None:
+            self._jobs = CampaignJobStore(self.db_path)
+        return self._jobs
+    
+    @property
+    def suppression(self):
+        """Lista de supresión (bajas, rebotes, spam; src/suppression.py)"""
+        if self._suppression is None:
+            self._suppression = SuppressionList(self.db_path)
+        return self._suppression
+    
+    def sync_provider_suppressions(self):
+        """
+        Importa las listas de rebotes, quejas de spam y bajas de SendGrid
+        
+        Complementa al Event Webhook (src/email_events.py) para direcciones
+        suprimidas antes de configurarlo o desde el panel de SendGrid.
+        
+        Returns:
+            Direcciones nuevas en la lista de supresión
+        """
+        if not self.api_key:
+            print("❌ Error: Configura SENDGRID_API_KEY en .env")
+            return 0
+        feeds = {'bounces': 'bounce', 'spam_reports': 'spam', 'unsubscribes': 'unsubscribe'}
+        added = 0
+        for feed, reason in feeds.items():
+            try:
+                response = getattr(self.client.client.suppression, feed).get()
+                entries = json.loads(response.body or b'[]')
+            except Exception as e:
+                print(f"⚠️ No se pudo leer la lista '{feed}' de SendGrid: {e}")
+                continue
+            added += self.suppression.import_bounce_feed(entries, reason, source=f"sendgrid_{feed}")
+        print(f"🚫 Lista de supresión: {added} direcciones nuevas desde SendGrid")
+        return added
+    
+    # ===== CUOTA DIARIA =====
+    @property
+    def quota(self):
+        """Emails enviados hoy, compartidos por todos los procesos (src/campaign_jobs.py)"""
+        if self._quota is None:
+            self._quota = DailyQuota(self.daily_limit, self.db_path)
+        return self._quota
+    
+    def remaining_today(self, day=None):
+        """Emails que aún se pueden enviar hoy (día de TIMEZONE) según MAX_EMAILS_PER_DAY"""
+        return self.quota.remaining(day)
         
     def send_campaign_email(self, to_email, subject, html_content, plain_text_content=None):
         """
@@ -23,11 +147,15 @@ class EmailCampaignManager:
             subject: Asunto del email
             html_content: Contenido HTML del email
             plain_text_content: Contenido en texto plano (opcional)
+        
+        Returns:
+            Registro del envío con 'status' ('sent' o 'failed'), o None sin API key
         """
         if not self.api_key:
             print("❌ Error: Configura SENDGRID_API_KEY en .env")
             return None
         
+        record = {'to': to_email, 'subject': subject}
         try:
             message = Mail(
                 from_email=Email(self.from_email, self.from_name),
@@ -37,60 +165,250 @@ class EmailCampaignManager:
                 plain_text_content=plain_text_content or self._html_to_text(html_content)
             )
             
-            sg = SendGridAPIClient(self.api_key)
-            response = sg.send(message)
-            
-            print(f"✅ Email enviado a {to_email} - Status: {response.status_code}")
-            
-            return {
-                'to': to_email,
-                'subject': subject,
-                'status_code': response.status_code,
-                'sent_at': datetime.now().isoformat(),
-                'status': 'sent'
-            }
+            self.rate_limiter.acquire()
+            response = self.client.send(message)
+            record.update(status_code=response.status_code, sent_at=datetime.now().isoformat(), status='sent')
+            self.quota.add()
             
         except Exception as e:
             print(f"❌ Error enviando email a {to_email}: {e}")
-            return None
+            record.update(status='failed', error=str(e))
+        
+        return record
     
-    def send_bulk_campaign(self, leads_list, subject, html_template):
+    def send_bulk_campaign(self, leads_list, subject, html_template, campaign_id=None, segment=None):
         """
         Envía emails en masa a una lista de leads
         
+        La campaña se guarda como trabajo persistente (src/campaign_jobs.py)
+        con una fila por destinatario: relanzar la misma campaña (mismo
+        campaign_id, por defecto derivado de asunto + template) solo envía
+        a quienes aún no la recibieron. Ver run_campaign.
+        
         Args:
             leads_list: Lista de diccionarios con info de leads [{email, name}, ...]
             subject: Asunto del email
-            html_template: Template HTML con placeholders {name}, {email}, etc.
+            html_template: Template HTML (texto o EmailTemplate) con placeholders {name}, {email}, etc.
+            campaign_id: Id del trabajo (opcional)
+            segment: Segmento de origen, solo informativo
+        
+        Returns:
+            Registro por destinatario: [{to, lead_id, status, status_code, sent_at, error}, ...]
+            con status sent / failed / deferred / unconfirmed / skipped / suppressed
         """
-        results = []
+        if not self.api_key:
+            print("❌ Error: Configura SENDGRID_API_KEY en .env")
+            return []
         
-        for lead in leads_list:
-            # Personalizar contenido
-            html_content = html_template.format(
-                name=lead.get('name', 'Amigo'),
-                email=lead.get('email'),
-                **BUSINESS_INFO
-            )
-            
-            result = self.send_campaign_email(
-                to_email=lead.get('email'),
-                subject=subject,
-                html_content=html_content
-            )
-            
-            if result:
-                results.append(result)
+        source = html_template if isinstance(html_template, str) else html_template.render()
+        campaign_id = self.jobs.create_job(subject, source, leads_list, campaign_id, segment)
+        self.run_campaign(campaign_id)
         
-        print(f"\n📊 Campaña completada: {len(results)}/{len(leads_list)} emails enviados")
-        return results
+        recipients = [recipient_key(lead) or f"row:{index}" for index, lead in enumerate(leads_list)]
+        return [
+            {'to': row['email'], 'lead_id': row['lead_id'], 'subject': subject, 'campaign_id': campaign_id,
+             'status': LEDGER_STATUS.get(row['status'], row['status']), 'status_code': row['status_code'],
+             'sent_at': row['sent_at'], 'error': row['error']}
+            for row in self.jobs.ledger(campaign_id, recipients)
+        ]
+    
+    def run_campaign(self, campaign_id, max_emails=None, due=None):
+        """
+        Envía (o reanuda) un trabajo de campaña hasta terminarlo o agotar la cuota
+        
+        El template se compila una sola vez (src/email_template.py); {name} y
+        {email} viajan como sustituciones de SendGrid, agrupando hasta
+        EMAIL_BATCH_SIZE destinatarios (personalizations) por petición. Los
+        lotes se envían en paralelo (EMAIL_SEND_WORKERS hilos, un solo
+        cliente HTTP) respetando EMAIL_SEND_RATE_PER_SECOND y la cuota
+        MAX_EMAILS_PER_DAY. Cada lote se marca 'sending' antes de enviarse y
+        su resultado se guarda al terminar (checkpoint), así un reinicio
+        continúa con los pendientes sin repetir envíos. Los destinatarios en
+        la lista de supresión se marcan 'suppressed' sin enviarse ni gastar cuota.
+        
+        Args:
+            campaign_id: Id del trabajo
+            max_emails: Máximo de envíos en esta ejecución (ritmo de src/send_scheduler.py)
+            due: Momento actual (ISO) para respetar el send_after de cada destinatario
+        
+        Returns:
+            Trabajo con conteos por estado y 'sent_now' (enviados en esta ejecución), o None si no existe
+        """
+        if not self.api_key:
+            print("❌ Error: Configura SENDGRID_API_KEY en .env")
+            return None
+        job = self.jobs.get_job(campaign_id)
+        if not job:
+            print(f"⚠️ Campaña no encontrada: {campaign_id}")
+            return None
+        if job['counts'].get('sending'):
+            print(f"⚠️ {job['counts']['sending']} envíos sin confirmar de una ejecución interrumpida "
+                  f"(no se reenvían; si no llegaron a SendGrid: --resume {campaign_id} --requeue-unconfirmed)")
+        
+        # Personalizar contenido: datos del negocio ahora, datos del lead en SendGrid
+        template = self.compile_template(job['template'])
+        lead_fields = [field for field in template.fields if field in LEAD_FIELDS]
+        if 'unsubscribe_url' in lead_fields and SuppressionList.unsubscribe_token('') is None:
+            print("⚠️ Configura EMAIL_UNSUBSCRIBE_SECRET en .env: los emails salen sin link de baja")
+        base_message = {
+            'from': {'email': self.from_email, 'name': self.from_name},
+            'subject': job['subject'],
+            'content': [
+                {'type': 'text/plain', 'value': template.to_text().bind(TEXT_SUBSTITUTION_TAGS).render()},
+                {'type': 'text/html', 'value': template.bind(SUBSTITUTION_TAGS, escape=False).render()}
+            ],
+            'custom_args': {'campaign_id': campaign_id}
+        }
+        
+        self.jobs.set_status(campaign_id, 'running')
+        timeline = None
+        sent = batches_sent = 0
+        quota_reached = False
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                limit = self.batch_size * self.workers
+                if max_emails is not None:
+                    limit = min(limit, max_emails - sent)
+                    if limit <= 0:
+                        break
+                # La cuota se reserva antes de tomar destinatarios: otro proceso no puede gastarla a la vez
+                day = self.quota.today()
+                reserved = self.quota.reserve(limit)
+                if not reserved:
+                    quota_reached = True
+                    break
+                chunk = self.jobs.claim(campaign_id, reserved, due)
+                if not chunk:
+                    self.quota.release(reserved, day)
+                    break
+                
+                self.suppression.refresh()
+                suppressed = [lead for lead in chunk if self.suppression.is_suppressed(lead['email'])]
+                if suppressed:
+                    self.jobs.record_results(campaign_id, [{'recipient': lead['recipient'], 'status': 'suppressed'}
+                                                           for lead in suppressed])
+                    skipped = {lead['recipient'] for lead in suppressed}
+                    chunk = [lead for lead in chunk if lead['recipient'] not in skipped]
+                self.quota.release(reserved - len(chunk), day)
+                if not chunk:
+                    continue
+                
+                futures = [pool.submit(self._send_batch, base_message, chunk[i:i + self.batch_size], lead_fields)
+                           for i in range(0, len(chunk), self.batch_size)]
+                for future in as_completed(futures):
+                    records = future.result()
+                    self.jobs.record_results(campaign_id, records)
+                    self.quota.release(sum(1 for r in records if r['status'] != 'sent'), day)
+                    batches_sent += 1
+                    
+                    # Sin hora propia: la línea de tiempo usa la del negocio (sent_at es la del servidor)
+                    sent_events = [(r['lead_id'], 'email_sent', {'subject': job['subject'], 'campaign_id': campaign_id},
+                                    None) for r in records if r['status'] == 'sent' and r['lead_id']]
+                    sent += sum(1 for r in records if r['status'] == 'sent')
+                    if sent_events:
+                        timeline = timeline or ActivityTimeline()
+                        timeline.record_many(sent_events)
+        
+        pending = self.jobs.progress(campaign_id).get('pending', 0)
+        # paused: esperando la cuota de mañana; scheduled: la cola de envío seguirá despachando
+        status = 'completed' if not pending else ('paused' if quota_reached else 'scheduled')
+        self.jobs.set_status(campaign_id, status)
+        job = self.jobs.get_job(campaign_id)
+        if batches_sent or due is None:
+            print(f"\n📊 Campaña {campaign_id}: {sent} emails enviados en {batches_sent} lotes, "
+                  f"{time.perf_counter() - started:.1f}s (total enviados: {job['counts'].get('sent', 0)})"
+                  + (f" — {pending} pendientes" + (" por el límite diario" if quota_reached else '') if pending else ''))
+        return {**job, 'sent_now': sent}
+    
+    def compile_template(self, html_template):
+        """Compila el template y fija los datos del negocio (iguales para todos los destinatarios)"""
+        if not isinstance(html_template, EmailTemplate):
+            html_template = EmailTemplate(html_template)
+        return html_template.bind({k: v for k, v in BUSINESS_INFO.items() if k not in LEAD_FIELDS})
+    
+    @staticmethod
+    def lead_values(lead):
+        """Valores de los campos del lead para personalizar (incluye su link de baja firmado)"""
+        values = {field: lead.get(field) or default for field, default in LEAD_FIELDS.items()}
+        if not lead.get('unsubscribe_url') and lead.get('email'):
+            values['unsubscribe_url'] = SuppressionList.unsubscribe_url(lead['email'])
+        return values
+    
+    def _send_batch(self, base_message, batch, lead_fields=tuple(LEAD_FIELDS)):
+        """
+        Envía un lote de destinatarios en una sola petición
+        
+        429/5xx se reintentan con espera creciente. Un 400 rechaza la petición
+        completa: si SendGrid culpa a destinatarios concretos (errores en
+        personalizations.N) el lote se divide a la mitad hasta aislarlos y el
+        resto se envía; si el error es del mensaje (asunto, remitente,
+        contenido) dividirlo no sirve y el lote entero se marca fallido.
+        """
+        personalizations = []
+        for lead in batch:
+            values = self.lead_values(lead)
+            substitutions = {}
+            for field in lead_fields:
+                value = str(values[field])
+                substitutions[SUBSTITUTION_TAGS[field]] = html.escape(value)
+                substitutions[TEXT_SUBSTITUTION_TAGS[field]] = value
+            personalization = {'to': [{'email': lead['email']}], 'substitutions': substitutions}
+            if values['unsubscribe_url']:
+                # Baja con un clic desde el cliente de correo (RFC 8058)
+                personalization['headers'] = {'List-Unsubscribe': f"<{values['unsubscribe_url']}>",
+                                              'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click'}
+            if lead.get('recipient'):
+                # Identifica el envío en los eventos del proveedor (campaña + destinatario)
+                personalization['custom_args'] = {'recipient': lead['recipient']}
+            personalizations.append(personalization)
+        message = {**base_message, 'personalizations': personalizations}
+        
+        for attempt in range(EMAIL_SEND_RETRIES + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self.client.send(message)
+                break
+            except Exception as e:
+                status_code = getattr(e, 'status_code', None)
+                if status_code == 400 and len(batch) > 1 and self._recipient_error(e):
+                    middle = len(batch) // 2
+                    return (self._send_batch(base_message, batch[:middle], lead_fields)
+                            + self._send_batch(base_message, batch[middle:], lead_fields))
+                if status_code in RETRYABLE_STATUS and attempt < EMAIL_SEND_RETRIES:
+                    time.sleep(2 ** attempt)
+                    continue
+                error = getattr(e, 'body', None) or str(e)
+                if isinstance(error, bytes):
+                    error = error.decode('utf-8', 'replace')
+                print(f"❌ Error enviando lote de {len(batch)} emails: {status_code or ''} {error[:200]}")
+                return [{'to': lead['email'], 'lead_id': lead.get('id'), 'recipient': lead.get('recipient'),
+                         'subject': base_message['subject'], 'status': 'failed', 'status_code': status_code,
+                         'error': error[:500]}
+                        for lead in batch]
+        
+        sent_at = datetime.now().isoformat()
+        return [{'to': lead['email'], 'lead_id': lead.get('id'), 'recipient': lead.get('recipient'),
+                 'subject': base_message['subject'], 'status': 'sent', 'status_code': response.status_code,
+                 'sent_at': sent_at}
+                for lead in batch]
+    
+    @staticmethod
+    def _recipient_error(error):
+        """True si el 400 de SendGrid apunta a destinatarios (errors[].field = personalizations.N...)"""
+        body = getattr(error, 'body', None)
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', 'replace')
+        try:
+            errors = json.loads(body).get('errors') or []
+        except (TypeError, ValueError, AttributeError):
+            return False
+        return any(isinstance(item, dict) and str(item.get('field') or '').startswith('personalizations.')
+                   for item in errors)
     
     def _html_to_text(self, html):
-        """Convierte HTML básico a texto plano"""
-        # Remover tags HTML básicos
-        import re
-        text = re.sub('<[^<]+?>', '', html)
-        return text
+        """Convierte HTML a texto plano (bloques, enlaces y entidades; ver src/email_template.py)"""
+        return html_to_text(html)
     
     def create_email_template(self, body_content):
         """
@@ -193,7 +511,7 @@ class EmailCampaignManager:
             </p>
             <p style="font-size: 10px; color: #999;">
                 Estás recibiendo este email porque te interesaron nuestros retiros espirituales.<br>
-                Si no deseas recibir más emails, <a href="#">haz click aquí</a>.
+                Si no deseas recibir más emails, <a href="{{unsubscribe_url}}">haz click aquí</a>.
             </p>
         </div>
     </div>
@@ -202,8 +520,16 @@ class EmailCampaignManager:
 """
         return template
     
-    def load_leads_from_file(self, filepath='data/leads.json'):
-        """Carga la lista de leads desde un archivo JSON"""
+    def load_leads_from_file(self, filepath=None):
+        """
+        Carga la lista de leads
+        
+        Args:
+            filepath: JSON externo a leer; si no se indica se usa la base de datos de leads
+        """
+        if filepath is None:
+            return LeadStore().find()
+        
         if os.path.exists(filepath):
             with open(filepath, 'r', encoding='utf-8') as f:
                 return json.load(f)
@@ -220,7 +546,7 @@ if __name__ == "__main__":
     body_content = """
     <h2>¿Listo para tu Transformación Espiritual? 🌿</h2>
     
-    <p>Hola {{name}},</p>
+    <p>Hola {name},</p>
     
     <p>Te invitamos a descubrir el poder sanador de la medicina ancestral en nuestros retiros de 
     Ayahuasca en Valle de Bravo, México.</p>
@@ -263,4 +589,4 @@ if __name__ == "__main__":
     # )
     
     print("💡 Para usar este módulo, configura SENDGRID_API_KEY en .env")
-    print("📋 Agrega tus leads en data/leads.json")
+    print("📋 Agrega tus leads con leads_manager_tool (se guardan en SQLite)")
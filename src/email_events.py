@@ -0,0 +1,317 @@
+"""
+Eventos de email del proveedor (entregado, abierto, clic, rebote...)
+
+SendGrid envía los eventos en lotes a un webhook. Cada evento se guarda
+una sola vez (clave sg_event_id) en una tabla que solo crece, y en la
+misma transacción se actualizan contadores por campaña y por lead, así
+las tasas de apertura o clic se consultan leyendo unas pocas filas sin
+recorrer los eventos. Aperturas, clics y rebotes también se agregan a la
+línea de tiempo del lead (src/activity_timeline.py), y los rebotes, quejas
+de spam y bajas alimentan la lista de supresión (src/suppression.py).
+"""
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+from datetime import datetime
+import pytz
+from flask import Blueprint, request, jsonify
+from config.settings import TIMEZONE, EMAIL_WEBHOOK_TOKEN
+from src.activity_timeline import ActivityTimeline
+from src.db import connect
+from src.suppression import SuppressionList, SUPPRESSING_EVENTS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS email_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id TEXT NOT NULL UNIQUE,
+    campaign_id TEXT,
+    recipient TEXT,
+    lead_id INTEGER,
+    email TEXT,
+    event TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    url TEXT,
+    reason TEXT
+);
+CREATE TABLE IF NOT EXISTS email_event_firsts (
+    campaign_id TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    event TEXT NOT NULL,
+    PRIMARY KEY (campaign_id, recipient, event)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS email_campaign_stats (
+    campaign_id TEXT NOT NULL,
+    event TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    unique_total INTEGER NOT NULL DEFAULT 0,
+    last_at TEXT,
+    PRIMARY KEY (campaign_id, event)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS email_lead_stats (
+    lead_id INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    last_at TEXT,
+    PRIMARY KEY (lead_id, event)
+) WITHOUT ROWID;
+"""
+
+# Eventos que se copian a la línea de tiempo del lead
+TIMELINE_EVENTS = {
+    'open': 'email_open',
+    'click': 'email_click',
+    'bounce': 'email_bounce'
+}
+
+# Probabilidades del stand-in local: rebote por destinatario, apertura por entregado,
+# clic por apertura y reapertura (evento repetido del mismo destinatario)
+SYNTHETIC_RATES = {
+    'bounce': 0.03,
+    'open': 0.45,
+    'click': 0.25,
+    'reopen': 0.3
+}
+
+
+def lead_id_from_recipient(recipient):
+    """'lead:123' -> 123 (ver src/campaign_jobs.py)"""
+    if recipient and recipient.startswith('lead:'):
+        try:
+            return int(recipient[5:])
+        except ValueError:
+            return None
+    return None
+
+
+class EmailEventStore:
+    """
+    Registro de eventos de email con contadores incrementales por campaña y por lead
+    """
+
+    def __init__(self, db_path=None, timeline=None, suppression=None):
+        """
+        Args:
+            db_path: Ruta de la base de datos (por defecto DATABASE_PATH)
+            timeline: ActivityTimeline donde copiar aperturas/clics (por defecto se crea)
+            suppression: SuppressionList donde registrar rebotes/bajas (por defecto en la misma base)
+        """
+        self.conn = connect(db_path)
+        self.db_path = db_path
+        self.timeline = timeline
+        self.suppression = suppression
+        self.timezone = pytz.timezone(TIMEZONE)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.executescript(SCHEMA)
+
+    # ===== INGESTA =====
+    def ingest(self, events):
+        """
+        Guarda un lote de eventos del webhook (los repetidos se ignoran)
+
+        Args:
+            events: Lista de eventos de SendGrid (email, event, timestamp,
+                    sg_event_id, url, reason y los custom_args campaign_id/recipient)
+
+        Returns:
+            {'received', 'stored', 'duplicates'}
+        """
+        stored = 0
+        timeline_events = []
+        suppressing = []
+        with self._lock, self.conn:
+            for event in events:
+                if not isinstance(event, dict):
+                    continue
+                kind = event.get('event')
+                if not kind:
+                    continue
+                campaign_id = event.get('campaign_id')
+                recipient = event.get('recipient') or (f"email:{event['email'].lower()}" if event.get('email') else None)
+                lead_id = lead_id_from_recipient(recipient)
+                ts = self._timestamp(event.get('timestamp'))
+                event_id = event.get('sg_event_id') or hashlib.sha1(
+                    json.dumps(event, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO email_events (event_id, campaign_id, recipient, lead_id, email, event, ts, url, reason) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (event_id, campaign_id, recipient, lead_id, event.get('email'), kind, ts,
+                     event.get('url'), event.get('reason'))
+                )
+                if not cursor.rowcount:
+                    continue
+                stored += 1
+                if kind in SUPPRESSING_EVENTS:
+                    suppressing.append(event)
+
+                if campaign_id:
+                    first = 0
+                    if recipient:
+                        first = self.conn.execute(
+                            "INSERT OR IGNORE INTO email_event_firsts (campaign_id, recipient, event) VALUES (?, ?, ?)",
+                            (campaign_id, recipient, kind)
+                        ).rowcount
+                    self.conn.execute(
+                        "INSERT INTO email_campaign_stats (campaign_id, event, total, unique_total, last_at) "
+                        "VALUES (?, ?, 1, ?, ?) ON CONFLICT(campaign_id, event) DO UPDATE SET "
+                        "total = total + 1, unique_total = unique_total + excluded.unique_total, "
+                        "last_at = MAX(IFNULL(last_at, ''), excluded.last_at)",
+                        (campaign_id, kind, first, ts)
+                    )
+                if lead_id:
+                    self.conn.execute(
+                        "INSERT INTO email_lead_stats (lead_id, event, total, last_at) VALUES (?, ?, 1, ?) "
+                        "ON CONFLICT(lead_id, event) DO UPDATE SET total = total + 1, "
+                        "last_at = MAX(IFNULL(last_at, ''), excluded.last_at)",
+                        (lead_id, kind, ts)
+                    )
+                    if kind in TIMELINE_EVENTS:
+                        details = {'campaign_id': campaign_id}
+                        if event.get('url'):
+                            details['url'] = event['url']
+                        if event.get('reason'):
+                            details['reason'] = event['reason']
+                        timeline_events.append((lead_id, TIMELINE_EVENTS[kind], details, ts))
+
+        if timeline_events:
+            self.timeline = self.timeline or ActivityTimeline()
+            self.timeline.record_many(timeline_events)
+        if suppressing:
+            self.suppression = self.suppression or SuppressionList(self.db_path)
+            self.suppression.ingest_events(suppressing)
+        return {'received': len(events), 'stored': stored, 'duplicates': len(events) - stored}
+
+    def _timestamp(self, value):
+        """Unix (SendGrid) -> ISO en la hora del negocio, igual que el resto de registros"""
+        if value is None:
+            return datetime.now(self.timezone).replace(tzinfo=None).isoformat()
+        try:
+            moment = datetime.fromtimestamp(float(value), self.timezone)
+        except (TypeError, ValueError):
+            return str(value)
+        return moment.replace(tzinfo=None).isoformat()
+
+    # ===== CONSULTAS =====
+    def campaign_stats(self, campaign_id):
+        """
+        Contadores y tasas de una campaña (lee solo sus filas de contadores)
+
+        Returns:
+            {'delivered', 'open', 'unique_open', 'click', 'unique_click', 'bounce', ...,
+             'open_rate', 'click_rate', 'bounce_rate'} — tasas en % sobre entregados
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT event, total, unique_total, last_at FROM email_campaign_stats WHERE campaign_id = ?",
+                (campaign_id,)
+            ).fetchall()
+        stats = {'campaign_id': campaign_id}
+        last_at = None
+        for row in rows:
+            stats[row['event']] = row['total']
+            stats[f"unique_{row['event']}"] = row['unique_total']
+            last_at = max(last_at or '', row['last_at'] or '') or None
+        delivered = stats.get('unique_delivered', 0)
+        attempted = delivered + stats.get('unique_bounce', 0)
+        stats['open_rate'] = round(stats.get('unique_open', 0) * 100 / delivered, 1) if delivered else 0.0
+        stats['click_rate'] = round(stats.get('unique_click', 0) * 100 / delivered, 1) if delivered else 0.0
+        stats['bounce_rate'] = round(stats.get('unique_bounce', 0) * 100 / attempted, 1) if attempted else 0.0
+        stats['last_event_at'] = last_at
+        return stats
+
+    def lead_stats(self, lead_id):
+        """Conteo por tipo de evento de un lead y su último momento"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT event, total, last_at FROM email_lead_stats WHERE lead_id = ?", (lead_id,)
+            ).fetchall()
+        return {row['event']: {'total': row['total'], 'last': row['last_at']} for row in rows}
+
+    def recent_campaigns(self, limit=5):
+        """Campañas con eventos más recientes y sus tasas"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT campaign_id, MAX(last_at) AS last_at FROM email_campaign_stats "
+                "GROUP BY campaign_id ORDER BY last_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self.campaign_stats(row['campaign_id']) for row in rows]
+
+
+def format_campaign_stats(stats):
+    """Resumen de una línea de las métricas de una campaña"""
+    return (f"{stats['campaign_id']}: 📬 {stats.get('unique_delivered', 0)} entregados | "
+            f"👀 {stats['open_rate']}% aperturas | 🖱️ {stats['click_rate']}% clics | "
+            f"↩️ {stats['bounce_rate']}% rebotes")
+
+
+def email_events_blueprint(store=None, token=None):
+    """
+    Endpoint POST /email/events para el Event Webhook de SendGrid
+
+    Configura en SendGrid la URL https://<servidor>/email/events?token=<EMAIL_WEBHOOK_TOKEN>.
+    Sin EMAIL_WEBHOOK_TOKEN el endpoint rechaza todo (503): no se aceptan
+    eventos sin autenticar.
+    """
+    blueprint = Blueprint('email_events', __name__)
+    token = token if token is not None else EMAIL_WEBHOOK_TOKEN
+    state = {'store': store}
+
+    @blueprint.route('/email/events', methods=['POST'])
+    def receive_events():
+        if not token:
+            return jsonify({"error": "EMAIL_WEBHOOK_TOKEN no configurado"}), 503
+        if not hmac.compare_digest(request.args.get('token', '').encode('utf-8'), token.encode('utf-8')):
+            return jsonify({"error": "unauthorized"}), 401
+        events = request.get_json(silent=True)
+        if not isinstance(events, list):
+            return jsonify({"error": "se esperaba una lista de eventos"}), 400
+        state['store'] = state['store'] or EmailEventStore()
+        return jsonify(state['store'].ingest(events)), 200
+
+    return blueprint
+
+
+def synthetic_events(campaign_id, recipients, seed=None):
+    """
+    Lote de eventos de prueba con la forma de los de SendGrid (stand-in local)
+
+    Args:
+        campaign_id: Campaña a la que pertenecen
+        recipients: Lista de (clave de destinatario, email), ej. ('lead:1', 'ana@mail.com')
+    """
+    rng = random.Random(seed)
+    now = int(time.time())
+    events = []
+    for recipient, email in recipients:
+        def add(kind, delay=0, **extra):
+            events.append({'email': email, 'event': kind, 'timestamp': now + delay, 'campaign_id': campaign_id,
+                           'recipient': recipient, 'sg_event_id': f"{rng.getrandbits(64):016x}", **extra})
+
+        if rng.random() < SYNTHETIC_RATES['bounce']:
+            add('bounce', reason='550 5.1.1 mailbox unavailable')
+            continue
+        add('delivered')
+        if rng.random() < SYNTHETIC_RATES['open']:
+            add('open', rng.randint(60, 86400))
+            if rng.random() < SYNTHETIC_RATES['reopen']:
+                add('open', rng.randint(86400, 172800))
+            if rng.random() < SYNTHETIC_RATES['click']:
+                add('click', rng.randint(60, 86400), url='https://sacred-rebirth.com/appointment')
+    return events
+
+
+if __name__ == "__main__":
+    # Stand-in local: python -m src.email_events http://localhost:5000/email/events?token=...
+    import sys
+    import requests
+
+    url = sys.argv[1] if len(sys.argv) > 1 else 'http://localhost:5000/email/events'
+    recipients = [(f"lead:{i}", f"lead{i}@example.com") for i in range(1, 1001)]
+    events = synthetic_events('synthetic-campaign', recipients, seed=42)
+    for start in range(0, len(events), 500):
+        response = requests.post(url, json=events[start:start + 500], timeout=30)
+        print(f"📨 Lote {start // 500 + 1}: {response.status_code} {response.text.strip()}")
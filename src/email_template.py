@@ -0,0 +1,246 @@
+"""
+Templates de email compilados
+
+Un template se analiza una sola vez y queda como una lista de segmentos
+estáticos intercalados con espacios con nombre ({name}, {website}...).
+Personalizar para un lead es solo un join de cadenas, sin volver a
+analizar el HTML. A diferencia de str.format, las llaves que no rodean un
+identificador (ej. los bloques CSS) se tratan como texto.
+
+La parte de texto plano también se genera una vez por campaña
+(EmailTemplate.to_text) con un convertidor HTML -> texto en streaming.
+"""
+import html
+import re
+import time
+from html.parser import HTMLParser
+
+# {campo} es un espacio; {{ y }} son llaves literales; cualquier otra llave es texto
+_TOKEN = re.compile(r'\{\{|\}\}|\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+# Marcadores de espacio (uso privado de Unicode) que sobreviven a la conversión a texto
+_SLOT_MARK = re.compile('\ue000(\\d+)\ue001')
+
+# Etiquetas que inician una línea nueva / un párrafo en el texto plano
+BLOCK_TAGS = {'div', 'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'li', 'table', 'tr',
+              'blockquote', 'section', 'article', 'header', 'footer', 'hr', 'pre'}
+PARAGRAPH_TAGS = {'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'table', 'blockquote'}
+# Etiquetas cuyo contenido no se muestra
+HIDDEN_TAGS = {'style', 'script', 'head', 'title'}
+
+
+class HTMLToText(HTMLParser):
+    """
+    Convertidor HTML -> texto plano en streaming (feed() por partes, close() al final)
+
+    Bloques en líneas propias, <br> como salto, viñetas para <li>, enlaces
+    como "texto (url)", entidades decodificadas y espacios colapsados.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines = []
+        self._line = []
+        self._hidden = 0
+        self._links = []
+        self._blank = True
+
+    def handle_starttag(self, tag, attrs):
+        if tag in HIDDEN_TAGS:
+            self._hidden += 1
+        elif tag == 'br':
+            self._break()
+        elif tag in BLOCK_TAGS:
+            self._break(paragraph=tag in PARAGRAPH_TAGS)
+            if tag == 'li':
+                self._line.append('• ')
+            elif tag == 'hr':
+                self._line.append('-' * 20)
+                self._break()
+        elif tag == 'a':
+            self._links.append((dict(attrs).get('href') or '', len(self._line)))
+
+    def handle_endtag(self, tag):
+        if tag in HIDDEN_TAGS:
+            self._hidden = max(self._hidden - 1, 0)
+        elif tag in BLOCK_TAGS:
+            self._break(paragraph=tag in PARAGRAPH_TAGS)
+        elif tag == 'a' and self._links:
+            href, start = self._links.pop()
+            label = ''.join(self._line[start:]).strip()
+            if href and not href.startswith('#') and href not in label:
+                if label:
+                    self._line[-1] = self._line[-1].rstrip()
+                self._line.append(f" ({href})" if label else href)
+
+    def handle_data(self, data):
+        if self._hidden:
+            return
+        text = re.sub(r'\s+', ' ', data)
+        if not self._line or self._line[-1].endswith((' ', '• ')):
+            text = text.lstrip()
+        if text:
+            self._line.append(text)
+
+    def _break(self, paragraph=False):
+        line = ''.join(self._line).strip()
+        self._line = []
+        if line:
+            self.lines.append(line)
+            self._blank = False
+        if paragraph and not self._blank:
+            self.lines.append('')
+            self._blank = True
+
+    def close(self):
+        super().close()
+        self._break()
+        while self.lines and not self.lines[-1]:
+            self.lines.pop()
+        return '\n'.join(self.lines)
+
+
+def html_to_text(source):
+    """Convierte HTML a texto plano legible (ver HTMLToText)"""
+    converter = HTMLToText()
+    converter.feed(source)
+    return converter.close()
+
+
+class EmailTemplate:
+    """
+    Template compilado: segmentos estáticos y espacios con nombre
+
+    segments siempre tiene un elemento más que slots:
+    segments[0] + valor(slots[0]) + segments[1] + ... + segments[-1]
+    """
+
+    def __init__(self, source='', escape=True):
+        """
+        Args:
+            source: Texto del template con placeholders {campo}
+            escape: Escapar los valores como HTML al renderizar (False para texto plano)
+        """
+        self.escape = escape
+        self.segments, self.slots = self._compile(source)
+
+    @staticmethod
+    def _compile(source):
+        segments, slots = [], []
+        current = []
+        position = 0
+        for match in _TOKEN.finditer(source):
+            current.append(source[position:match.start()])
+            token = match.group(0)
+            if match.group(1):
+                segments.append(''.join(current))
+                slots.append(match.group(1))
+                current = []
+            else:
+                current.append(token[0])
+            position = match.end()
+        current.append(source[position:])
+        segments.append(''.join(current))
+        return segments, slots
+
+    @classmethod
+    def _from_parts(cls, segments, slots, escape):
+        template = cls.__new__(cls)
+        template.escape, template.segments, template.slots = escape, segments, slots
+        return template
+
+    @property
+    def fields(self):
+        """Nombres de los espacios sin repetir, en orden de aparición"""
+        return list(dict.fromkeys(self.slots))
+
+    def _value(self, value, escape):
+        value = '' if value is None else str(value)
+        return html.escape(value) if escape else value
+
+    def bind(self, values, escape=None):
+        """
+        Fija algunos espacios y devuelve un template compilado con los restantes
+
+        Útil para renderizar una vez lo que es igual para todos los
+        destinatarios (datos del negocio) o para insertar etiquetas de
+        sustitución del proveedor.
+
+        Args:
+            values: Diccionario campo -> valor
+            escape: Sobrescribe el escape del template para estos valores
+        """
+        escape = self.escape if escape is None else escape
+        segments, slots = [self.segments[0]], []
+        for slot, segment in zip(self.slots, self.segments[1:]):
+            if slot in values:
+                segments[-1] += self._value(values[slot], escape) + segment
+            else:
+                slots.append(slot)
+                segments.append(segment)
+        return self._from_parts(segments, slots, self.escape)
+
+    def to_text(self):
+        """
+        Versión en texto plano del template, con los mismos espacios
+
+        Se convierte el HTML una sola vez marcando cada espacio; el resultado
+        es otro EmailTemplate (sin escape) que se personaliza igual.
+        """
+        marked = [self.segments[0]]
+        for index, segment in enumerate(self.segments[1:]):
+            marked.append(f"\ue000{index}\ue001{segment}")
+        parts = _SLOT_MARK.split(html_to_text(''.join(marked)))
+        segments = parts[0::2]
+        slots = [self.slots[int(index)] for index in parts[1::2]]
+        return self._from_parts(segments, slots, escape=False)
+
+    def render(self, values=None):
+        """
+        Renderiza el template para un destinatario
+
+        Los espacios sin valor conservan su texto original ({campo}) en lugar
+        de fallar como str.format.
+        """
+        values = values or {}
+        escape = self.escape
+        parts = [self.segments[0]]
+        for slot, segment in zip(self.slots, self.segments[1:]):
+            if slot in values:
+                parts.append(self._value(values[slot], escape))
+            else:
+                parts.append('{' + slot + '}')
+            parts.append(segment)
+        return ''.join(parts)
+
+
+def benchmark(recipients=100000):
+    """Costo por destinatario de renderizar el template de campaña"""
+    from src.email_campaign import EmailCampaignManager
+    from config.settings import BUSINESS_INFO
+
+    manager = EmailCampaignManager()
+    source = manager.create_email_template("<p>Hola {name},</p><p>Tu email registrado es {email}.</p>")
+    leads = [{'name': f"Lead <{i}> & Co", 'email': f"lead{i}@example.com"} for i in range(recipients)]
+
+    started = time.perf_counter()
+    template = EmailTemplate(source).bind({k: v for k, v in BUSINESS_INFO.items() if k not in ('name', 'email')})
+    compile_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    text_template = template.to_text()
+    text_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    total_bytes = 0
+    for lead in leads:
+        total_bytes += len(template.render(lead)) + len(text_template.render(lead))
+    elapsed = time.perf_counter() - started
+
+    print(f"🧩 Compilación: {compile_ms:.2f} ms HTML + {text_ms:.2f} ms texto plano "
+          f"({len(template.slots)} espacios por lead)")
+    print(f"📨 {recipients} destinatarios en {elapsed:.2f}s -> {elapsed / recipients * 1e6:.1f} µs por lead "
+          f"({total_bytes / recipients / 1024:.1f} KB por email, HTML + texto)")
+
+
+if __name__ == "__main__":
+    benchmark()
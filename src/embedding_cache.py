@@ -0,0 +1,208 @@
+"""
+Caché persistente de embeddings para la memoria de CrewAI
+Los vectores se guardan en un numpy memmap y se indexan por hash del contenido
+"""
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from openai import OpenAI
+from config.settings import (
+    OPENAI_API_KEY,
+    EMBEDDING_MODEL,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_CAPACITY
+)
+
+# chromadb es quien consume el embedder dentro de CrewAI; si no está instalado
+# la clase sigue funcionando como callable normal
+try:
+    from chromadb import EmbeddingFunction as _EmbeddingFunctionBase
+except ImportError:
+    _EmbeddingFunctionBase = object
+
+
+class EmbeddingCache:
+    """
+    Caché en disco: <modelo>.f32 (memmap capacity x dims) + <modelo>.index.json
+
+    El índice mapea hash(contenido) -> [slot, último_uso]. Cuando se llena,
+    se desalojan de golpe el 10% de entradas usadas hace más tiempo (LRU).
+    """
+
+    def __init__(self, cache_dir=None, model=None, dimensions=None, capacity=None):
+        self.cache_dir = cache_dir or EMBEDDING_CACHE_DIR
+        self.model = model or EMBEDDING_MODEL
+        self.dimensions = dimensions or EMBEDDING_DIMENSIONS
+        self.capacity = capacity or EMBEDDING_CACHE_CAPACITY
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.vectors_path = os.path.join(self.cache_dir, f"{self.model}.f32")
+        self.index_path = os.path.join(self.cache_dir, f"{self.model}.index.json")
+
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._load()
+
+    def _load(self):
+        """Abre el memmap y el índice, o los crea si no existen o no coinciden"""
+        index = None
+        if os.path.exists(self.index_path) and os.path.exists(self.vectors_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                index = None
+
+        valid = (
+            index is not None
+            and index.get('dimensions') == self.dimensions
+            and index.get('capacity') == self.capacity
+        )
+
+        if valid:
+            self.entries = index['entries']
+            self.clock = index.get('clock', 0)
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+',
+                                     shape=(self.capacity, self.dimensions))
+        else:
+            if index is not None:
+                print("⚠️ Caché de embeddings con otra configuración, se reinicia")
+            self.entries = {}
+            self.clock = 0
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='w+',
+                                     shape=(self.capacity, self.dimensions))
+            self._dirty = True
+
+        used = {slot for slot, _ in self.entries.values()}
+        self._free_slots = [slot for slot in range(self.capacity - 1, -1, -1) if slot not in used]
+
+    @staticmethod
+    def content_key(model, text):
+        """Hash estable del contenido (incluye el modelo para no mezclar espacios)"""
+        return hashlib.sha256(f"{model}\0{text}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Devuelve el vector cacheado o None"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.clock += 1
+            entry[1] = self.clock
+            self._dirty = True
+            self.hits += 1
+            return np.array(self.vectors[entry[0]])
+
+    def put(self, key, vector):
+        """Guarda un vector, desalojando entradas antiguas si no hay espacio"""
+        vector = np.asarray(vector, dtype=np.float32)
+        if vector.shape != (self.dimensions,):
+            raise ValueError(f"Dimensión inesperada {vector.shape}, se esperaba ({self.dimensions},)")
+
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if not self._free_slots:
+                    self._evict()
+                slot = self._free_slots.pop()
+                entry = [slot, 0]
+                self.entries[key] = entry
+            self.clock += 1
+            entry[1] = self.clock
+            self.vectors[entry[0]] = vector
+            self._dirty = True
+
+    def _evict(self):
+        """Libera el 10% de slots menos usados recientemente"""
+        count = max(1, self.capacity // 10)
+        oldest = sorted(self.entries.items(), key=lambda item: item[1][1])[:count]
+        for key, (slot, _) in oldest:
+            del self.entries[key]
+            self._free_slots.append(slot)
+        self.evictions += len(oldest)
+
+    def flush(self):
+        """Persiste vectores e índice (el índice se escribe de forma atómica)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self.vectors.flush()
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'model': self.model,
+                    'dimensions': self.dimensions,
+                    'capacity': self.capacity,
+                    'clock': self.clock,
+                    'entries': self.entries
+                }, f)
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+
+    def stats(self):
+        """Estadísticas de uso de la caché"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class CachedOpenAIEmbedder(_EmbeddingFunctionBase):
+    """
+    Función de embeddings compatible con CrewAI/chromadb que consulta la caché
+    antes de llamar a la API de OpenAI
+    """
+
+    def __init__(self, cache=None, model=None, api_key=None, batch_size=256):
+        self.model = model or EMBEDDING_MODEL
+        self.cache = cache or EmbeddingCache(model=self.model)
+        self.client = OpenAI(api_key=api_key or OPENAI_API_KEY)
+        self.batch_size = batch_size
+
+    def __call__(self, input):
+        """
+        Args:
+            input: Lista de textos a vectorizar
+
+        Returns:
+            Lista de vectores en el mismo orden
+        """
+        texts = [input] if isinstance(input, str) else list(input)
+        keys = [EmbeddingCache.content_key(self.model, text) for text in texts]
+        results = [self.cache.get(key) for key in keys]
+
+        # Solo se piden a la API los textos únicos que no estaban en caché
+        pending = {}
+        for i, vector in enumerate(results):
+            if vector is None:
+                pending.setdefault(keys[i], texts[i])
+
+        pending_items = list(pending.items())
+        fresh = {}
+        for start in range(0, len(pending_items), self.batch_size):
+            batch = pending_items[start:start + self.batch_size]
+            response = self.client.embeddings.create(model=self.model, input=[text for _, text in batch])
+            for (key, _), item in zip(batch, response.data):
+                fresh[key] = item.embedding
+                self.cache.put(key, item.embedding)
+
+        if fresh:
+            self.cache.flush()
+
+        return [
+            vector.tolist() if vector is not None else list(fresh[keys[i]])
+            for i, vector in enumerate(results)
+        ]
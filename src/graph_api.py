@@ -0,0 +1,590 @@
+"""
+Cliente asíncrono de la Graph API de Meta (Facebook / Instagram)
+
+Un solo cliente por event loop con una sesión HTTP compartida: las
+conexiones TLS se reutilizan entre publicaciones, cada petición tiene
+timeout y los errores de Meta se convierten en excepciones por tipo
+(token, permisos, límite de peticiones, fallo temporal). La versión de la
+API se configura en META_GRAPH_API_VERSION.
+
+En Instagram cada imagen es primero un contenedor que Meta procesa en
+segundo plano: se consulta su estado con espera creciente y solo se
+publica cuando está FINISHED. Los contenedores de un carrusel se preparan
+en paralelo.
+
+Las operaciones en masa (publicar una semana de contenido, traer métricas
+de decenas de posts) viajan como peticiones batch: hasta 50 operaciones por
+llamada HTTP, con referencias entre operaciones ({result=nombre:$.id}) y un
+resultado (o error) por operación. Cada operación puede llevar sus propios
+encabezados (ej. If-None-Match con el ETag de la lectura anterior: si nada
+cambió Meta responde 304 sin cuerpo).
+
+El código asíncrono (bot de Telegram) usa get_client() y await; el código
+síncrono (herramientas de CrewAI, MayaEnterprise) usa run_sync(), que
+ejecuta la corrutina en un event loop de fondo compartido.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+import weakref
+import aiohttp
+import time
+from urllib.parse import urlencode
+from config.settings import (META_ACCESS_TOKEN, META_GRAPH_API_VERSION, GRAPH_API_URL, GRAPH_API_TIMEOUT,
+                             GRAPH_API_MAX_CONNECTIONS, GRAPH_API_RETRIES, INSTAGRAM_CONTAINER_TIMEOUT,
+                             INSTAGRAM_POLL_SECONDS)
+
+# Códigos de error de la Graph API por tipo
+AUTH_ERROR_CODES = {102, 190}
+PERMISSION_ERROR_CODES = {10} | set(range(200, 300))
+RATE_LIMIT_ERROR_CODES = {4, 17, 32, 341, 613} | set(range(80001, 80015))
+TRANSIENT_ERROR_CODES = {1, 2}
+
+# Imágenes por carrusel de Instagram y espera máxima entre consultas de estado (s)
+CAROUSEL_MAX_ITEMS = 10
+CONTAINER_POLL_MAX_SECONDS = 15
+
+# Operaciones por petición batch (límite de la Graph API)
+BATCH_MAX_OPERATIONS = 50
+RESULT_REFERENCE = re.compile(r'\{result=([^:}]+):')
+
+
+class GraphAPIError(Exception):
+    """Error devuelto por la Graph API (o de conexión con ella)"""
+
+    retryable = False
+
+    def __init__(self, message, status=None, code=None, subcode=None, error_type=None, fbtrace_id=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.code = code
+        self.subcode = subcode
+        self.error_type = error_type
+        self.fbtrace_id = fbtrace_id
+
+    def __str__(self):
+        details = ', '.join(f"{k}={v}" for k, v in (('status', self.status), ('code', self.code),
+                                                    ('subcode', self.subcode)) if v is not None)
+        return f"{self.message} ({details})" if details else self.message
+
+
+class GraphAuthError(GraphAPIError):
+    """Token inválido o expirado: hay que renovar el access token"""
+
+
+class GraphPermissionError(GraphAPIError):
+    """Al token le falta un permiso (ej. pages_manage_posts)"""
+
+
+class GraphRateLimitError(GraphAPIError):
+    """Límite de peticiones de la app, del usuario o de la página"""
+    retryable = True
+
+
+class GraphTransientError(GraphAPIError):
+    """Fallo temporal de Meta, timeout o error de red"""
+    retryable = True
+
+
+def error_from_response(status, payload):
+    """Respuesta de error de la Graph API -> excepción de su tipo"""
+    error = (payload or {}).get('error') or {}
+    code = error.get('code')
+    kwargs = {'status': status, 'code': code, 'subcode': error.get('error_subcode'),
+              'error_type': error.get('type'), 'fbtrace_id': error.get('fbtrace_id')}
+    message = error.get('message') or f"HTTP {status}"
+    if code in AUTH_ERROR_CODES or (error.get('type') == 'OAuthException' and status == 401):
+        return GraphAuthError(message, **kwargs)
+    if code in PERMISSION_ERROR_CODES:
+        return GraphPermissionError(message, **kwargs)
+    if code in RATE_LIMIT_ERROR_CODES or status == 429:
+        return GraphRateLimitError(message, **kwargs)
+    if code in TRANSIENT_ERROR_CODES or error.get('is_transient') or status >= 500:
+        return GraphTransientError(message, **kwargs)
+    return GraphAPIError(message, **kwargs)
+
+
+class GraphAPIClient:
+    """
+    Sesión HTTP compartida con la Graph API (pool de conexiones, timeouts y reintentos)
+    """
+
+    def __init__(self, access_token=None, version=None, base_url=None, timeout=None, max_connections=None,
+                 retries=None, poll_seconds=None):
+        """
+        Args:
+            access_token: Token por defecto (META_ACCESS_TOKEN); cada petición puede usar otro
+            version: Versión de la API (META_GRAPH_API_VERSION)
+            base_url: Host de la API (GRAPH_API_URL)
+            timeout: Segundos máximos por petición (GRAPH_API_TIMEOUT)
+            max_connections: Conexiones simultáneas del pool (GRAPH_API_MAX_CONNECTIONS)
+            retries: Reintentos de lecturas ante límites o fallos temporales (GRAPH_API_RETRIES)
+            poll_seconds: Primera espera entre consultas de estado de contenedores (INSTAGRAM_POLL_SECONDS)
+        """
+        self.access_token = access_token or META_ACCESS_TOKEN
+        self.version = version or META_GRAPH_API_VERSION
+        self.base_url = f"{(base_url or GRAPH_API_URL).rstrip('/')}/{self.version}"
+        self.timeout = aiohttp.ClientTimeout(total=timeout or GRAPH_API_TIMEOUT)
+        self.max_connections = max_connections or GRAPH_API_MAX_CONNECTIONS
+        self.retries = GRAPH_API_RETRIES if retries is None else retries
+        self.poll_seconds = poll_seconds or INSTAGRAM_POLL_SECONDS
+        self._session = None
+
+    @property
+    def session(self):
+        """Sesión aiohttp (se crea una sola vez, en el event loop que la usa)"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=self.timeout, connector=aiohttp.TCPConnector(limit=self.max_connections))
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ===== PETICIONES =====
+    async def request(self, method, path, params=None, data=None, files=None, access_token=None, retries=None):
+        """
+        Petición a la Graph API
+
+        Las lecturas (GET) se reintentan ante límites de peticiones o fallos
+        temporales; las escrituras no, porque un timeout no garantiza que
+        Meta no la haya procesado y reintentar podría duplicar un post.
+
+        Args:
+            path: Ruta relativa a la versión, ej. '123/feed'
+            params: Parámetros de la URL
+            data: Campos del formulario (POST)
+            files: {campo: (nombre de archivo, bytes)} para subir archivos
+            access_token: Token para esta petición (por defecto el del cliente)
+            retries: Reintentos (por defecto GRAPH_API_RETRIES en GET y 0 en POST)
+
+        Returns:
+            Respuesta JSON de la API
+
+        Raises:
+            GraphAPIError (o una subclase)
+        """
+        token = access_token or self.access_token
+        if not token:
+            raise GraphAuthError("Falta el access token de Meta")
+        retries = (self.retries if method == 'GET' else 0) if retries is None else retries
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        params = {**(params or {}), 'access_token': token}
+
+        for attempt in range(retries + 1):
+            try:
+                async with self.session.request(method, url, params=params,
+                                                 data=self._form(data, files)) as response:
+                    try:
+                        payload = await response.json(content_type=None)
+                    except ValueError:
+                        payload = None
+                    if response.status < 400 and not (isinstance(payload, dict) and 'error' in payload):
+                        return payload
+                    error = error_from_response(response.status, payload if isinstance(payload, dict) else None)
+            except asyncio.TimeoutError:
+                error = GraphTransientError(f"Timeout de {self.timeout.total}s en {method} {path}")
+            except aiohttp.ClientError as e:
+                error = GraphTransientError(f"Error de conexión con la Graph API: {e}")
+
+            if not error.retryable or attempt >= retries:
+                raise error
+            await asyncio.sleep(2 ** attempt)
+
+    @staticmethod
+    def _form(data, files):
+        if not files:
+            return data
+        form = aiohttp.FormData()
+        for key, value in (data or {}).items():
+            form.add_field(key, str(value))
+        for key, (filename, content) in files.items():
+            form.add_field(key, content, filename=filename)
+        return form
+
+    async def get(self, path, params=None, **kwargs):
+        return await self.request('GET', path, params=params, **kwargs)
+
+    async def post(self, path, data=None, files=None, **kwargs):
+        return await self.request('POST', path, data=data, files=files, **kwargs)
+
+    # ===== PUBLICACIÓN =====
+    async def publish_page_post(self, message, page_id='me', link=None, image_url=None, image_path=None,
+                                access_token=None):
+        """
+        Publica en una página de Facebook (texto, o foto por URL o archivo local)
+
+        Args:
+            message: Texto del post (pie de foto si hay imagen)
+            page_id: Id de la página ('me' con un token de página)
+            link: URL para compartir (solo posts de texto)
+            image_url: URL pública de la imagen
+            image_path: Archivo local de la imagen (tiene prioridad sobre image_url)
+
+        Returns:
+            {'post_id', 'has_image'}
+        """
+        data = {'message': message}
+        files = None
+        if image_path and os.path.exists(image_path):
+            content = await asyncio.to_thread(_read_file, image_path)
+            files = {'source': (os.path.basename(image_path), content)}
+        elif image_url:
+            data['url'] = image_url
+        elif link:
+            data['link'] = link
+
+        edge = 'photos' if files or 'url' in data else 'feed'
+        result = await self.post(f"{page_id}/{edge}", data=data, files=files, access_token=access_token)
+        # /photos devuelve el id de la foto y el del post en post_id
+        return {'post_id': result.get('post_id') or result.get('id'), 'has_image': edge == 'photos'}
+
+    # ===== BATCH =====
+    async def batch(self, operations, access_token=None, include_headers=False):
+        """
+        Ejecuta operaciones en peticiones batch (BATCH_MAX_OPERATIONS por llamada)
+
+        Una operación que depende de otra (depends_on o una referencia
+        {result=nombre:...}) viaja en la misma llamada que ella; las llamadas
+        independientes se envían en paralelo.
+
+        Args:
+            operations: Lista de batch_operation(...)
+            include_headers: Pedir los encabezados de cada respuesta (ej. ETag)
+
+        Returns:
+            Lista en el mismo orden: {'code', 'body', 'headers', 'error', 'unconfirmed'} por
+            operación (error es un GraphAPIError o None; code 304 = sin cambios desde el ETag
+            enviado). unconfirmed=True marca escrituras sin respuesta (timeout o 5xx de la
+            llamada completa): Meta pudo haberlas ejecutado, no deben reintentarse a ciegas.
+        """
+        results = [None] * len(operations)
+
+        async def run(indices):
+            payload = [_batch_payload(operations[i]) for i in indices]
+            # Solo lecturas: se puede reintentar la llamada completa
+            reads_only = all(op['method'] == 'GET' for op in payload)
+            try:
+                response = await self.post('', data={'batch': json.dumps(payload),
+                                                     'include_headers': 'true' if include_headers else 'false'},
+                                           access_token=access_token, retries=self.retries if reads_only else 0)
+            except GraphAPIError as e:
+                for i, op in zip(indices, payload):
+                    results[i] = {'code': e.status, 'body': None, 'headers': {}, 'error': e,
+                                  'unconfirmed': op['method'] != 'GET' and isinstance(e, GraphTransientError)}
+                return
+            for i, op, item in zip(indices, payload, response):
+                results[i] = _batch_result(item, write=op['method'] != 'GET')
+
+        await asyncio.gather(*(run(chunk) for chunk in _batch_chunks(operations)))
+        return results
+
+    async def publish_page_posts(self, posts, page_id='me', access_token=None):
+        """
+        Publica varios posts en una página con peticiones batch
+
+        Args:
+            posts: Lista de {'message', 'link' (opcional), 'image_url' (opcional)}
+
+        Returns:
+            Lista en el mismo orden: {'post_id'} o {'error', 'unconfirmed'}
+            (unconfirmed: el post pudo publicarse; revisar la página antes de repetirlo)
+        """
+        operations = []
+        for post in posts:
+            body = {'message': post['message']}
+            if post.get('image_url'):
+                body['url'] = post['image_url']
+            elif post.get('link'):
+                body['link'] = post['link']
+            edge = 'photos' if 'url' in body else 'feed'
+            operations.append(batch_operation('POST', f"{page_id}/{edge}", body))
+        return [{'error': result['error'], 'unconfirmed': result['unconfirmed']} if result['error']
+                else {'post_id': result['body'].get('post_id') or result['body'].get('id')}
+                for result in await self.batch(operations, access_token)]
+
+    async def post_insights(self, post_ids, metrics, access_token=None):
+        """
+        Métricas de varios posts (una operación por post, 50 por llamada)
+
+        Returns:
+            {post_id: {métrica: valor}} — los posts con error quedan fuera
+        """
+        operations = [batch_operation('GET', f"{post_id}/insights?metric={','.join(metrics)}")
+                      for post_id in post_ids]
+        insights = {}
+        for post_id, result in zip(post_ids, await self.batch(operations, access_token)):
+            if result['error']:
+                print(f"⚠️ Sin métricas de {post_id}: {result['error']}")
+                continue
+            insights[post_id] = insight_values(result['body'].get('data', []))
+        return insights
+
+    async def recent_post_insights(self, page_id, metrics, limit=25, access_token=None):
+        """
+        Métricas de los últimos posts de una página en una sola llamada
+
+        La segunda operación toma los ids de la primera ({result=posts:$.data.*.id}).
+
+        Returns:
+            {post_id: {métrica: valor}}
+        """
+        results = await self.batch([
+            batch_operation('GET', f"{page_id}/posts?fields=id&limit={limit}", name='posts'),
+            batch_operation('GET', f"?ids={{result=posts:$.data.*.id}}&fields=insights.metric({','.join(metrics)})",
+                            depends_on='posts')
+        ], access_token)
+        posts, insights = results
+        for result in (posts, insights):
+            if result['error']:
+                raise result['error']
+        return {post_id: insight_values((item.get('insights') or {}).get('data', []))
+                for post_id, item in insights['body'].items()}
+
+    # ===== INSTAGRAM =====
+    async def create_container(self, ig_user_id, image_url=None, caption=None, children=None,
+                               is_carousel_item=False, access_token=None):
+        """Crea un contenedor de Instagram (imagen, elemento de carrusel o carrusel) y devuelve su id"""
+        data = {}
+        if children:
+            data.update(media_type='CAROUSEL', children=','.join(children))
+        else:
+            data['image_url'] = image_url
+        if is_carousel_item:
+            data['is_carousel_item'] = 'true'
+        elif caption:
+            data['caption'] = caption
+        # Un contenedor repetido nunca se publica: crearlo sí se puede reintentar
+        result = await self.post(f"{ig_user_id}/media", data=data, access_token=access_token, retries=self.retries)
+        return result['id']
+
+    async def wait_for_container(self, container_id, timeout=None, poll_seconds=None, access_token=None):
+        """
+        Espera a que Meta termine de procesar un contenedor
+
+        Consulta status_code con espera creciente (poll_seconds del cliente,
+        el doble cada vez, hasta CONTAINER_POLL_MAX_SECONDS).
+
+        Raises:
+            GraphAPIError si el contenedor termina en ERROR o EXPIRED
+            GraphTransientError si no está listo en timeout segundos
+        """
+        deadline = time.monotonic() + (timeout or INSTAGRAM_CONTAINER_TIMEOUT)
+        delay = poll_seconds or self.poll_seconds
+        while True:
+            result = await self.get(container_id, params={'fields': 'status_code,status'}, access_token=access_token)
+            status = result.get('status_code')
+            if status in ('FINISHED', 'PUBLISHED'):
+                return result
+            if status in ('ERROR', 'EXPIRED'):
+                raise GraphAPIError(f"Contenedor {container_id} en estado {status}: {result.get('status', '')}".strip())
+            if time.monotonic() + delay > deadline:
+                raise GraphTransientError(f"El contenedor {container_id} sigue en {status} tras "
+                                          f"{timeout or INSTAGRAM_CONTAINER_TIMEOUT:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CONTAINER_POLL_MAX_SECONDS)
+
+    async def prepare_container(self, ig_user_id, image_url, caption=None, is_carousel_item=False,
+                                access_token=None):
+        """Crea un contenedor y espera a que esté listo"""
+        container_id = await self.create_container(ig_user_id, image_url, caption, is_carousel_item=is_carousel_item,
+                                                   access_token=access_token)
+        await self.wait_for_container(container_id, access_token=access_token)
+        return container_id
+
+    async def publish_instagram_post(self, ig_user_id, caption, image_urls, access_token=None):
+        """
+        Publica en Instagram una imagen o un carrusel (2 a CAROUSEL_MAX_ITEMS imágenes)
+
+        Los contenedores del carrusel se crean y procesan en paralelo; la
+        publicación ocurre una sola vez, cuando todo está FINISHED.
+
+        Args:
+            ig_user_id: Id de la cuenta de Instagram Business
+            caption: Texto del post
+            image_urls: URL pública de la imagen o lista de URLs
+
+        Returns:
+            {'post_id', 'container_id', 'children'}
+        """
+        image_urls = [image_urls] if isinstance(image_urls, str) else list(image_urls or [])
+        if not image_urls:
+            raise GraphAPIError("Instagram necesita al menos una imagen")
+        if len(image_urls) > CAROUSEL_MAX_ITEMS:
+            raise GraphAPIError(f"Un carrusel admite hasta {CAROUSEL_MAX_ITEMS} imágenes ({len(image_urls)} recibidas)")
+
+        children = []
+        if len(image_urls) == 1:
+            container_id = await self.prepare_container(ig_user_id, image_urls[0], caption, access_token=access_token)
+        else:
+            children = list(await asyncio.gather(*(
+                self.prepare_container(ig_user_id, url, is_carousel_item=True, access_token=access_token)
+                for url in image_urls
+            )))
+            container_id = await self.create_container(ig_user_id, caption=caption, children=children,
+                                                       access_token=access_token)
+            await self.wait_for_container(container_id, access_token=access_token)
+
+        result = await self.post(f"{ig_user_id}/media_publish", data={'creation_id': container_id},
+                                 access_token=access_token)
+        return {'post_id': result['id'], 'container_id': container_id, 'children': children}
+
+
+def batch_operation(method, relative_url, body=None, name=None, depends_on=None, headers=None):
+    """
+    Operación para GraphAPIClient.batch
+
+    Args:
+        method: 'GET', 'POST' o 'DELETE'
+        relative_url: Ruta sin versión, ej. '123/feed' o '123/insights?metric=post_clicks'
+        body: Campos del formulario (POST)
+        name: Nombre para que otras operaciones usen su resultado
+        depends_on: Nombre de la operación que debe ejecutarse antes
+        headers: Encabezados de la operación, ej. {'If-None-Match': etag}
+    """
+    return {'method': method, 'relative_url': relative_url, 'body': body, 'name': name, 'depends_on': depends_on,
+            'headers': headers}
+
+
+def _batch_payload(operation):
+    payload = {'method': operation['method'], 'relative_url': operation['relative_url']}
+    if operation.get('body'):
+        payload['body'] = urlencode(operation['body'])
+    if operation.get('name'):
+        payload['name'] = operation['name']
+        # Por defecto Meta omite la respuesta de las operaciones referenciadas
+        payload['omit_response_on_success'] = False
+    if operation.get('depends_on'):
+        payload['depends_on'] = operation['depends_on']
+    if operation.get('headers'):
+        payload['headers'] = [{'name': name, 'value': value} for name, value in operation['headers'].items()]
+    return payload
+
+
+def _batch_chunks(operations):
+    """Índices agrupados en llamadas de hasta BATCH_MAX_OPERATIONS sin separar dependencias"""
+    units, unit_of = [], {}
+    for index, operation in enumerate(operations):
+        text = f"{operation['relative_url']} {json.dumps(operation.get('body') or {})}"
+        references = set(RESULT_REFERENCE.findall(text))
+        if operation.get('depends_on'):
+            references.add(operation['depends_on'])
+        targets = sorted({unit_of[name] for name in references if name in unit_of})
+        if targets:
+            unit = targets[0]
+            for other in targets[1:]:
+                units[unit].extend(units[other])
+                units[other] = []
+                unit_of.update({name: unit for name, u in unit_of.items() if u == other})
+            units[unit].append(index)
+        else:
+            unit = len(units)
+            units.append([index])
+        if operation.get('name'):
+            unit_of[operation['name']] = unit
+
+    chunks, current = [], []
+    for unit in filter(None, units):
+        if len(unit) > BATCH_MAX_OPERATIONS:
+            raise ValueError(f"{len(unit)} operaciones dependientes entre sí no caben en un batch "
+                             f"({BATCH_MAX_OPERATIONS} máximo)")
+        if len(current) + len(unit) > BATCH_MAX_OPERATIONS:
+            chunks.append(current)
+            current = []
+        current.extend(sorted(unit))
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _batch_result(item, write=False):
+    """Respuesta de una operación del batch -> {'code', 'body', 'headers', 'error', 'unconfirmed'}"""
+    if item is None:
+        # Falló una dependencia o se agotó el tiempo del batch: una escritura pudo quedar hecha
+        return {'code': None, 'body': None, 'headers': {}, 'unconfirmed': write,
+                'error': GraphTransientError("Operación sin respuesta en el batch (dependencia fallida o timeout)")}
+    headers = {header['name']: header['value'] for header in item.get('headers') or []}
+    try:
+        body = json.loads(item.get('body') or 'null')
+    except ValueError:
+        body = item.get('body')
+    code = item.get('code')
+    if code is None or code >= 400:
+        return {'code': code, 'body': body, 'headers': headers, 'unconfirmed': False,
+                'error': error_from_response(code or 500, body if isinstance(body, dict) else None)}
+    return {'code': code, 'body': body, 'headers': headers, 'error': None, 'unconfirmed': False}
+
+
+def insight_values(data):
+    """[{'name', 'values': [{'value'}]}] -> {métrica: último valor}"""
+    return {item['name']: item['values'][-1]['value'] for item in data if item.get('values')}
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# ===== CLIENTES COMPARTIDOS =====
+_clients = weakref.WeakKeyDictionary()
+_background = {'loop': None}
+_background_lock = threading.Lock()
+
+
+def get_client():
+    """Cliente compartido del event loop actual (llamar dentro de una corrutina)"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = GraphAPIClient()
+    return client
+
+
+def run_sync(coroutine):
+    """
+    Ejecuta una corrutina desde código síncrono y espera su resultado
+
+    Todas las llamadas comparten un event loop de fondo (y con él el pool de
+    conexiones de get_client()), en lugar de abrir uno nuevo por llamada.
+    """
+    with _background_lock:
+        loop = _background['loop']
+        if loop is None:
+            loop = _background['loop'] = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='graph-api-loop', daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+
+async def publish_page_post(message, **kwargs):
+    """GraphAPIClient.publish_page_post con el cliente compartido (ej. run_sync(publish_page_post(...)))"""
+    return await get_client().publish_page_post(message, **kwargs)
+
+
+async def publish_page_posts(posts, **kwargs):
+    """GraphAPIClient.publish_page_posts con el cliente compartido"""
+    return await get_client().publish_page_posts(posts, **kwargs)
+
+
+async def publish_instagram_post(ig_user_id, caption, image_urls, **kwargs):
+    """GraphAPIClient.publish_instagram_post con el cliente compartido"""
+    return await get_client().publish_instagram_post(ig_user_id, caption, image_urls, **kwargs)
+
+
+async def post_insights(post_ids, metrics, **kwargs):
+    """GraphAPIClient.post_insights con el cliente compartido"""
+    return await get_client().post_insights(post_ids, metrics, **kwargs)
+
+
+async def recent_post_insights(page_id, metrics, **kwargs):
+    """GraphAPIClient.recent_post_insights con el cliente compartido"""
+    return await get_client().recent_post_insights(page_id, metrics, **kwargs)
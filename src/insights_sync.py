@@ -0,0 +1,342 @@
+"""
+Métricas de posts de Facebook e Instagram guardadas localmente
+
+Un sincronizador trae las métricas de forma incremental y las guarda en
+SQLite como serie de tiempo; los agentes consultan esa copia local en lugar
+de pedirle todo a Meta en cada análisis.
+
+Cada sincronización:
+1. Lista solo los posts nuevos: la lectura usa `since` con la fecha del
+   último post visto y el ETag de la lectura anterior (304 si no hay nada
+   nuevo).
+2. Refresca las métricas de los posts de los últimos INSIGHTS_LOOKBACK_DAYS
+   días (los más viejos ya casi no cambian) con peticiones batch; cada
+   operación lleva el ETag de la última respuesta de ese post y las que no
+   cambiaron responden 304 sin cuerpo.
+3. Agrega un punto a la serie solo cuando el valor de una métrica cambia.
+"""
+import threading
+from urllib.parse import urlencode
+from datetime import datetime, timedelta, timezone
+from config.settings import (META_ACCESS_TOKEN, FACEBOOK_PAGE_ID, INSTAGRAM_BUSINESS_ACCOUNT_ID,
+                             INSIGHTS_LOOKBACK_DAYS, INSIGHTS_SYNC_MINUTES)
+from src.db import connect
+from src.graph_api import GraphAPIError, batch_operation, get_client, insight_values, run_sync
+from src.social_media import FACEBOOK_POST_METRICS, INSTAGRAM_MEDIA_METRICS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS social_posts (
+    platform TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    created_time TEXT NOT NULL,
+    caption TEXT,
+    permalink TEXT,
+    media_type TEXT,
+    insights_etag TEXT,
+    insights_checked_at TEXT,
+    PRIMARY KEY (platform, post_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_social_posts_created ON social_posts(platform, created_time);
+CREATE TABLE IF NOT EXISTS post_insights (
+    platform TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (platform, post_id, metric, fetched_at)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS post_insights_latest (
+    platform TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL,
+    fetched_at TEXT NOT NULL,
+    PRIMARY KEY (platform, post_id, metric)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS insights_sync_state (
+    source TEXT PRIMARY KEY,
+    since INTEGER,
+    etag TEXT,
+    synced_at TEXT
+);
+"""
+
+# Métrica para ordenar los mejores posts de cada plataforma
+ENGAGEMENT_METRICS = {'facebook': 'post_engaged_users', 'instagram': 'engagement'}
+
+# Posts por página al listar
+LISTING_LIMIT = 100
+
+
+def parse_graph_time(value):
+    """'2026-01-11T18:00:00+0000' -> ISO en UTC (comparable como texto)"""
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z').astimezone(timezone.utc).isoformat()
+
+
+def numeric_value(value):
+    """Valor de una métrica como número (las métricas por tipo se suman) o None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        return float(sum(v for v in value.values() if isinstance(v, (int, float))))
+    return None
+
+
+def _etag(headers):
+    return next((value for name, value in headers.items() if name.lower() == 'etag'), None)
+
+
+class InsightsStore:
+    """
+    Serie de tiempo local de métricas por post y sincronizador incremental con la Graph API
+    """
+
+    def __init__(self, db_path=None, access_token=None, page_id=None, ig_user_id=None, lookback_days=None,
+                 client=None):
+        """
+        Args:
+            db_path: Ruta de la base de datos (por defecto DATABASE_PATH)
+            access_token: Token de Meta (META_ACCESS_TOKEN)
+            page_id: Página de Facebook (FACEBOOK_PAGE_ID)
+            ig_user_id: Cuenta de Instagram Business (INSTAGRAM_BUSINESS_ACCOUNT_ID)
+            lookback_days: Días en que se siguen refrescando las métricas de un post (INSIGHTS_LOOKBACK_DAYS)
+            client: GraphAPIClient (por defecto el compartido del event loop)
+        """
+        self.conn = connect(db_path)
+        self.access_token = access_token or META_ACCESS_TOKEN
+        self.sources = {'facebook': page_id or FACEBOOK_PAGE_ID,
+                        'instagram': ig_user_id or INSTAGRAM_BUSINESS_ACCOUNT_ID}
+        self.lookback_days = lookback_days or INSIGHTS_LOOKBACK_DAYS
+        self.client = client
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.executescript(SCHEMA)
+
+    # ===== SINCRONIZACIÓN =====
+    def sync_now(self):
+        """sync() desde código síncrono (scheduler, crew)"""
+        return run_sync(self.sync())
+
+    def sync_if_stale(self, max_age_minutes=None):
+        """Sincroniza solo si la última sincronización tiene más de INSIGHTS_SYNC_MINUTES"""
+        last = self.last_synced()
+        max_age = timedelta(minutes=INSIGHTS_SYNC_MINUTES if max_age_minutes is None else max_age_minutes)
+        if last and datetime.now() - datetime.fromisoformat(last) < max_age:
+            return None
+        return self.sync_now()
+
+    async def sync(self):
+        """
+        Trae posts nuevos y métricas que cambiaron de cada plataforma configurada
+
+        Returns:
+            {plataforma: {'new_posts', 'updated', 'unchanged', 'points'}}
+        """
+        if not self.access_token:
+            print("❌ Error: Configura META_ACCESS_TOKEN para sincronizar métricas")
+            return {}
+        client = self.client or get_client()
+        summary = {}
+        for platform, account_id in self.sources.items():
+            if not account_id:
+                continue
+            try:
+                new_posts = await self._sync_posts(client, platform, account_id)
+                summary[platform] = {'new_posts': new_posts, **await self._sync_insights(client, platform)}
+            except GraphAPIError as e:
+                print(f"❌ Error sincronizando métricas de {platform}: {e}")
+                continue
+            stats = summary[platform]
+            print(f"📊 Métricas de {platform}: {stats['new_posts']} posts nuevos, {stats['updated']} actualizados, "
+                  f"{stats['unchanged']} sin cambios")
+        return summary
+
+    async def _sync_posts(self, client, platform, account_id):
+        """Lista los posts publicados desde el cursor `since` y los guarda; devuelve cuántos son nuevos"""
+        state = self._state(platform)
+        since = state['since'] if state else int((datetime.now(timezone.utc)
+                                                  - timedelta(days=self.lookback_days)).timestamp())
+        if platform == 'facebook':
+            path, fields = f"{account_id}/posts", 'id,message,created_time,permalink_url'
+        else:
+            path, fields = f"{account_id}/media", 'id,caption,timestamp,permalink,media_type'
+        params = {'fields': fields, 'limit': LISTING_LIMIT, 'since': since}
+
+        headers = {'If-None-Match': state['etag']} if state and state['etag'] else None
+        result = (await client.batch([batch_operation('GET', f"{path}?{urlencode(params)}", headers=headers)],
+                                     self.access_token, include_headers=True))[0]
+        if result['error']:
+            raise result['error']
+        if result['code'] == 304:
+            self._save_state(platform, since, state['etag'])
+            return 0
+
+        etag, posts, page = _etag(result['headers']), [], result['body']
+        while True:
+            posts.extend(page.get('data', []))
+            after = (page.get('paging') or {}).get('cursors', {}).get('after')
+            if not after or not (page.get('paging') or {}).get('next'):
+                break
+            page = await client.get(path, params={**params, 'after': after}, access_token=self.access_token)
+
+        new_posts = 0
+        with self._lock, self.conn:
+            for post in posts:
+                created_time = parse_graph_time(post.get('created_time') or post['timestamp'])
+                new_posts += self.conn.execute(
+                    "INSERT OR IGNORE INTO social_posts (platform, post_id, created_time, caption, permalink, "
+                    "media_type) VALUES (?, ?, ?, ?, ?, ?)",
+                    (platform, post['id'], created_time, post.get('message') or post.get('caption'),
+                     post.get('permalink_url') or post.get('permalink'), post.get('media_type'))
+                ).rowcount
+                since = max(since, int(datetime.fromisoformat(created_time).timestamp()))
+        self._save_state(platform, since, etag)
+        return new_posts
+
+    async def _sync_insights(self, client, platform):
+        """Refresca las métricas de los posts recientes (ETag por post) y guarda los valores que cambiaron"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.lookback_days)).isoformat()
+        with self._lock:
+            posts = self.conn.execute(
+                "SELECT post_id, insights_etag FROM social_posts WHERE platform = ? AND created_time >= ?",
+                (platform, cutoff)
+            ).fetchall()
+        metrics = FACEBOOK_POST_METRICS if platform == 'facebook' else INSTAGRAM_MEDIA_METRICS
+        operations = [batch_operation('GET', f"{post['post_id']}/insights?metric={','.join(metrics)}",
+                                      headers={'If-None-Match': post['insights_etag']} if post['insights_etag'] else None)
+                      for post in posts]
+        results = await client.batch(operations, self.access_token, include_headers=True) if operations else []
+
+        now = datetime.now().isoformat()
+        stats = {'updated': 0, 'unchanged': 0, 'points': 0}
+        with self._lock, self.conn:
+            for post, result in zip(posts, results):
+                if result['error']:
+                    print(f"⚠️ Sin métricas de {platform} {post['post_id']}: {result['error']}")
+                    continue
+                if result['code'] == 304:
+                    stats['unchanged'] += 1
+                else:
+                    stats['updated'] += 1
+                    stats['points'] += self._record(platform, post['post_id'],
+                                                    insight_values(result['body'].get('data', [])), now)
+                self.conn.execute(
+                    "UPDATE social_posts SET insights_etag = COALESCE(?, insights_etag), insights_checked_at = ? "
+                    "WHERE platform = ? AND post_id = ?",
+                    (_etag(result['headers']), now, platform, post['post_id'])
+                )
+        return stats
+
+    def _record(self, platform, post_id, values, fetched_at):
+        """Agrega a la serie las métricas cuyo valor cambió (dentro de la transacción del llamador)"""
+        latest = {row['metric']: row['value'] for row in self.conn.execute(
+            "SELECT metric, value FROM post_insights_latest WHERE platform = ? AND post_id = ?", (platform, post_id)
+        )}
+        points = 0
+        for metric, value in values.items():
+            value = numeric_value(value)
+            if value is None or latest.get(metric) == value:
+                continue
+            self.conn.execute(
+                "INSERT OR REPLACE INTO post_insights (platform, post_id, metric, fetched_at, value) "
+                "VALUES (?, ?, ?, ?, ?)", (platform, post_id, metric, fetched_at, value)
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO post_insights_latest (platform, post_id, metric, value, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)", (platform, post_id, metric, value, fetched_at)
+            )
+            points += 1
+        return points
+
+    def _state(self, source):
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM insights_sync_state WHERE source = ?", (source,)).fetchone()
+        return dict(row) if row else None
+
+    def _save_state(self, source, since, etag):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO insights_sync_state (source, since, etag, synced_at) VALUES (?, ?, ?, ?)",
+                (source, since, etag, datetime.now().isoformat())
+            )
+
+    # ===== CONSULTAS =====
+    def last_synced(self):
+        """Fecha de la última sincronización (ISO) o None"""
+        with self._lock:
+            row = self.conn.execute("SELECT MAX(synced_at) AS last FROM insights_sync_state").fetchone()
+        return row['last']
+
+    def totals(self, days=30, platform=None):
+        """
+        Suma de la última lectura de cada métrica de los posts de los últimos `days` días
+
+        Returns:
+            {plataforma: {'posts': n, métrica: total}}
+        """
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+        with self._lock:
+            posts = self.conn.execute(
+                "SELECT platform, COUNT(*) AS total FROM social_posts WHERE created_time >= ? "
+                "AND (? IS NULL OR platform = ?) GROUP BY platform", (cutoff, platform, platform)
+            ).fetchall()
+            rows = self.conn.execute(
+                "SELECT l.platform, l.metric, SUM(l.value) AS total FROM post_insights_latest l "
+                "JOIN social_posts p ON p.platform = l.platform AND p.post_id = l.post_id "
+                "WHERE p.created_time >= ? AND (? IS NULL OR l.platform = ?) GROUP BY l.platform, l.metric",
+                (cutoff, platform, platform)
+            ).fetchall()
+        totals = {row['platform']: {'posts': row['total']} for row in posts}
+        for row in rows:
+            totals.setdefault(row['platform'], {'posts': 0})[row['metric']] = row['total']
+        return totals
+
+    def top_posts(self, metric=None, days=30, platform=None, limit=5):
+        """
+        Posts con el valor más alto de una métrica (por defecto ENGAGEMENT_METRICS de cada plataforma)
+
+        Returns:
+            Lista de {'platform', 'post_id', 'created_time', 'caption', 'permalink', 'metric', 'value'}
+        """
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+        metrics = [metric] if metric else list(ENGAGEMENT_METRICS.values())
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT p.platform, p.post_id, p.created_time, p.caption, p.permalink, l.metric, l.value "
+                "FROM post_insights_latest l JOIN social_posts p ON p.platform = l.platform AND p.post_id = l.post_id "
+                f"WHERE l.metric IN ({','.join('?' * len(metrics))}) AND p.created_time >= ? "
+                "AND (? IS NULL OR l.platform = ?) ORDER BY l.value DESC LIMIT ?",
+                (*metrics, cutoff, platform, platform, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def history(self, platform, post_id, metric):
+        """Serie de una métrica de un post: [(fecha, valor)]"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT fetched_at, value FROM post_insights WHERE platform = ? AND post_id = ? AND metric = ? "
+                "ORDER BY fetched_at", (platform, post_id, metric)
+            ).fetchall()
+        return [(row['fetched_at'], row['value']) for row in rows]
+
+
+def format_insights_report(store, days=30, metric=None, platform=None):
+    """Resumen legible para los agentes: totales por plataforma y mejores posts"""
+    last = store.last_synced()
+    totals = store.totals(days, platform)
+    if not totals:
+        return f"⚠️ Sin métricas de redes de los últimos {days} días (última sincronización: {last or 'nunca'})"
+    lines = [f"📊 Métricas de redes, últimos {days} días (sincronizado: {(last or '')[:16].replace('T', ' ')})"]
+    for name, values in sorted(totals.items()):
+        metrics = ' | '.join(f"{k}: {v:,.0f}" for k, v in sorted(values.items()) if k != 'posts')
+        lines.append(f"   • {name}: {values['posts']} posts" + (f" | {metrics}" if metrics else ''))
+    top = store.top_posts(metric, days, platform)
+    if top:
+        lines.append(f"🏆 Mejores posts ({metric or 'engagement'}):")
+        for post in top:
+            caption = (post['caption'] or '').replace('\n', ' ')[:60]
+            lines.append(f"   • {post['platform']} {post['created_time'][:10]} — {post['metric']}: {post['value']:,.0f} "
+                         f"— {caption}" + (f" ({post['permalink']})" if post['permalink'] else ''))
+    return "\n".join(lines)
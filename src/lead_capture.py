@@ -0,0 +1,187 @@
+"""
+Captura automática de leads desde conversaciones (Messenger / WhatsApp)
+
+Los webhooks solo encolan el evento; un hilo escritor agrupa los eventos
+en lotes, los guarda en el LeadStore y en la línea de tiempo de cada lead,
+así la respuesta nunca espera al disco.
+"""
+import atexit
+import queue
+import threading
+import time
+from config.settings import LEAD_CAPTURE_BATCH_SIZE, LEAD_CAPTURE_FLUSH_SECONDS, LEAD_CAPTURE_QUEUE_SIZE
+from src.activity_timeline import ActivityTimeline, local_timestamp
+from src.lead_identity import normalize_phone
+from src.lead_store import LeadStore
+from src.lead_scoring import LeadScoringEngine
+
+LANGUAGE_CODES = {
+    'spanish': 'es',
+    'english': 'en'
+}
+
+# Intenciones que indican que el prospecto está evaluando reservar
+BOOKING_INTENTS = ('price', 'included', 'duration', 'preparation')
+
+
+def conversation_event(source, event_type='message', intent=None, message=None, timestamp=None):
+    """Evento de línea de tiempo de un mensaje entrante (ver src/activity_timeline.py)"""
+    data = {'channel': source}
+    if intent:
+        data['intent'] = intent
+    if message:
+        data['text'] = message[:280]
+    return {'type': event_type, 'data': data, 'timestamp': timestamp}
+
+
+def conversation_lead(source, sender_id=None, phone=None, name=None, language=None,
+                      intent=None, message=None, timestamp=None):
+    """
+    Construye el lead de un mensaje entrante
+
+    Args:
+        source: 'messenger' o 'whatsapp'
+        sender_id: Id de remitente de la página (Messenger)
+        phone: Teléfono del remitente (WhatsApp)
+        name: Nombre de perfil si la plataforma lo envía
+        language: 'spanish'/'english' o código ('es'/'en')
+        intent: Tipo de pregunta detectado (analyze_message)
+        message: Texto del mensaje
+        timestamp: Momento del mensaje (por defecto ahora)
+    """
+    timestamp = timestamp or local_timestamp()
+    lead = {
+        'source': source,
+        'status': 'interested' if intent in BOOKING_INTENTS else 'new',
+        'first_contact': timestamp,
+        'last_contact': timestamp,
+        'message_count': 1
+    }
+    if sender_id:
+        lead['messenger_id'] = str(sender_id)
+    if phone:
+        # WhatsApp envía el número internacional sin "+"
+        phone = phone if str(phone).startswith('+') else f"+{phone}"
+        lead['phone'] = normalize_phone(phone) or phone
+    if name:
+        lead['name'] = name
+    if language:
+        lead['language'] = LANGUAGE_CODES.get(language.lower(), language.lower())
+    if intent:
+        lead['intents'] = [intent]
+    if message:
+        lead['last_message'] = message[:280]
+    return lead
+
+
+class LeadCaptureQueue:
+    """
+    Cola de escritura de leads con un hilo escritor en segundo plano
+
+    submit() no bloquea: si la cola está llena el evento se descarta con un
+    aviso (la conversación sigue funcionando). El escritor guarda cada lote
+    en una sola transacción (upsert_many, con deduplicación), registra los
+    eventos en ActivityTimeline y puntúa los leads afectados.
+    """
+
+    def __init__(self, store=None, timeline=None, batch_size=None, flush_seconds=None, max_size=None):
+        """
+        Args:
+            store: LeadStore destino (por defecto se crea al iniciar el hilo)
+            timeline: ActivityTimeline destino (por defecto se crea al iniciar el hilo)
+            batch_size: Eventos por transacción (LEAD_CAPTURE_BATCH_SIZE)
+            flush_seconds: Espera máxima antes de guardar un lote incompleto
+            max_size: Capacidad de la cola (LEAD_CAPTURE_QUEUE_SIZE)
+        """
+        self.store = store
+        self.timeline = timeline
+        self.batch_size = batch_size or LEAD_CAPTURE_BATCH_SIZE
+        self.flush_seconds = flush_seconds or LEAD_CAPTURE_FLUSH_SECONDS
+        self._queue = queue.Queue(maxsize=max_size or LEAD_CAPTURE_QUEUE_SIZE)
+        self._stats = {'queued': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'errors': 0}
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='lead-capture', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, lead, event=None):
+        """
+        Encola un lead (ver conversation_lead) y opcionalmente su evento
+
+        Returns:
+            False si la cola estaba llena y se descartó
+        """
+        try:
+            self._queue.put_nowait((lead, event))
+        except queue.Full:
+            self._stats['dropped'] += 1
+            print(f"⚠️ Cola de captura de leads llena, evento descartado ({lead.get('source')})")
+            return False
+        self._stats['queued'] += 1
+        return True
+
+    def capture(self, source, event_type='message', **fields):
+        """Atajo: construye el lead y el evento del mensaje y los encola"""
+        timestamp = fields.setdefault('timestamp', local_timestamp())
+        event = conversation_event(source, event_type, fields.get('intent'), fields.get('message'), timestamp)
+        return self.submit(conversation_lead(source, **fields), event)
+
+    def flush(self, timeout=10):
+        """Espera a que todo lo encolado esté guardado"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self._queue.unfinished_tasks == 0
+
+    def close(self, timeout=10):
+        """Guarda lo pendiente y detiene el hilo escritor"""
+        if self._stopping.is_set():
+            return
+        self.flush(timeout)
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        """Contadores de la cola"""
+        return {**self._stats, 'pending': self._queue.qsize()}
+
+    def _run(self):
+        store = self.store = self.store or LeadStore()
+        timeline = self.timeline = self.timeline or ActivityTimeline()
+        scoring = LeadScoringEngine()
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                results = store.upsert_many([lead for lead, _ in batch])
+                timeline.record_many(
+                    (lead_id, event['type'], event['data'], event['timestamp'])
+                    for (lead_id, _), (_, event) in zip(results, batch) if event
+                )
+                scoring.rescore(store, lead_ids=sorted({lead_id for lead_id, _ in results}))
+                self._stats['written'] += len(batch)
+                self._stats['batches'] += 1
+            except Exception as e:
+                self._stats['errors'] += 1
+                print(f"❌ Error guardando {len(batch)} leads capturados: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _next_batch(self):
+        """Espera el primer evento y junta más hasta llenar el lote o agotar el tiempo"""
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
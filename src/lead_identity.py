@@ -0,0 +1,161 @@
+"""
+Normalización de identidad de leads (email y teléfono) y reglas de fusión
+"""
+import hashlib
+import re
+from config.settings import DEFAULT_PHONE_COUNTRY_CODE
+
+GMAIL_DOMAINS = ('gmail.com', 'googlemail.com')
+
+# Orden del embudo: al fusionar se conserva el estado más avanzado
+STATUS_RANK = {
+    'new': 0,
+    'contacted': 1,
+    'interested': 2,
+    'qualified': 3,
+    'converted': 4
+}
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_email(email):
+    """
+    Normaliza un email para comparar identidades
+
+    - minúsculas y sin espacios
+    - Gmail: ignora puntos y sufijos +etiqueta, googlemail.com = gmail.com
+    """
+    if not email or '@' not in email:
+        return None
+    local, _, domain = email.strip().lower().rpartition('@')
+    if not local or not domain:
+        return None
+    if domain in GMAIL_DOMAINS:
+        local = local.split('+', 1)[0].replace('.', '')
+        domain = 'gmail.com'
+    return f"{local}@{domain}"
+
+
+def normalize_phone(phone, default_country=None):
+    """
+    Normaliza un teléfono a E.164 (ej. "+52 555 123 4567" -> "+525551234567")
+
+    Args:
+        phone: Teléfono en cualquier formato
+        default_country: Código de país para números locales (por defecto MX, 52)
+    """
+    if not phone:
+        return None
+    phone = str(phone).strip()
+    has_plus = phone.startswith('+')
+    digits = _NON_DIGITS.sub('', phone)
+
+    if not has_plus and digits.startswith('00'):
+        digits = digits[2:]
+        has_plus = True
+
+    country = default_country or DEFAULT_PHONE_COUNTRY_CODE
+    if not has_plus:
+        if len(digits) == 10:
+            digits = country + digits
+        elif not digits.startswith(country):
+            return None
+
+    # México: el prefijo móvil "1" tras +52 ya no se usa
+    if digits.startswith('521') and len(digits) == 13:
+        digits = '52' + digits[3:]
+
+    if not 8 <= len(digits) <= 15:
+        return None
+    return f"+{digits}"
+
+
+def _hash_key(kind, value):
+    return f"{kind}:{hashlib.blake2b(value.encode('utf-8'), digest_size=16).hexdigest()}"
+
+
+def identity_keys(lead):
+    """
+    Claves de identidad (hasheadas) de un lead: email, teléfono y, para
+    conversaciones de Messenger sin otro dato, el id de remitente de la página
+
+    Los hashes evitan guardar datos personales en el índice de duplicados.
+    """
+    keys = []
+    email = normalize_email(lead.get('email'))
+    if email:
+        keys.append(_hash_key('e', email))
+    phone = normalize_phone(lead.get('phone'))
+    if phone:
+        keys.append(_hash_key('p', phone))
+    messenger_id = lead.get('messenger_id')
+    if messenger_id:
+        keys.append(_hash_key('m', str(messenger_id)))
+    return keys
+
+
+def merge_leads(base, incoming):
+    """
+    Fusiona dos registros del mismo prospecto
+
+    El registro base conserva sus datos; el entrante solo completa campos
+    vacíos, suma intereses y fuentes, y puede avanzar el estado del embudo.
+
+    Returns:
+        Nuevo diccionario fusionado (sin id)
+    """
+    merged = {k: v for k, v in base.items() if k != 'id'}
+
+    for key, value in incoming.items():
+        if key in ('id', 'created_at', 'updated_at', 'interests', 'notes', 'status', 'sources',
+                   'first_contact', 'last_contact', 'last_message', 'intents', 'message_count'):
+            continue
+        if value not in (None, '', [], {}) and merged.get(key) in (None, '', [], {}):
+            merged[key] = value
+
+    interests = list(merged.get('interests') or [])
+    for interest in incoming.get('interests') or []:
+        if interest not in interests:
+            interests.append(interest)
+    merged['interests'] = interests
+
+    notes = [n for n in (merged.get('notes'), incoming.get('notes')) if n]
+    merged['notes'] = ' | '.join(dict.fromkeys(notes)) or None
+
+    current_status = merged.get('status') or 'new'
+    incoming_status = incoming.get('status') or 'new'
+    if STATUS_RANK.get(incoming_status, 0) > STATUS_RANK.get(current_status, 0):
+        merged['status'] = incoming_status
+
+    sources = list(merged.get('sources') or ([merged['source']] if merged.get('source') else []))
+    for source in (incoming.get('sources') or []) + [incoming.get('source')]:
+        if source and source not in sources:
+            sources.append(source)
+    if sources:
+        merged['sources'] = sources
+
+    # Actividad de conversación: primer/último contacto, intenciones y mensajes
+    first = [c for c in (merged.get('first_contact'), incoming.get('first_contact')) if c]
+    if first:
+        merged['first_contact'] = min(first)
+    last = [c for c in (merged.get('last_contact'), incoming.get('last_contact')) if c]
+    if last:
+        merged['last_contact'] = max(last)
+        if incoming.get('last_message') and incoming.get('last_contact') == merged['last_contact']:
+            merged['last_message'] = incoming['last_message']
+    intents = list(merged.get('intents') or [])
+    for intent in incoming.get('intents') or []:
+        if intent not in intents:
+            intents.append(intent)
+    if intents:
+        merged['intents'] = intents
+    if incoming.get('message_count'):
+        merged['message_count'] = (merged.get('message_count') or 0) + incoming['message_count']
+
+    # created_at: la primera vez que supimos del prospecto
+    created = [c for c in (base.get('created_at'), incoming.get('created_at')) if c]
+    if created:
+        merged['created_at'] = min(created)
+
+    return merged
@@ -0,0 +1,234 @@
+"""
+Importación y exportación masiva de leads (CSV / JSONL) en streaming
+Procesa registro por registro con memoria constante
+"""
+import csv
+import json
+import os
+import time
+from src.lead_identity import normalize_email, normalize_phone
+from src.lead_store import LeadStore
+
+SUPPORTED_FORMATS = ('csv', 'jsonl')
+
+EXPORT_COLUMNS = ['id', 'name', 'email', 'phone', 'status', 'source', 'interests', 'notes', 'created_at']
+
+# Columnas de la tabla compacta: (campo, encabezado, ancho)
+TABLE_COLUMNS = [
+    ('id', 'ID', 6),
+    ('name', 'Nombre', 14),
+    ('email', 'Email', 24),
+    ('status', 'Estado', 10),
+    ('source', 'Fuente', 9),
+    ('score', 'Pts', 4)
+]
+
+# Encabezados habituales en hojas de registro de eventos
+FIELD_ALIASES = {
+    'nombre': 'name',
+    'full_name': 'name',
+    'correo': 'email',
+    'e-mail': 'email',
+    'mail': 'email',
+    'telefono': 'phone',
+    'teléfono': 'phone',
+    'celular': 'phone',
+    'whatsapp': 'phone',
+    'estado': 'status',
+    'fuente': 'source',
+    'origen': 'source',
+    'intereses': 'interests',
+    'notas': 'notes',
+    'fecha': 'created_at'
+}
+
+
+def detect_format(path, fmt=None):
+    """Determina el formato por parámetro o por extensión del archivo"""
+    fmt = (fmt or os.path.splitext(path)[1].lstrip('.')).lower()
+    if fmt == 'json':
+        fmt = 'jsonl'
+    if fmt not in SUPPORTED_FORMATS:
+        raise ValueError(f"Formato no soportado: '{fmt}' (usa {', '.join(SUPPORTED_FORMATS)})")
+    return fmt
+
+
+def iter_records(path, fmt):
+    """
+    Lee registros uno a uno sin cargar el archivo completo
+
+    Yields:
+        (número de fila, registro, error) — una línea JSONL ilegible trae
+        registro None y el error, y la lectura continúa con la siguiente
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if fmt == 'csv':
+            for row_number, record in enumerate(csv.DictReader(f), start=1):
+                yield row_number, record, None
+        else:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield line_number, json.loads(line), None
+                except ValueError as e:
+                    yield line_number, None, f"JSON inválido ({e.msg})"
+
+
+def clean_record(record, default_source=None):
+    """
+    Valida y normaliza un registro de entrada
+
+    Returns:
+        (lead, error) — lead es None si el registro no es válido
+    """
+    if not isinstance(record, dict):
+        return None, f"se esperaba un objeto y llegó {type(record).__name__}"
+    lead = {}
+    for key, value in record.items():
+        if key is None:
+            continue
+        key = key.strip().lower()
+        key = FIELD_ALIASES.get(key, key)
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in (None, ''):
+            lead[key] = value
+
+    email = lead.get('email')
+    if email:
+        if not isinstance(email, str) or normalize_email(email) is None:
+            return None, f"email inválido: {email!r}"
+        lead['email'] = email.lower()
+
+    phone = lead.get('phone')
+    if isinstance(phone, int) and not isinstance(phone, bool):
+        # JSON sin comillas: 5557221234
+        phone = lead['phone'] = str(phone)
+    if phone and (not isinstance(phone, str) or normalize_phone(phone) is None):
+        return None, f"teléfono inválido: {phone!r}"
+
+    if not email and not phone:
+        return None, "sin email ni teléfono"
+
+    interests = lead.get('interests')
+    if isinstance(interests, str):
+        lead['interests'] = [i.strip() for i in interests.replace(';', ',').split(',') if i.strip()]
+
+    if default_source and not lead.get('source'):
+        lead['source'] = default_source
+
+    return lead, None
+
+
+def import_leads(path, fmt=None, store=None, batch_size=500, default_source='import'):
+    """
+    Importa leads validando y deduplicando al vuelo
+
+    Args:
+        path: Archivo CSV o JSONL
+        fmt: 'csv' o 'jsonl' (por defecto según la extensión)
+        store: LeadStore a usar
+        batch_size: Registros por transacción
+        default_source: Fuente asignada si el registro no trae una
+
+    Returns:
+        Reporte con filas leídas, creadas, fusionadas, inválidas y filas/segundo
+    """
+    fmt = detect_format(path, fmt)
+    store = store or LeadStore()
+    report = {'rows': 0, 'created': 0, 'merged': 0, 'invalid': 0, 'errors': []}
+    started = time.perf_counter()
+    batch = []
+
+    def flush():
+        for _, created in store.upsert_many(batch):
+            report['created' if created else 'merged'] += 1
+        batch.clear()
+
+    for line_number, record, error in iter_records(path, fmt):
+        report['rows'] += 1
+        if not error:
+            lead, error = clean_record(record, default_source)
+        if error:
+            report['invalid'] += 1
+            if len(report['errors']) < 10:
+                report['errors'].append(f"fila {line_number}: {error}")
+            continue
+        batch.append(lead)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    elapsed = time.perf_counter() - started
+    report['seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['rows'] / elapsed) if elapsed > 0 else report['rows']
+    print(f"📥 Importación: {report['rows']} filas | {report['created']} nuevos | "
+          f"{report['merged']} fusionados | {report['invalid']} inválidos | "
+          f"{report['rows_per_second']} filas/s")
+    return report
+
+
+def export_leads(path, fmt=None, store=None, status=None, source=None, segment=None):
+    """
+    Exporta leads en streaming (útil para audiencias de anuncios)
+
+    Args:
+        path: Archivo de salida
+        fmt: 'csv' o 'jsonl' (por defecto según la extensión)
+        store: LeadStore a usar
+        status: Filtrar por estado
+        source: Filtrar por fuente
+        segment: Segmento guardado o definición (ver src/segments.py); reemplaza status/source
+
+    Returns:
+        Reporte con filas exportadas y filas/segundo
+    """
+    fmt = detect_format(path, fmt)
+    store = store or LeadStore()
+    started = time.perf_counter()
+    rows = 0
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+        leads = store.iter_segment(segment) if segment else store.iter_leads(status=status, source=source)
+        for lead in leads:
+            if fmt == 'csv':
+                writer.writerow({**lead, 'interests': ';'.join(lead.get('interests') or [])})
+            else:
+                f.write(json.dumps(lead, ensure_ascii=False) + '\n')
+            rows += 1
+
+    elapsed = time.perf_counter() - started
+    report = {
+        'path': path,
+        'rows': rows,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed) if elapsed > 0 else rows
+    }
+    print(f"📤 Exportación: {rows} leads a {path} ({report['rows_per_second']} filas/s)")
+    return report
+
+
+def format_leads_table(leads):
+    """
+    Tabla de texto de ancho fijo para una página de leads
+
+    Pensada para Telegram (bloque de código) y para el contexto de los agentes:
+    una línea por lead en lugar de JSON indentado.
+    """
+    def cell(value, width):
+        text = '' if value is None else str(value)
+        return text[:width - 1] + '…' if len(text) > width else text.ljust(width)
+
+    header = ' '.join(cell(title, width) for _, title, width in TABLE_COLUMNS)
+    lines = [header.rstrip(), '-' * len(header)]
+    for lead in leads:
+        contact = {**lead, 'email': lead.get('email') or lead.get('phone')}
+        lines.append(' '.join(cell(contact.get(field), width) for field, _, width in TABLE_COLUMNS).rstrip())
+    return '\n'.join(lines)
@@ -0,0 +1,215 @@
+"""
+Motor de puntuación de leads vectorizado (numpy)
+Extrae características de todos los leads y los puntúa en una sola pasada
+"""
+import re
+from datetime import datetime
+import numpy as np
+from config.settings import LEAD_SCORING_PROFILE
+from src.lead_store import LeadStore
+
+# Grupos de palabras clave (español e inglés) buscados en notas, intereses e intenciones
+KEYWORD_GROUPS = {
+    'high_income': ['entrepreneur', 'ceo', 'founder', 'executive', 'business owner',
+                    'empresario', 'empresaria', 'fundador', 'fundadora', 'director', 'dueño de negocio'],
+    'spiritual': ['spiritual', 'healing', 'transformation', 'consciousness',
+                  'espiritual', 'sanación', 'sanacion', 'transformación', 'conciencia'],
+    'plant_medicine': ['ayahuasca', 'plant medicine', 'ceremony', 'shaman', 'kambo', 'rapé',
+                       'medicina', 'ceremonia', 'chamán', 'temazcal'],
+    'booking_intent': ['precio', 'price', 'cost', 'costo', 'fecha', 'date', 'reservar', 'book',
+                       'discovery call', 'agendar', 'disponibilidad', 'inscribir']
+}
+
+# Cada grupo se busca como palabras completas (con plural o -ing/-ed): 'book' no coincide
+# con "facebook" ni 'date' con "update"
+KEYWORD_PATTERNS = {
+    group: re.compile(r"\b(?:" + '|'.join(re.escape(keyword) for keyword in keywords) + r")(?:s|es|ing|ed)?\b")
+    for group, keywords in KEYWORD_GROUPS.items()
+}
+
+# Perfiles de pesos: se eligen con LEAD_SCORING_PROFILE o por parámetro
+SCORING_PROFILES = {
+    'default': {
+        'keywords': {'high_income': 3, 'spiritual': 2, 'plant_medicine': 3, 'booking_intent': 2},
+        'sources': {'referral': 1.5, 'website': 1.0, 'whatsapp': 1.0, 'messenger': 0.5,
+                    'instagram': 0.5, 'facebook': 0.5, 'import': 0.0},
+        'statuses': {'new': 0.0, 'contacted': 0.5, 'interested': 1.5, 'qualified': 2.5, 'converted': 0.0},
+        'recency': 1.5,       # contacto reciente (decae con RECENCY_HALF_LIFE_DAYS)
+        'interests': 1.0,     # cantidad de intereses declarados
+        'engagement': 1.0     # mensajes intercambiados
+    },
+    # Últimas semanas antes de un retiro: prioriza intención de reserva y actividad reciente
+    'retreat_push': {
+        'keywords': {'high_income': 2, 'spiritual': 1, 'plant_medicine': 2, 'booking_intent': 4},
+        'sources': {'referral': 1.0, 'website': 1.0, 'whatsapp': 1.5, 'messenger': 1.0,
+                    'instagram': 0.5, 'facebook': 0.5, 'import': 0.0},
+        'statuses': {'new': 0.0, 'contacted': 1.0, 'interested': 2.0, 'qualified': 3.0, 'converted': 0.0},
+        'recency': 3.0,
+        'interests': 0.5,
+        'engagement': 2.0
+    }
+}
+
+RECENCY_HALF_LIFE_DAYS = 14
+MAX_SCORE = 10
+
+
+class LeadScoringEngine:
+    """
+    Puntúa leads con una matriz de características X (n x f) y un vector de pesos w
+
+    score = clip(X · w, 0, 10). Las características se calculan por columnas
+    con operaciones numpy sobre todo el lote, no lead por lead.
+    """
+
+    def __init__(self, profile=None):
+        """
+        Args:
+            profile: Nombre de un perfil de SCORING_PROFILES o un diccionario de pesos
+        """
+        if isinstance(profile, dict):
+            self.profile_name = 'custom'
+            self.profile = profile
+        else:
+            self.profile_name = profile or LEAD_SCORING_PROFILE
+            if self.profile_name not in SCORING_PROFILES:
+                raise ValueError(f"Perfil de scoring desconocido: {self.profile_name}")
+            self.profile = SCORING_PROFILES[self.profile_name]
+
+        self.sources = list(self.profile['sources'])
+        self.statuses = list(self.profile['statuses'])
+        self.feature_names = (
+            [f"kw:{group}" for group in KEYWORD_GROUPS]
+            + [f"source:{source}" for source in self.sources]
+            + [f"status:{status}" for status in self.statuses]
+            + ['recency', 'interests', 'engagement']
+        )
+        self.weights = np.array(
+            [self.profile['keywords'].get(group, 0) for group in KEYWORD_GROUPS]
+            + [self.profile['sources'][source] for source in self.sources]
+            + [self.profile['statuses'][status] for status in self.statuses]
+            + [self.profile['recency'], self.profile['interests'], self.profile['engagement']],
+            dtype=np.float32
+        )
+
+    # ===== CARACTERÍSTICAS =====
+    @staticmethod
+    def lead_text(lead):
+        """Texto libre de un lead donde se buscan las palabras clave"""
+        parts = [lead.get('notes') or '']
+        parts.extend(lead.get('interests') or [])
+        parts.extend(lead.get('intents') or [])
+        parts.append(lead.get('last_message') or '')
+        return ' '.join(str(p) for p in parts).lower()
+
+    def keyword_features(self, texts):
+        """Matriz (n x grupos) con 1 si el texto contiene alguna palabra del grupo (palabra completa)"""
+        texts = list(texts)
+        columns = [np.fromiter((pattern.search(text) is not None for text in texts), dtype=bool, count=len(texts))
+                   for pattern in KEYWORD_PATTERNS.values()]
+        return np.stack(columns, axis=1).astype(np.float32) if texts else np.zeros((0, len(KEYWORD_GROUPS)),
+                                                                                   dtype=np.float32)
+
+    def extract_features(self, leads, now=None):
+        """Construye la matriz de características de un lote de leads"""
+        now = now or datetime.now()
+        n = len(leads)
+
+        keyword_matrix = self.keyword_features([self.lead_text(lead) for lead in leads])
+
+        source_index = {source: i for i, source in enumerate(self.sources)}
+        source_ids = np.array([source_index.get(lead.get('source'), -1) for lead in leads])
+        source_matrix = np.zeros((n, len(self.sources)), dtype=np.float32)
+        known = source_ids >= 0
+        source_matrix[np.nonzero(known)[0], source_ids[known]] = 1
+
+        status_index = {status: i for i, status in enumerate(self.statuses)}
+        status_ids = np.array([status_index.get(lead.get('status'), -1) for lead in leads])
+        status_matrix = np.zeros((n, len(self.statuses)), dtype=np.float32)
+        known = status_ids >= 0
+        status_matrix[np.nonzero(known)[0], status_ids[known]] = 1
+
+        ages = np.array([self._age_days(lead, now) for lead in leads], dtype=np.float32)
+        recency = np.power(0.5, ages / RECENCY_HALF_LIFE_DAYS)
+
+        interests = np.minimum([len(lead.get('interests') or []) for lead in leads], 5) / 5
+        engagement = np.minimum([lead.get('message_count') or 0 for lead in leads], 10) / 10
+
+        return np.hstack([
+            keyword_matrix,
+            source_matrix,
+            status_matrix,
+            np.column_stack([recency, interests, engagement]).astype(np.float32)
+        ])
+
+    @staticmethod
+    def _age_days(lead, now):
+        """Días desde el último contacto (o desde la creación)"""
+        timestamp = lead.get('last_contact') or lead.get('created_at')
+        if not timestamp:
+            return 365.0
+        try:
+            moment = datetime.fromisoformat(str(timestamp)[:26])
+        except ValueError:
+            return 365.0
+        return max((now - moment).total_seconds() / 86400, 0.0)
+
+    # ===== PUNTUACIÓN =====
+    def score_matrix(self, features):
+        """Aplica los pesos a toda la matriz en una operación"""
+        return np.clip(features @ self.weights, 0, MAX_SCORE).astype(np.float64).round(1)
+
+    def score_leads(self, leads, now=None):
+        """Puntúa una lista de leads (dicts) y devuelve un array de scores"""
+        if not leads:
+            return np.zeros(0, dtype=np.float32)
+        return self.score_matrix(self.extract_features(leads, now))
+
+    def score_text(self, text):
+        """Puntúa un texto libre usando solo las palabras clave (compatibilidad)"""
+        keyword_matrix = self.keyword_features([text.lower()])
+        keyword_weights = self.weights[:len(KEYWORD_GROUPS)]
+        return int(np.clip(keyword_matrix @ keyword_weights, 0, MAX_SCORE)[0])
+
+    def rescore(self, store=None, lead_ids=None, batch_size=10000):
+        """
+        Recalcula y guarda el score de todos los leads (o de los indicados)
+
+        Procesa por lotes para mantener acotada la memoria en bases grandes.
+
+        Returns:
+            Resumen {'scored', 'profile', 'average', 'premium'}
+        """
+        store = store or LeadStore()
+        now = datetime.now()
+        scored = 0
+        total = 0.0
+        premium = 0
+
+        if lead_ids is not None:
+            leads_iter = (lead for lead in (store.get(i) for i in lead_ids) if lead)
+        else:
+            leads_iter = store.iter_leads(batch_size=batch_size)
+
+        batch = []
+        for lead in leads_iter:
+            batch.append(lead)
+            if len(batch) >= batch_size:
+                scored, total, premium = self._score_batch(store, batch, now, scored, total, premium)
+                batch = []
+        if batch:
+            scored, total, premium = self._score_batch(store, batch, now, scored, total, premium)
+
+        result = {
+            'scored': scored,
+            'profile': self.profile_name,
+            'average': round(total / scored, 2) if scored else 0.0,
+            'premium': premium
+        }
+        print(f"🎯 Scoring ({self.profile_name}): {scored} leads | promedio {result['average']} | {premium} premium (≥7)")
+        return result
+
+    def _score_batch(self, store, batch, now, scored, total, premium):
+        scores = self.score_leads(batch, now)
+        store.set_scores(zip((lead['id'] for lead in batch), scores.tolist()), self.profile_name)
+        return scored + len(batch), total + float(scores.sum()), premium + int((scores >= 7).sum())
@@ -0,0 +1,793 @@
+"""
+Repositorio de leads sobre SQLite
+Reemplaza las lecturas y reescrituras completas de data/leads.json
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from config.settings import LEADS_DATABASE_PATH, SEGMENT_REFRESH_SECONDS
+from src.db import connect
+from src.lead_identity import identity_keys, merge_leads
+from src.segments import DEFAULT_SEGMENTS, compile_segment, is_relative
+
+# Columnas propias de la tabla; cualquier otro campo del lead va a `extra`
+LEAD_COLUMNS = ('name', 'email', 'phone', 'status', 'source', 'interests', 'notes', 'created_at', 'updated_at',
+                'score', 'score_profile', 'scored_at', 'language')
+
+# Columnas agregadas después de la primera versión del esquema (se crean con ALTER TABLE)
+ADDED_COLUMNS = {
+    'score': 'REAL',
+    'score_profile': 'TEXT',
+    'scored_at': 'TEXT',
+    'language': 'TEXT'
+}
+
+# Órdenes de paginación: (expresión SQL, descendente); cada una tiene índice con id
+PAGE_SORTS = {
+    'recent': ('leads.id', True),
+    'oldest': ('leads.id', False),
+    'created': ('leads.created_at', True),
+    'score': ('IFNULL(leads.score, -1)', True)
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    email TEXT,
+    phone TEXT,
+    status TEXT NOT NULL DEFAULT 'new',
+    source TEXT,
+    interests TEXT NOT NULL DEFAULT '[]',
+    notes TEXT,
+    extra TEXT NOT NULL DEFAULT '{}',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_leads_email ON leads(email);
+CREATE INDEX IF NOT EXISTS idx_leads_status ON leads(status);
+CREATE INDEX IF NOT EXISTS idx_leads_source ON leads(source);
+CREATE INDEX IF NOT EXISTS idx_leads_created_at ON leads(created_at);
+CREATE TABLE IF NOT EXISTS lead_keys (
+    key TEXT PRIMARY KEY,
+    lead_id INTEGER NOT NULL REFERENCES leads(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_lead_keys_lead_id ON lead_keys(lead_id);
+CREATE TABLE IF NOT EXISTS lead_interests (
+    interest TEXT NOT NULL,
+    lead_id INTEGER NOT NULL REFERENCES leads(id) ON DELETE CASCADE,
+    PRIMARY KEY (interest, lead_id)
+);
+CREATE INDEX IF NOT EXISTS idx_lead_interests_lead_id ON lead_interests(lead_id);
+CREATE TABLE IF NOT EXISTS segments (
+    name TEXT PRIMARY KEY,
+    definition TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    refreshed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS segment_members (
+    segment TEXT NOT NULL REFERENCES segments(name) ON DELETE CASCADE,
+    lead_id INTEGER NOT NULL REFERENCES leads(id) ON DELETE CASCADE,
+    PRIMARY KEY (segment, lead_id)
+);
+CREATE INDEX IF NOT EXISTS idx_segment_members_lead_id ON segment_members(lead_id);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class LeadStore:
+    """
+    Acceso a leads con índices por email, estado, fuente y fecha de creación
+
+    Los leads se devuelven como diccionarios con la misma forma que tenían
+    en data/leads.json, así las herramientas y plantillas no cambian.
+    """
+
+    def __init__(self, db_path=None, json_path=None):
+        """
+        Args:
+            db_path: Ruta de la base de datos (por defecto DATABASE_PATH)
+            json_path: JSON legado a migrar una sola vez (por defecto LEADS_DATABASE_PATH)
+        """
+        self.conn = connect(db_path)
+        self._lock = threading.RLock()
+        # Leads escritos en la transacción actual (para actualizar segmentos)
+        self._dirty = set()
+        with self._lock, self.conn:
+            self.conn.executescript(SCHEMA)
+            self._ensure_columns()
+        self.migrate_from_json(json_path or LEADS_DATABASE_PATH)
+        if not self._get_meta('identity_keys_indexed'):
+            self._index_identity_keys()
+        if not self._get_meta('interests_indexed'):
+            self._reindex_interests()
+        if not self._get_meta('default_segments'):
+            for name, definition in DEFAULT_SEGMENTS.items():
+                self.define_segment(name, definition)
+            with self._lock, self.conn:
+                self._set_meta('default_segments', datetime.now().isoformat())
+
+    # ===== MIGRACIÓN =====
+    def migrate_from_json(self, json_path):
+        """
+        Importa data/leads.json una única vez (queda registrado en store_meta)
+
+        Returns:
+            Número de leads migrados
+        """
+        if self._get_meta('json_migrated') or not os.path.exists(json_path):
+            return 0
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                legacy_leads = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ No se pudo leer {json_path} para migrar: {e}")
+            return 0
+
+        with self._lock, self.conn:
+            migrated = 0
+            for lead in legacy_leads:
+                lead = dict(lead)
+                legacy_id = lead.pop('id', None)
+                row = self._to_row(lead)
+                # Se conserva el id original salvo que esté duplicado
+                if isinstance(legacy_id, int) and not self._exists(legacy_id):
+                    row['id'] = legacy_id
+                lead_id = self._insert_row(row)
+                self._register_keys(lead_id, identity_keys(lead))
+                migrated += 1
+            self._set_meta('json_migrated', datetime.now().isoformat())
+            self._sync_segments()
+
+        print(f"✅ {migrated} leads migrados de {json_path} a SQLite")
+        return migrated
+
+    def _ensure_columns(self):
+        """Agrega a bases existentes las columnas nuevas del esquema"""
+        existing = {row['name'] for row in self.conn.execute("PRAGMA table_info(leads)")}
+        for column, declaration in ADDED_COLUMNS.items():
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE leads ADD COLUMN {column} {declaration}")
+        if 'language' not in existing:
+            # El idioma podía venir guardado en `extra`
+            self.conn.execute(
+                "UPDATE leads SET language = lower(json_extract(extra, '$.language')) "
+                "WHERE json_extract(extra, '$.language') IS NOT NULL"
+            )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_score ON leads(score)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_created_at_id ON leads(created_at, id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_score_id ON leads(IFNULL(score, -1), id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_language ON leads(language)")
+
+    # ===== ESCRITURA =====
+    def add(self, lead_data):
+        """
+        Agrega un lead nuevo sin buscar duplicados (ver upsert)
+
+        Returns:
+            El lead guardado (con id y created_at)
+        """
+        row = self._to_row(lead_data)
+        with self._lock, self.conn:
+            lead_id = self._insert_row(row)
+            self._register_keys(lead_id, identity_keys(lead_data))
+            self._sync_segments()
+        return self.get(lead_id)
+
+    def upsert(self, lead_data):
+        """
+        Ingresa un lead fusionándolo con su duplicado si ya existe
+
+        La búsqueda usa las claves normalizadas de email/teléfono (clave
+        primaria de lead_keys), así que cuesta O(1) por lead.
+
+        Returns:
+            (lead, created) donde created=False indica que se fusionó
+        """
+        with self._lock, self.conn:
+            lead_id, created = self._upsert(lead_data)
+            self._sync_segments()
+        return self.get(lead_id), created
+
+    def upsert_many(self, leads):
+        """
+        Ingresa un lote de leads en una sola transacción (ver upsert)
+
+        Returns:
+            Lista de (lead_id, created) en el mismo orden
+        """
+        with self._lock, self.conn:
+            results = [self._upsert(lead_data) for lead_data in leads]
+            self._sync_segments()
+        return results
+
+    def update(self, lead_id, changes):
+        """
+        Actualiza campos de un lead existente
+
+        Returns:
+            El lead actualizado o None si no existe
+        """
+        with self._lock, self.conn:
+            current = self.get(lead_id)
+            if current is None:
+                return None
+            current.update(changes)
+            current.pop('id', None)
+            self._write(lead_id, current)
+            keys = identity_keys(current)
+            # Las claves del email/teléfono anteriores ya no identifican a este lead
+            self.conn.execute(
+                f"DELETE FROM lead_keys WHERE lead_id = ? AND key NOT IN ({', '.join('?' for _ in keys)})",
+                (lead_id, *keys)
+            )
+            conflicts = self._register_keys(lead_id, keys)
+            self._sync_segments()
+        for key, owner in conflicts.items():
+            print(f"⚠️ Lead {lead_id}: la clave {key} ya pertenece al lead {owner} (usa la acción 'dedup' para fusionarlos)")
+        return self.get(lead_id)
+
+    def set_scores(self, scores, profile):
+        """
+        Guarda scores calculados en lote (ver LeadScoringEngine)
+
+        Args:
+            scores: Iterable de (lead_id, score)
+            profile: Perfil de pesos con el que se calcularon
+        """
+        scored_at = datetime.now().isoformat()
+        scores = list(scores)
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE leads SET score = ?, score_profile = ?, scored_at = ? WHERE id = ?",
+                ((score, profile, scored_at, lead_id) for lead_id, score in scores)
+            )
+            self._dirty.update(lead_id for lead_id, _ in scores)
+            self._sync_segments()
+
+    def delete(self, lead_id):
+        """Elimina un lead"""
+        with self._lock, self.conn:
+            cursor = self.conn.execute("DELETE FROM leads WHERE id = ?", (lead_id,))
+        return cursor.rowcount > 0
+
+    # ===== DEDUPLICACIÓN MASIVA =====
+    def _index_identity_keys(self, batch_size=5000):
+        """
+        Primera apertura de una base anterior a lead_keys: indexa las claves sin
+        borrar nada (cada clave queda con el lead más antiguo). Fusionar los
+        duplicados es un paso explícito: rededup() o --mode leads --action dedup.
+        """
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "SELECT id, email, phone, json_extract(extra, '$.messenger_id') AS messenger_id "
+                "FROM leads ORDER BY id"
+            )
+            shared = 0
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    shared += len(self._register_keys(row['id'], identity_keys(dict(row))))
+            self._set_meta('identity_keys_indexed', datetime.now().isoformat())
+        if shared:
+            print(f"⚠️ {shared} claves de email/teléfono se repiten entre leads; "
+                  f"fusiónalos con: python main.py --mode leads --action dedup")
+        return shared
+
+    def rededup(self, batch_size=5000):
+        """
+        Recalcula las claves de identidad y fusiona todos los duplicados
+
+        Recorre la tabla una sola vez en lotes y agrupa con union-find sobre
+        las claves normalizadas; solo se cargan completos los leads duplicados.
+        Pensado para bases de 100k+ leads en segundos. Borra los duplicados
+        fusionados: se ejecuta solo a pedido (acción 'dedup').
+
+        Returns:
+            Resumen {'scanned', 'merged', 'groups', 'seconds'}
+        """
+        started = time.perf_counter()
+        parent = {}
+        key_owner = {}
+
+        def find(lead_id):
+            root = lead_id
+            while parent[root] != root:
+                root = parent[root]
+            while parent[lead_id] != root:
+                parent[lead_id], lead_id = root, parent[lead_id]
+            return root
+
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "SELECT id, email, phone, json_extract(extra, '$.messenger_id') AS messenger_id "
+                "FROM leads ORDER BY id"
+            )
+            scanned = 0
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    scanned += 1
+                    lead_id = row['id']
+                    parent[lead_id] = lead_id
+                    for key in identity_keys(dict(row)):
+                        owner = key_owner.get(key)
+                        if owner is None:
+                            key_owner[key] = lead_id
+                            continue
+                        # El id menor (más antiguo) queda como raíz del grupo
+                        a, b = find(owner), find(lead_id)
+                        if a != b:
+                            parent[max(a, b)] = min(a, b)
+
+            groups = {}
+            for lead_id in parent:
+                root = find(lead_id)
+                if root != lead_id:
+                    groups.setdefault(root, []).append(lead_id)
+
+            merged_count = 0
+            for root, duplicates in groups.items():
+                merged = self._merge_into(root, duplicates)
+                self._write(root, merged)
+                merged_count += len(duplicates)
+
+            # Reconstruye el índice de claves de una sola vez
+            self.conn.execute("DELETE FROM lead_keys")
+            self.conn.executemany(
+                "INSERT INTO lead_keys (key, lead_id) VALUES (?, ?)",
+                ((key, find(owner)) for key, owner in key_owner.items())
+            )
+            self._set_meta('identity_keys_indexed', datetime.now().isoformat())
+            self._sync_segments()
+
+        result = {
+            'scanned': scanned,
+            'merged': merged_count,
+            'groups': len(groups),
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+        print(f"🧹 Deduplicación: {scanned} leads revisados, {merged_count} duplicados "
+              f"fusionados en {len(groups)} grupos ({result['seconds']}s)")
+        return result
+
+    # ===== SEGMENTOS =====
+    def define_segment(self, name, definition):
+        """
+        Guarda (o redefine) un segmento y materializa sus miembros
+
+        Desde ese momento la pertenencia se actualiza sola en cada escritura
+        de leads, solo para los leads modificados (ver src/segments.py).
+
+        Returns:
+            Número de miembros
+        """
+        compile_segment(definition)  # valida antes de guardar
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO segments (name, definition, created_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET definition = excluded.definition",
+                (name, definition, datetime.now().isoformat())
+            )
+            return self._refresh_segment(name, definition)
+
+    def drop_segment(self, name):
+        """Elimina un segmento guardado y su membresía"""
+        with self._lock, self.conn:
+            cursor = self.conn.execute("DELETE FROM segments WHERE name = ?", (name,))
+        return cursor.rowcount > 0
+
+    def list_segments(self):
+        """Segmentos guardados con su definición y número de miembros"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT s.name, s.definition, s.refreshed_at, COUNT(m.lead_id) AS members "
+                "FROM segments s LEFT JOIN segment_members m ON m.segment = s.name "
+                "GROUP BY s.name ORDER BY s.name"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def segment_count(self, segment):
+        """Cuenta leads de un segmento guardado (por nombre) o de una definición ad hoc"""
+        sql, params = self._segment_query(segment, "COUNT(*)")
+        with self._lock:
+            if self.conn.execute("SELECT 1 FROM segments WHERE name = ?", (segment,)).fetchone():
+                sql = "SELECT COUNT(*) FROM segment_members WHERE segment = ?"
+            return self.conn.execute(sql, params).fetchone()[0]
+
+    def find_segment(self, segment, limit=None, offset=0):
+        """Lista leads de un segmento (nombre guardado o definición)"""
+        sql, params = self._segment_query(segment, "leads.*")
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def iter_segment(self, segment, batch_size=500):
+        """
+        Itera por lotes los leads de un segmento (nombre guardado o definición)
+
+        Igual que iter_leads: cada lote es una consulta por id con el candado
+        tomado, nunca un cursor abierto sobre la conexión compartida.
+        """
+        source, where, params = self._segment_source(segment)
+        sql = f"SELECT leads.* FROM {source} WHERE ({where}) AND leads.id > ? ORDER BY leads.id LIMIT ?"
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self.conn.execute(sql, (*params, last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            for row in rows:
+                yield self._from_row(row)
+
+    def _segment_query(self, segment, select):
+        """SQL para leer un segmento: membresía materializada si existe, si no la definición"""
+        source, where, params = self._segment_source(segment)
+        sql = f"SELECT {select} FROM {source} WHERE {where}"
+        if select != "COUNT(*)":
+            sql += " ORDER BY leads.id"
+        return sql, params
+
+    def _segment_source(self, segment):
+        """(FROM, WHERE, params) de un segmento guardado, una definición o 'all'"""
+        with self._lock:
+            saved = self.conn.execute(
+                "SELECT definition, refreshed_at FROM segments WHERE name = ?", (segment,)
+            ).fetchone()
+            if saved and is_relative(saved['definition']) and self._is_stale(saved['refreshed_at']):
+                # Las ventanas tipo created:7d cambian con el tiempo aunque nadie escriba
+                with self.conn:
+                    self._refresh_segment(segment, saved['definition'])
+
+        if saved:
+            # Sonda por la PK (segment, lead_id): el recorrido lo guía el índice de orden de leads
+            where = "EXISTS (SELECT 1 FROM segment_members WHERE segment = ? AND lead_id = leads.id)"
+            return "leads", where, [segment]
+        where, params = compile_segment(segment)
+        return "leads", where, params
+
+    @staticmethod
+    def _is_stale(refreshed_at):
+        if not refreshed_at:
+            return True
+        age = datetime.now() - datetime.fromisoformat(refreshed_at)
+        return age.total_seconds() > SEGMENT_REFRESH_SECONDS
+
+    def _refresh_segment(self, name, definition):
+        """Recalcula por completo la membresía de un segmento"""
+        where, params = compile_segment(definition)
+        self.conn.execute("DELETE FROM segment_members WHERE segment = ?", (name,))
+        cursor = self.conn.execute(
+            f"INSERT INTO segment_members (segment, lead_id) SELECT ?, id FROM leads WHERE {where}",
+            [name] + params
+        )
+        self.conn.execute(
+            "UPDATE segments SET refreshed_at = ? WHERE name = ?", (datetime.now().isoformat(), name)
+        )
+        return cursor.rowcount
+
+    def _sync_segments(self, chunk_size=500):
+        """
+        Actualiza la membresía de los segmentos solo para los leads escritos
+
+        Se llama al final de cada transacción de escritura; el costo depende
+        de los leads modificados, no del tamaño de la base.
+        """
+        if not self._dirty:
+            return
+        dirty = sorted(self._dirty)
+        self._dirty.clear()
+        segments = self.conn.execute("SELECT name, definition FROM segments").fetchall()
+        for segment in segments:
+            where, params = compile_segment(segment['definition'])
+            for start in range(0, len(dirty), chunk_size):
+                chunk = dirty[start:start + chunk_size]
+                placeholders = ', '.join('?' for _ in chunk)
+                self.conn.execute(
+                    f"DELETE FROM segment_members WHERE segment = ? AND lead_id IN ({placeholders})",
+                    [segment['name']] + chunk
+                )
+                self.conn.execute(
+                    f"INSERT INTO segment_members (segment, lead_id) SELECT ?, id FROM leads "
+                    f"WHERE id IN ({placeholders}) AND {where}",
+                    [segment['name']] + chunk + params
+                )
+
+    def _reindex_interests(self):
+        """Reconstruye el índice de intereses (bases creadas antes de los segmentos)"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM lead_interests")
+            for row in self.conn.execute("SELECT id, interests FROM leads").fetchall():
+                self._index_interests(row['id'], row['interests'])
+            self._set_meta('interests_indexed', datetime.now().isoformat())
+
+    def _index_interests(self, lead_id, interests_json):
+        """Sincroniza lead_interests con los intereses del lead"""
+        self.conn.execute("DELETE FROM lead_interests WHERE lead_id = ?", (lead_id,))
+        interests = {str(i).strip().lower() for i in json.loads(interests_json or '[]') if str(i).strip()}
+        if interests:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO lead_interests (interest, lead_id) VALUES (?, ?)",
+                [(interest, lead_id) for interest in interests]
+            )
+
+    # ===== PAGINACIÓN =====
+    def page(self, segment=None, sort='recent', limit=10, cursor=None):
+        """
+        Página de leads con paginación por cursor (keyset)
+
+        Cada página filtra por (clave de orden, id) sobre un índice compuesto,
+        así que el costo no crece con la posición ni con el tamaño de la base.
+
+        Args:
+            segment: Segmento guardado o definición (None = todos)
+            sort: Orden ('recent', 'oldest', 'created', 'score')
+            limit: Leads por página
+            cursor: Cursor devuelto por una página anterior ('next' o 'prev')
+
+        Returns:
+            {'leads': [...], 'next': cursor o None, 'prev': cursor o None}
+        """
+        if sort not in PAGE_SORTS:
+            raise ValueError(f"Orden no válido: '{sort}' (usa {', '.join(PAGE_SORTS)})")
+        expression, descending = PAGE_SORTS[sort]
+        source, where, params = self._segment_source(segment or 'all')
+
+        direction, key, last_id = self._decode_cursor(cursor, sort) if cursor else ('a', None, None)
+        # Hacia atrás se recorre en orden inverso y luego se invierte la página
+        forward = direction == 'a'
+        ascending = forward != descending
+        if key is not None:
+            operator = '>' if ascending else '<'
+            # La cota simple sobre la clave permite a SQLite buscar en el índice (no recorrerlo)
+            where += f" AND {expression} {operator}= ? AND ({expression}, leads.id) {operator} (?, ?)"
+            params = params + [key, key, last_id]
+        order = 'ASC' if ascending else 'DESC'
+
+        sql = (f"SELECT leads.*, {expression} AS sort_key FROM {source} WHERE {where} "
+               f"ORDER BY {expression} {order}, leads.id {order} LIMIT ?")
+        with self._lock:
+            rows = self.conn.execute(sql, params + [limit + 1]).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if not forward:
+            rows.reverse()
+
+        next_cursor = prev_cursor = None
+        if rows:
+            first, last = rows[0], rows[-1]
+            if has_more or not forward:
+                next_cursor = self._encode_cursor('a', last['sort_key'], last['id'])
+            if cursor and (forward or has_more):
+                prev_cursor = self._encode_cursor('b', first['sort_key'], first['id'])
+        return {'leads': [self._from_row(row) for row in rows], 'next': next_cursor, 'prev': prev_cursor}
+
+    @staticmethod
+    def _encode_cursor(direction, key, lead_id):
+        """Cursor compacto 'a|b:id:clave' (cabe en el callback_data de Telegram)"""
+        return f"{direction}:{lead_id}:{key}"
+
+    @staticmethod
+    def _decode_cursor(cursor, sort):
+        try:
+            direction, lead_id, key = cursor.split(':', 2)
+            if direction not in ('a', 'b'):
+                raise ValueError
+            key = {'score': float, 'created': str}.get(sort, int)(key)
+            return direction, key, int(lead_id)
+        except ValueError:
+            raise ValueError(f"Cursor inválido: '{cursor}'")
+
+    # ===== LECTURA =====
+    def get(self, lead_id):
+        """Obtiene un lead por id"""
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM leads WHERE id = ?", (lead_id,)).fetchone()
+        return self._from_row(row) if row else None
+
+    def find_by_email(self, email):
+        """Busca un lead por email (usa idx_leads_email)"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM leads WHERE email = ? ORDER BY id LIMIT 1", (email,)
+            ).fetchone()
+        return self._from_row(row) if row else None
+
+    def find(self, status=None, source=None, limit=None, offset=0):
+        """
+        Lista leads filtrando por estado y/o fuente
+
+        Args:
+            status: Estado ('new', 'interested', 'contacted', 'converted'...)
+            source: Fuente ('instagram', 'facebook', 'website'...)
+            limit: Máximo de resultados (None = todos)
+            offset: Desplazamiento
+        """
+        where, params = self._filters(status, source)
+        sql = f"SELECT * FROM leads{where} ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def iter_leads(self, status=None, source=None, batch_size=500):
+        """
+        Itera todos los leads por lotes, sin cargar la tabla completa en memoria
+
+        Cada lote es una consulta por id (keyset) con el candado tomado, así
+        otros hilos pueden usar la conexión entre lote y lote.
+        """
+        where, params = self._filters(status, source)
+        where = f"{where} AND id > ?" if where else " WHERE id > ?"
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    f"SELECT * FROM leads{where} ORDER BY id LIMIT ?", (*params, last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            for row in rows:
+                yield self._from_row(row)
+
+    def count(self, status=None, source=None):
+        """Cuenta leads (con filtros opcionales)"""
+        where, params = self._filters(status, source)
+        with self._lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM leads{where}", params).fetchone()[0]
+
+    # ===== INTERNOS =====
+    @staticmethod
+    def _filters(status, source):
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if source:
+            clauses.append("source = ?")
+            params.append(source)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def _upsert(self, lead_data):
+        """Inserta o fusiona un lead dentro de la transacción actual"""
+        keys = identity_keys(lead_data)
+        matches = self._lookup_keys(keys)
+        if not matches:
+            lead_id = self._insert_row(self._to_row(lead_data))
+            self._register_keys(lead_id, keys)
+            return lead_id, True
+
+        # Puede coincidir con varios leads (email de uno, teléfono de otro):
+        # todos se consolidan en el más antiguo
+        target_id = min(matches)
+        merged = self._merge_into(target_id, [m for m in matches if m != target_id])
+        merged = merge_leads(merged, lead_data)
+        self._write(target_id, merged)
+        self._register_keys(target_id, keys + identity_keys(merged))
+        return target_id, False
+
+    def _lookup_keys(self, keys):
+        """Ids de leads que comparten alguna clave de identidad"""
+        if not keys:
+            return set()
+        placeholders = ', '.join('?' for _ in keys)
+        rows = self.conn.execute(
+            f"SELECT DISTINCT lead_id FROM lead_keys WHERE key IN ({placeholders})", keys
+        ).fetchall()
+        return {row['lead_id'] for row in rows}
+
+    def _register_keys(self, lead_id, keys):
+        """
+        Asocia claves de identidad a un lead sin quitárselas a otro
+
+        Returns:
+            {clave: lead_id dueño} de las claves que ya pertenecían a otro lead
+        """
+        if not keys:
+            return {}
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO lead_keys (key, lead_id) VALUES (?, ?)",
+            [(key, lead_id) for key in keys]
+        )
+        rows = self.conn.execute(
+            f"SELECT key, lead_id FROM lead_keys WHERE key IN ({', '.join('?' for _ in keys)}) AND lead_id != ?",
+            (*keys, lead_id)
+        ).fetchall()
+        return {row['key']: row['lead_id'] for row in rows}
+
+    def _merge_into(self, target_id, duplicate_ids):
+        """
+        Fusiona los duplicados en target_id, borra los duplicados y
+        reasigna sus claves. Devuelve el lead fusionado (sin escribirlo).
+        """
+        merged = self.get(target_id)
+        for duplicate_id in sorted(duplicate_ids):
+            duplicate = self.get(duplicate_id)
+            if duplicate is None:
+                continue
+            merged = merge_leads(merged, duplicate)
+            self.conn.execute("UPDATE lead_keys SET lead_id = ? WHERE lead_id = ?", (target_id, duplicate_id))
+            self.conn.execute("DELETE FROM leads WHERE id = ?", (duplicate_id,))
+        merged.pop('id', None)
+        return merged
+
+    def _write(self, lead_id, lead):
+        """Sobrescribe las columnas de un lead existente"""
+        row = self._to_row(lead)
+        assignments = ', '.join(f"{column} = :{column}" for column in row)
+        self.conn.execute(f"UPDATE leads SET {assignments} WHERE id = :id", {**row, 'id': lead_id})
+        self._index_interests(lead_id, row['interests'])
+        self._dirty.add(lead_id)
+
+    def _exists(self, lead_id):
+        return self.conn.execute("SELECT 1 FROM leads WHERE id = ?", (lead_id,)).fetchone() is not None
+
+    def _insert_row(self, row):
+        columns = ', '.join(row)
+        placeholders = ', '.join(f":{column}" for column in row)
+        cursor = self.conn.execute(f"INSERT INTO leads ({columns}) VALUES ({placeholders})", row)
+        self._index_interests(cursor.lastrowid, row['interests'])
+        self._dirty.add(cursor.lastrowid)
+        return cursor.lastrowid
+
+    @staticmethod
+    def _to_row(lead):
+        """Convierte un lead (dict) en columnas de la tabla"""
+        now = datetime.now().isoformat()
+        extra = {k: v for k, v in lead.items() if k not in LEAD_COLUMNS and k not in ('id', 'extra')}
+        return {
+            'name': lead.get('name'),
+            'email': lead.get('email'),
+            'phone': lead.get('phone'),
+            'status': lead.get('status') or 'new',
+            'source': lead.get('source'),
+            'interests': json.dumps(lead.get('interests') or [], ensure_ascii=False),
+            'notes': lead.get('notes'),
+            'extra': json.dumps(extra, ensure_ascii=False, default=str),
+            'created_at': lead.get('created_at') or now,
+            'updated_at': now,
+            'score': lead.get('score'),
+            'score_profile': lead.get('score_profile'),
+            'scored_at': lead.get('scored_at'),
+            'language': (lead.get('language') or '').lower() or None
+        }
+
+    @staticmethod
+    def _from_row(row):
+        """Convierte una fila en el diccionario de lead original"""
+        lead = {'id': row['id']}
+        for column in LEAD_COLUMNS:
+            lead[column] = row[column]
+        lead['interests'] = json.loads(row['interests'] or '[]')
+        lead.update(json.loads(row['extra'] or '{}'))
+        return lead
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute(
+            "INSERT INTO store_meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
@@ -0,0 +1,294 @@
+"""
+Publicaciones programadas en Facebook e Instagram
+
+Cada post programado se guarda en SQLite con su hora (TIMEZONE). En
+memoria solo vive un índice de vencimientos: un heap de (hora, id) que un
+hilo despachador consulta; el hilo duerme exactamente hasta el siguiente
+vencimiento y se despierta antes si se programa algo más próximo, así
+cada post sale a los pocos segundos de su hora.
+
+Reprogramar agrega una entrada nueva al heap y cancelar solo cambia la
+fila: al llegar su turno, una entrada cuya hora o estado ya no coincide
+con la base se descarta. Al reiniciar, el heap se reconstruye desde la
+base con los posts pendientes.
+
+Otros procesos (el bot, main.py) programan en la misma base sin acceso a
+este heap: en cada despertar, y al menos cada MAX_WAIT_SECONDS, el
+despachador relee por idx_scheduled_posts_due los posts que vencen antes
+de la siguiente revisión y los agrega al heap.
+"""
+import heapq
+import json
+import threading
+from datetime import datetime, timedelta
+import pytz
+from config.settings import TIMEZONE, SCHEDULED_POST_GRACE_MINUTES
+from src.db import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduled_posts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    platform TEXT NOT NULL,
+    content TEXT NOT NULL,
+    image_urls TEXT,
+    link TEXT,
+    scheduled_at TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'scheduled',
+    post_id TEXT,
+    error TEXT,
+    published_at TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scheduled_posts_due ON scheduled_posts(status, scheduled_at);
+"""
+
+PLATFORMS = ('facebook', 'instagram')
+
+# Estados de un post programado
+POST_STATUSES = {
+    'scheduled': '📅',
+    'publishing': '📤',
+    'published': '✅',
+    'failed': '❌',
+    'missed': '⌛',       # su hora pasó hace más de SCHEDULED_POST_GRACE_MINUTES (ej. servidor apagado)
+    'cancelled': '🚫'
+}
+
+# Espera máxima del despachador entre revisiones (s): posts programados por otros
+# procesos y cambios del reloj del sistema
+MAX_WAIT_SECONDS = 60
+
+
+class PostScheduler:
+    """
+    Posts programados persistentes y despachador que los publica a su hora
+    """
+
+    def __init__(self, db_path=None, manager=None, grace_minutes=None, max_wait_seconds=None):
+        """
+        Args:
+            db_path: Ruta de la base de datos (por defecto DATABASE_PATH)
+            manager: SocialMediaManager que publica (por defecto uno nuevo)
+            grace_minutes: Retraso máximo para publicar un post vencido (SCHEDULED_POST_GRACE_MINUTES)
+            max_wait_seconds: Espera máxima entre revisiones de la base (MAX_WAIT_SECONDS)
+        """
+        self.conn = connect(db_path)
+        self._manager = manager
+        self.timezone = pytz.timezone(TIMEZONE)
+        self.grace = timedelta(minutes=SCHEDULED_POST_GRACE_MINUTES if grace_minutes is None else grace_minutes)
+        self.max_wait = max_wait_seconds or MAX_WAIT_SECONDS
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._heap = []
+        self._thread = None
+        self._stopping = False
+        with self._lock, self.conn:
+            self.conn.executescript(SCHEMA)
+
+    @property
+    def manager(self):
+        if self._manager is None:
+            from src.social_media import SocialMediaManager
+            self._manager = SocialMediaManager()
+        return self._manager
+
+    def now(self):
+        """Hora actual del negocio (TIMEZONE), sin zona para comparar con la base"""
+        return datetime.now(self.timezone).replace(tzinfo=None)
+
+    def to_local(self, when):
+        """datetime o ISO -> hora del negocio sin zona (las horas sin zona ya se toman en TIMEZONE)"""
+        if isinstance(when, str):
+            when = datetime.fromisoformat(when)
+        if when.tzinfo is not None:
+            when = when.astimezone(self.timezone).replace(tzinfo=None)
+        return when
+
+    # ===== PROGRAMAR =====
+    def schedule(self, platform, content, scheduled_time, image_urls=None, link=None):
+        """
+        Programa un post
+
+        Args:
+            platform: 'facebook' o 'instagram'
+            content: Texto del post
+            scheduled_time: datetime o ISO (sin zona = hora de TIMEZONE)
+            image_urls: URL o lista de URLs (Instagram: obligatoria; varias = carrusel)
+            link: URL para compartir (Facebook)
+
+        Returns:
+            Post programado
+        """
+        platform = platform.lower()
+        if platform not in PLATFORMS:
+            raise ValueError(f"Plataforma '{platform}' no soportada ({', '.join(PLATFORMS)})")
+        image_urls = [image_urls] if isinstance(image_urls, str) else list(image_urls or [])
+        if platform == 'instagram' and not image_urls:
+            raise ValueError("Instagram necesita al menos una imagen")
+        scheduled_at = self.to_local(scheduled_time).isoformat()
+        now = datetime.now().isoformat()
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO scheduled_posts (platform, content, image_urls, link, scheduled_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (platform, content, json.dumps(image_urls) if image_urls else None, link, scheduled_at, now, now)
+            )
+        self._push(scheduled_at, cursor.lastrowid)
+        return self.get(cursor.lastrowid)
+
+    def reschedule(self, post_id, scheduled_time):
+        """Cambia la hora de un post aún no publicado; True si se cambió"""
+        scheduled_at = self.to_local(scheduled_time).isoformat()
+        with self._lock, self.conn:
+            changed = self.conn.execute(
+                "UPDATE scheduled_posts SET scheduled_at = ?, updated_at = ? WHERE id = ? AND status = 'scheduled'",
+                (scheduled_at, datetime.now().isoformat(), post_id)
+            ).rowcount
+        if changed:
+            self._push(scheduled_at, post_id)
+        return bool(changed)
+
+    def cancel(self, post_id):
+        """Cancela un post aún no publicado; True si se canceló"""
+        with self._lock, self.conn:
+            return self.conn.execute(
+                "UPDATE scheduled_posts SET status = 'cancelled', updated_at = ? WHERE id = ? AND status = 'scheduled'",
+                (datetime.now().isoformat(), post_id)
+            ).rowcount > 0
+
+    # ===== CONSULTAS =====
+    def get(self, post_id):
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM scheduled_posts WHERE id = ?", (post_id,)).fetchone()
+        return self._decode(row) if row else None
+
+    def upcoming(self, limit=20):
+        """Próximos posts programados, del más cercano al más lejano"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM scheduled_posts WHERE status = 'scheduled' ORDER BY scheduled_at LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._decode(row) for row in rows]
+
+    @staticmethod
+    def _decode(row):
+        post = dict(row)
+        post['image_urls'] = json.loads(post['image_urls']) if post['image_urls'] else []
+        return post
+
+    # ===== DESPACHADOR =====
+    def _push(self, scheduled_at, post_id):
+        with self._wakeup:
+            heapq.heappush(self._heap, (scheduled_at, post_id))
+            self._wakeup.notify()
+
+    def start(self):
+        """Reconstruye el índice desde la base y lanza el hilo despachador"""
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock, self.conn:
+            # Un post que quedó publicándose tras una caída pudo haber salido: no se repite
+            interrupted = self.conn.execute(
+                "UPDATE scheduled_posts SET status = 'failed', error = ?, updated_at = ? WHERE status = 'publishing'",
+                ("Interrumpido durante la publicación; revisa la página antes de reprogramarlo",
+                 datetime.now().isoformat())
+            ).rowcount
+            rows = self.conn.execute(
+                "SELECT scheduled_at, id FROM scheduled_posts WHERE status = 'scheduled'"
+            ).fetchall()
+        with self._wakeup:
+            self._heap = [(row['scheduled_at'], row['id']) for row in rows]
+            heapq.heapify(self._heap)
+            self._stopping = False
+        if interrupted:
+            print(f"⚠️ {interrupted} posts programados quedaron interrumpidos y se marcaron como fallidos")
+        self._thread = threading.Thread(target=self._run, name='post-scheduler', daemon=True)
+        self._thread.start()
+        print(f"📅 Publicaciones programadas: {len(rows)} pendientes")
+
+    def stop(self):
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _load_due(self):
+        """Agrega al heap los posts que vencen antes de la siguiente revisión (incluye los de otros procesos)"""
+        horizon = (self.now() + timedelta(seconds=self.max_wait)).isoformat()
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT scheduled_at, id FROM scheduled_posts WHERE status = 'scheduled' AND scheduled_at <= ?",
+                (horizon,)
+            ).fetchall()
+        with self._wakeup:
+            known = set(self._heap)
+            for entry in ((row['scheduled_at'], row['id']) for row in rows):
+                if entry not in known:
+                    heapq.heappush(self._heap, entry)
+
+    def _run(self):
+        while True:
+            self._load_due()
+            with self._wakeup:
+                if self._stopping:
+                    return
+                wait = self.max_wait
+                if self._heap:
+                    wait = min((datetime.fromisoformat(self._heap[0][0]) - self.now()).total_seconds(), wait)
+                if wait > 0:
+                    self._wakeup.wait(timeout=wait)
+                    continue
+                scheduled_at, post_id = heapq.heappop(self._heap)
+            try:
+                self._fire(post_id, scheduled_at)
+            except Exception as e:
+                print(f"❌ Error publicando el post programado {post_id}: {e}")
+
+    def _fire(self, post_id, scheduled_at):
+        """Publica un post vencido si la entrada del índice sigue vigente"""
+        now = datetime.now().isoformat()
+        with self._lock, self.conn:
+            claimed = self.conn.execute(
+                "UPDATE scheduled_posts SET status = 'publishing', updated_at = ? "
+                "WHERE id = ? AND status = 'scheduled' AND scheduled_at = ?",
+                (now, post_id, scheduled_at)
+            ).rowcount
+        if not claimed:
+            return None  # cancelado, reprogramado o ya publicado
+
+        post = self.get(post_id)
+        if self.now() - datetime.fromisoformat(scheduled_at) > self.grace:
+            self._finish(post_id, 'missed', error=f"Hora vencida ({scheduled_at})")
+            print(f"⌛ Post programado {post_id} no se publicó: su hora ({scheduled_at}) ya pasó")
+            return self.get(post_id)
+
+        if post['platform'] == 'instagram':
+            result = self.manager.post_to_instagram(post['content'], post['image_urls'])
+        else:
+            image_url = post['image_urls'][0] if post['image_urls'] else None
+            result = self.manager.post_to_facebook(post['content'], link=post['link'], image_url=image_url)
+
+        if result:
+            self._finish(post_id, 'published', post_id_remote=result.get('post_id'))
+            print(f"✅ Post programado {post_id} publicado en {post['platform']} ({result.get('post_id')})")
+        else:
+            self._finish(post_id, 'failed', error="La publicación falló (ver registro)")
+        return self.get(post_id)
+
+    def _finish(self, post_id, status, post_id_remote=None, error=None):
+        now = datetime.now().isoformat()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE scheduled_posts SET status = ?, post_id = ?, error = ?, published_at = ?, updated_at = ? "
+                "WHERE id = ?",
+                (status, post_id_remote, error, now if status == 'published' else None, now, post_id)
+            )
+
+
+def format_scheduled_post(post):
+    """Resumen de una línea de un post programado"""
+    return (f"{POST_STATUSES.get(post['status'], '•')} #{post['id']} {post['platform']} "
+            f"{post['scheduled_at'][:16].replace('T', ' ')} — {post['content'][:50]}")
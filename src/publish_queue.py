@@ -0,0 +1,288 @@
+"""
+Cola persistente de publicaciones en Facebook
+
+Publicar ya no ocurre mientras el usuario espera: cada post se guarda como
+trabajo en SQLite y unos workers asíncronos lo publican en segundo plano,
+reintentando los fallos temporales con espera creciente. Cada trabajo
+tiene una clave de idempotencia (hash del contenido + página): encolar el
+mismo post dos veces devuelve el trabajo existente en lugar de duplicarlo.
+
+Si un intento falla sin saber si Meta lo procesó (timeout, error 5xx o
+caída a mitad de la publicación), antes de reintentar se busca el post en
+el feed de la página; si ya está, el trabajo se da por publicado.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+from datetime import datetime, timedelta
+from config.settings import (META_ACCESS_TOKEN, PUBLISH_WORKERS, PUBLISH_MAX_ATTEMPTS, PUBLISH_RETRY_SECONDS,
+                             PUBLISH_POLL_SECONDS)
+from src.db import connect
+from src.graph_api import GraphAPIError, GraphTransientError, get_client
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS publish_jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    page_id TEXT NOT NULL,
+    message TEXT NOT NULL,
+    link TEXT,
+    image_url TEXT,
+    image_path TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    uncertain INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TEXT NOT NULL,
+    post_id TEXT,
+    error TEXT,
+    notify_chat_id TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_publish_jobs_due ON publish_jobs(status, next_attempt_at);
+"""
+
+# Estados de un trabajo de publicación
+PUBLISH_STATUSES = {
+    'queued': '⏳',       # esperando turno (o reintento)
+    'publishing': '📤',   # un worker lo está publicando
+    'published': '✅',
+    'failed': '❌'        # error definitivo o intentos agotados
+}
+
+# Posts recientes del feed que se revisan antes de reintentar un envío incierto
+RECENT_POSTS_LIMIT = 25
+
+
+def idempotency_key(message, page_id, image_path=None, image_url=None, link=None):
+    """Hash del contenido (texto, imagen, link) y de la página destino"""
+    digest = hashlib.sha256()
+    digest.update(f"{page_id}\n{message}\n{link or ''}\n{image_url or ''}\n".encode('utf-8'))
+    if image_path and os.path.exists(image_path):
+        with open(image_path, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class PublishQueue:
+    """
+    Trabajos de publicación persistentes y workers asíncronos que los publican
+    """
+
+    def __init__(self, db_path=None, access_token=None, page_id='me', workers=None, max_attempts=None,
+                 retry_seconds=None, poll_seconds=None, notifier=None, client=None):
+        """
+        Args:
+            db_path: Ruta de la base de datos (por defecto DATABASE_PATH)
+            access_token: Token de la página (por defecto META_ACCESS_TOKEN)
+            page_id: Página destino por defecto ('me' con un token de página)
+            workers: Workers simultáneos (PUBLISH_WORKERS)
+            max_attempts: Intentos antes de marcar el trabajo como fallido (PUBLISH_MAX_ATTEMPTS)
+            retry_seconds: Espera antes del primer reintento; se duplica en cada uno (PUBLISH_RETRY_SECONDS)
+            poll_seconds: Cada cuánto revisan los workers si hay reintentos pendientes (PUBLISH_POLL_SECONDS)
+            notifier: Corrutina notifier(job) llamada al publicar o fallar definitivamente
+            client: GraphAPIClient (por defecto el compartido del event loop)
+        """
+        self.conn = connect(db_path)
+        self.access_token = access_token or META_ACCESS_TOKEN
+        self.page_id = page_id
+        self.workers = workers or PUBLISH_WORKERS
+        self.max_attempts = max_attempts or PUBLISH_MAX_ATTEMPTS
+        self.retry_seconds = PUBLISH_RETRY_SECONDS if retry_seconds is None else retry_seconds
+        self.poll_seconds = poll_seconds or PUBLISH_POLL_SECONDS
+        self.notifier = notifier
+        self.client = client
+        self._lock = threading.Lock()
+        self._wakeup = None
+        self._tasks = []
+        with self._lock, self.conn:
+            self.conn.executescript(SCHEMA)
+
+    # ===== ENCOLAR =====
+    def enqueue(self, message, image_path=None, image_url=None, link=None, page_id=None, notify_chat_id=None):
+        """
+        Encola un post (no publica)
+
+        Si el mismo contenido ya está en la cola o publicado, devuelve ese
+        trabajo; si había fallado, lo vuelve a encolar.
+
+        Returns:
+            (trabajo, creado) — creado es False si ya existía
+        """
+        page_id = page_id or self.page_id
+        key = idempotency_key(message, page_id, image_path, image_url, link)
+        now = datetime.now().isoformat()
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO publish_jobs (idempotency_key, page_id, message, link, image_url, image_path, "
+                "next_attempt_at, notify_chat_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, page_id, message, link, image_url, image_path, now,
+                 str(notify_chat_id) if notify_chat_id is not None else None, now, now)
+            )
+            created = cursor.rowcount > 0
+            if not created:
+                self.conn.execute(
+                    "UPDATE publish_jobs SET status = 'queued', attempts = 0, error = NULL, next_attempt_at = ?, "
+                    "notify_chat_id = COALESCE(?, notify_chat_id), updated_at = ? "
+                    "WHERE idempotency_key = ? AND status = 'failed'",
+                    (now, str(notify_chat_id) if notify_chat_id is not None else None, now, key)
+                )
+            job = self._row("SELECT * FROM publish_jobs WHERE idempotency_key = ?", (key,))
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job, created
+
+    # ===== CONSULTAS =====
+    def _row(self, sql, params):
+        row = self.conn.execute(sql, params).fetchone()
+        return dict(row) if row else None
+
+    def get(self, job_id):
+        with self._lock:
+            return self._row("SELECT * FROM publish_jobs WHERE job_id = ?", (job_id,))
+
+    def counts(self):
+        """Trabajos por estado"""
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) AS total FROM publish_jobs GROUP BY status").fetchall()
+        return {row['status']: row['total'] for row in rows}
+
+    # ===== ESTADOS =====
+    def claim(self, now=None):
+        """Toma el siguiente trabajo vencido y lo marca 'publishing' (o None)"""
+        now = now or datetime.now().isoformat()
+        with self._lock, self.conn:
+            job = self._row(
+                "SELECT * FROM publish_jobs WHERE status = 'queued' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at, job_id LIMIT 1", (now,)
+            )
+            if not job:
+                return None
+            claimed = self.conn.execute(
+                "UPDATE publish_jobs SET status = 'publishing', attempts = attempts + 1, updated_at = ? "
+                "WHERE job_id = ? AND status = 'queued'", (now, job['job_id'])
+            ).rowcount
+        return {**job, 'status': 'publishing', 'attempts': job['attempts'] + 1} if claimed else None
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = datetime.now().isoformat()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock, self.conn:
+            self.conn.execute(f"UPDATE publish_jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def recover(self):
+        """
+        Trabajos que quedaron 'publishing' tras una caída: vuelven a la cola
+        como inciertos (se revisa el feed antes de publicarlos otra vez)
+        """
+        with self._lock, self.conn:
+            recovered = self.conn.execute(
+                "UPDATE publish_jobs SET status = 'queued', uncertain = 1, updated_at = ? WHERE status = 'publishing'",
+                (datetime.now().isoformat(),)
+            ).rowcount
+        if recovered:
+            print(f"♻️ Cola de publicación: {recovered} trabajos interrumpidos vuelven a la cola")
+        return recovered
+
+    # ===== WORKERS =====
+    async def start(self):
+        """Recupera trabajos interrumpidos y lanza los workers en el event loop actual"""
+        self.recover()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"📤 Cola de publicación activa ({self.workers} workers, {self.counts().get('queued', 0)} en cola)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            job = self.claim()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.process(job)
+            except Exception as e:
+                print(f"❌ Error en la cola de publicación (trabajo {job['job_id']}): {e}")
+
+    async def process(self, job):
+        """
+        Publica un trabajo tomado con claim() y guarda el resultado
+
+        Cualquier error deja el trabajo en la cola (para reintentar) o como
+        fallido, nunca en 'publishing'; un error del notifier no cambia el
+        resultado guardado.
+
+        Returns:
+            Trabajo actualizado
+        """
+        client = self.client or get_client()
+        try:
+            post_id = await self._find_published(client, job) if job['uncertain'] else None
+            if not post_id:
+                result = await client.publish_page_post(
+                    job['message'], page_id=job['page_id'], link=job['link'], image_url=job['image_url'],
+                    image_path=job['image_path'], access_token=self.access_token
+                )
+                post_id = result['post_id']
+            self._update(job['job_id'], status='published', post_id=post_id, error=None)
+            print(f"✅ Cola de publicación: trabajo {job['job_id']} publicado ({post_id})")
+        except GraphAPIError as e:
+            if e.retryable and job['attempts'] < self.max_attempts:
+                # Un fallo temporal en la publicación puede haber llegado a Meta
+                return self._retry_later(job, e, uncertain=isinstance(e, GraphTransientError))
+            self._update(job['job_id'], status='failed', error=str(e))
+            print(f"❌ Cola de publicación: trabajo {job['job_id']} falló ({e})")
+        except Exception as e:
+            # Error inesperado (archivo de imagen, respuesta rara...): pudo ocurrir después de publicar
+            if job['attempts'] < self.max_attempts:
+                return self._retry_later(job, e, uncertain=True)
+            self._update(job['job_id'], status='failed', uncertain=1, error=f"{type(e).__name__}: {e}")
+            print(f"❌ Cola de publicación: trabajo {job['job_id']} falló ({type(e).__name__}: {e})")
+
+        job = self.get(job['job_id'])
+        if self.notifier:
+            try:
+                await self.notifier(job)
+            except Exception as e:
+                print(f"⚠️ Cola de publicación: no se pudo avisar del trabajo {job['job_id']}: {e}")
+        return job
+
+    def _retry_later(self, job, error, uncertain):
+        """Devuelve el trabajo a la cola con espera creciente"""
+        delay = self.retry_seconds * 2 ** (job['attempts'] - 1)
+        self._update(job['job_id'], status='queued', uncertain=int(job['uncertain'] or uncertain), error=str(error),
+                     next_attempt_at=(datetime.now() + timedelta(seconds=delay)).isoformat())
+        print(f"⚠️ Cola de publicación: trabajo {job['job_id']} se reintenta en {delay:.0f}s ({error})")
+        return self.get(job['job_id'])
+
+    async def _find_published(self, client, job):
+        """Id del post si un intento anterior sí llegó a publicarse (mismo texto en el feed reciente)"""
+        since = int(datetime.fromisoformat(job['created_at']).timestamp()) - 60
+        feed = await client.get(f"{job['page_id']}/feed", params={
+            'fields': 'id,message', 'since': since, 'limit': RECENT_POSTS_LIMIT
+        }, access_token=self.access_token)
+        for post in feed.get('data', []):
+            if (post.get('message') or '').strip() == job['message'].strip():
+                print(f"🔎 Cola de publicación: trabajo {job['job_id']} ya estaba publicado ({post['id']})")
+                return post['id']
+        return None
+
+
+def format_publish_result(job):
+    """Mensaje para el usuario cuando un trabajo termina"""
+    if job['status'] == 'published':
+        image = " (con imagen)" if job['image_path'] or job['image_url'] else ""
+        return f"🎉 Post publicado en Facebook{image}\n📱 Post ID: {job['post_id']}"
+    return (f"❌ No se pudo publicar en Facebook (trabajo #{job['job_id']}, {job['attempts']} intentos)\n"
+            f"{job['error']}")
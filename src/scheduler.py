@@ -3,12 +3,14 @@ Automatización y programación de tareas para el agente IA
 """
 import schedule
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
-from config.settings import TIMEZONE, POST_TIMES, POSTS_PER_DAY
+from config.settings import TIMEZONE, POST_TIMES, POSTS_PER_DAY, EMAIL_DISPATCH_MINUTES, INSIGHTS_SYNC_MINUTES
 from src.content_generator import ContentGenerator
 from src.social_media import SocialMediaManager
 from src.email_campaign import EmailCampaignManager
+from src.send_scheduler import SendScheduler
+from src.insights_sync import InsightsStore
 import json
 import os
 
@@ -17,50 +19,76 @@ class MarketingScheduler:
         self.content_gen = ContentGenerator()
         self.social_media = SocialMediaManager()
         self.email_manager = EmailCampaignManager()
+        self.send_queue = SendScheduler(self.email_manager)
+        self.insights = InsightsStore()
         self.timezone = pytz.timezone(TIMEZONE)
         
-    def generate_and_post_instagram(self):
-        """Genera y publica contenido en Instagram"""
+    def next_post_slot(self, now=None):
+        """Siguiente horario de POST_TIMES (hora de TIMEZONE) posterior a `now`"""
+        now = now.astimezone(self.timezone) if now else datetime.now(self.timezone)
+        slots = []
+        for post_time in POST_TIMES:
+            hour, minute = (int(part) for part in post_time.split(':'))
+            for days in (0, 1):
+                day = now.date() + timedelta(days=days)
+                slot = self.timezone.localize(datetime(day.year, day.month, day.day, hour, minute))
+                if slot > now:
+                    slots.append(slot)
+                    break
+        return min(slots)
+    
+    def generate_and_post_instagram(self, publish=True):
+        """Genera contenido para Instagram y lo programa en el siguiente horario de POST_TIMES"""
         print(f"\n📸 [{datetime.now()}] Generando post para Instagram...")
         
         # Generar contenido
         post = self.content_gen.generate_instagram_post()
         
         if post:
+            # Instagram no acepta posts sin imagen y el generador solo produce
+            # texto: sin image_url el post queda como borrador en data/generated/
+            if publish and post.get('image_url'):
+                scheduled = self.social_media.schedule_post(
+                    'instagram', post['content'], self.next_post_slot(),
+                    image_url=post['image_url']
+                )
+                if scheduled:
+                    post['status'] = 'scheduled'
+                    post['schedule_id'] = scheduled['id']
+                    post['scheduled_time'] = scheduled['scheduled_time']
+            elif publish:
+                print("⚠️ Post de Instagram sin imagen: queda como borrador")
+            
             # Guardar contenido
             self.content_gen.save_content(post)
             
-            # Publicar (comentado por defecto para testing)
-            # result = self.social_media.post_to_instagram(post['content'])
-            # if result:
-            #     post['status'] = 'published'
-            #     post['post_id'] = result['post_id']
-            
             print(f"✅ Post de Instagram generado: {post['topic']}")
             return post
         
         return None
     
-    def generate_and_post_facebook(self):
-        """Genera y publica contenido en Facebook"""
+    def generate_and_post_facebook(self, publish=True):
+        """Genera contenido para Facebook y lo programa en el siguiente horario de POST_TIMES"""
         print(f"\n📘 [{datetime.now()}] Generando post para Facebook...")
         
         # Generar contenido
         post = self.content_gen.generate_facebook_post()
         
         if post:
+            # Lo publica el despachador de post_scheduler a su hora
+            if publish:
+                scheduled = self.social_media.schedule_post(
+                    'facebook', post['content'], self.next_post_slot(),
+                    link='https://sacred-rebirth.com'
+                )
+                if scheduled:
+                    post['status'] = 'scheduled'
+                    post['schedule_id'] = scheduled['id']
+                    post['scheduled_time'] = scheduled['scheduled_time']
+            
             # Guardar contenido
             self.content_gen.save_content(post)
             
-            # Publicar (comentado por defecto para testing)
-            # result = self.social_media.post_to_facebook(
-            #     message=post['content'],
-            #     link='https://sacred-rebirth.com'
-            # )
-            # if result:
-            #     post['status'] = 'published'
-            #     post['post_id'] = result['post_id']
-            
             print(f"✅ Post de Facebook generado: {post['topic']}")
             return post
         
@@ -84,14 +112,12 @@ class MarketingScheduler:
                 # Crear template HTML
                 html_content = self.email_manager.create_email_template(email['body'])
                 
-                # Enviar campaña (comentado por defecto para testing)
-                # results = self.email_manager.send_bulk_campaign(
-                #     leads_list=leads,
-                #     subject=email['subject'],
-                #     html_template=html_content
-                # )
+                # Encolar: el despachador la envía a lo largo de las ventanas de
+                # envío respetando MAX_EMAILS_PER_DAY (lo que no cabe sale mañana)
+                campaign_id = self.send_queue.enqueue(leads, email['subject'], html_content)
+                email['campaign_id'] = campaign_id
                 
-                print(f"✅ Newsletter generada para {len(leads)} leads")
+                print(f"✅ Newsletter encolada para {len(leads)} leads")
             else:
                 print("⚠️ No hay leads en la base de datos")
             
@@ -126,7 +152,8 @@ class MarketingScheduler:
         """Configura el calendario de tareas automáticas"""
         print("🗓️ Configurando calendario de automatización...\n")
         
-        # Posts diarios en Instagram y Facebook
+        # Posts diarios en Instagram y Facebook: cada turno genera el post del
+        # siguiente horario de POST_TIMES (en TIMEZONE) y lo deja programado
         for post_time in POST_TIMES:
             schedule.every().day.at(post_time).do(self.generate_and_post_instagram)
             schedule.every().day.at(post_time).do(self.generate_and_post_facebook)
@@ -136,6 +163,14 @@ class MarketingScheduler:
         schedule.every().monday.at("10:00").do(self.send_weekly_newsletter)
         print("📅 Newsletter semanal programada para lunes 10:00")
         
+        # Cola de emails: despacha la porción de cuota que toca en cada turno
+        schedule.every(EMAIL_DISPATCH_MINUTES).minutes.do(self.send_queue.dispatch)
+        print(f"📅 Cola de emails revisada cada {EMAIL_DISPATCH_MINUTES} minutos")
+        
+        # Métricas de posts: sincronización incremental a la base local (la consultan los agentes)
+        schedule.every(INSIGHTS_SYNC_MINUTES).minutes.do(self.insights.sync_now)
+        print(f"📅 Métricas de redes sincronizadas cada {INSIGHTS_SYNC_MINUTES} minutos")
+        
         # Reporte diario (cada día a las 23:00)
         schedule.every().day.at("23:00").do(self.daily_report)
         print("📅 Reporte diario programado para 23:00")
@@ -146,6 +181,9 @@ class MarketingScheduler:
         """Ejecuta el scheduler en loop infinito"""
         self.setup_schedule()
         
+        # Posts programados con SocialMediaManager.schedule_post: se publican a su hora
+        self.social_media.post_scheduler.start()
+        
         print("\n🤖 Agente IA de Marketing iniciado")
         print("⏰ Esperando tareas programadas...")
         print("Presiona Ctrl+C para detener\n")
@@ -155,6 +193,7 @@ class MarketingScheduler:
                 schedule.run_pending()
                 time.sleep(60)  # Revisar cada minuto
         except KeyboardInterrupt:
+            self.social_media.post_scheduler.stop()
             print("\n\n👋 Agente IA detenido")
 
 
@@ -166,8 +205,8 @@ def test_run():
     print("🧪 MODO TESTING - Generando contenido de prueba\n")
     
     # Generar contenido sin publicar
-    scheduler.generate_and_post_instagram()
-    scheduler.generate_and_post_facebook()
+    scheduler.generate_and_post_instagram(publish=False)
+    scheduler.generate_and_post_facebook(publish=False)
     # scheduler.send_weekly_newsletter()
     
     print("\n✨ Prueba completada. Revisa la carpeta data/generated/")
@@ -0,0 +1,164 @@
+"""
+Lenguaje de definición de segmentos de leads
+
+Una definición combina filtros separados por espacios (todos deben cumplirse):
+
+    status:interested,qualified      estado (lista = cualquiera de ellos)
+    source:instagram                 fuente
+    interest:ayahuasca,kambo         tiene alguno de esos intereses
+    score:>=7  score:4..8            rango de score (ver src/lead_scoring.py)
+    lang:es                          idioma
+    created:30d                      creado en los últimos 30 días (también h y w)
+    created:2025-01-01..2025-02-01   ventana absoluta (también >=fecha, <fecha)
+    -status:converted                un guion al inicio niega el filtro
+
+Los valores con espacios van entre comillas: interest:"plant medicine".
+Una palabra sola (ej. "interested") equivale a status:interested.
+"""
+import re
+import shlex
+from datetime import datetime, timedelta
+
+FIELDS = {
+    'status': 'status',
+    'source': 'source',
+    'interest': 'interest',
+    'interests': 'interest',
+    'score': 'score',
+    'lang': 'language',
+    'language': 'language',
+    'idioma': 'language',
+    'created': 'created_at',
+    'created_at': 'created_at'
+}
+
+# Segmentos disponibles desde el primer uso (se materializan en la base de datos)
+DEFAULT_SEGMENTS = {
+    'interested': 'status:interested',
+    'converted': 'status:converted',
+    'premium': 'score:>=7 -status:converted',
+    'new_this_week': 'created:7d'
+}
+
+_RELATIVE_WINDOW = re.compile(r'^(\d+)([hdw])$')
+_COMPARISON = re.compile(r'^(>=|<=|>|<|=)?(.+)$')
+_WINDOW_UNITS = {'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+def parse_segment(definition):
+    """
+    Convierte una definición (texto o diccionario) en una lista de filtros
+
+    Returns:
+        Lista de (campo, operador, valor, negado)
+    """
+    if isinstance(definition, dict):
+        tokens = []
+        for field, value in definition.items():
+            if isinstance(value, (list, tuple)):
+                value = ','.join(str(v) for v in value)
+            tokens.append(f"{field}:{value}")
+    else:
+        definition = (definition or '').strip()
+        if definition.lower() in ('', 'all', 'todos'):
+            return []
+        tokens = shlex.split(definition)
+
+    filters = []
+    for token in tokens:
+        negated = token.startswith('-')
+        token = token.lstrip('-')
+        if ':' not in token:
+            filters.append(('status', 'in', [token.lower()], negated))
+            continue
+
+        name, _, raw = token.partition(':')
+        field = FIELDS.get(name.lower())
+        if field is None:
+            raise ValueError(f"Campo de segmento desconocido: '{name}'")
+        if not raw:
+            raise ValueError(f"Falta el valor de '{name}'")
+
+        if field == 'score':
+            filters.extend((field, op, value, negated) for op, value in _parse_range(raw, float))
+        elif field == 'created_at':
+            filters.extend((field, op, value, negated) for op, value in _parse_window(raw))
+        else:
+            values = [v.strip().lower() if field in ('interest', 'language') else v.strip()
+                      for v in raw.split(',') if v.strip()]
+            filters.append((field, 'in', values, negated))
+    return filters
+
+
+def _parse_range(raw, cast):
+    """'>=7' -> [('>=', 7)], '4..8' -> [('>=', 4), ('<=', 8)], '7' -> [('=', 7)]"""
+    try:
+        if '..' in raw:
+            low, _, high = raw.partition('..')
+            bounds = []
+            if low:
+                bounds.append(('>=', cast(low)))
+            if high:
+                bounds.append(('<=', cast(high)))
+            return bounds
+        op, value = _COMPARISON.match(raw).groups()
+        return [(op or '=', cast(value))]
+    except ValueError:
+        raise ValueError(f"Rango inválido: '{raw}'")
+
+
+def _parse_window(raw):
+    """'30d' -> creado desde hace 30 días; también fechas ISO con operadores o rangos"""
+    match = _RELATIVE_WINDOW.match(raw)
+    if match:
+        amount, unit = match.groups()
+        since = datetime.now() - timedelta(**{_WINDOW_UNITS[unit]: int(amount)})
+        return [('>=', since.isoformat())]
+
+    def to_date(value):
+        return datetime.fromisoformat(value).isoformat()
+    return _parse_range(raw, to_date)
+
+
+def is_relative(definition):
+    """True si la definición usa ventanas relativas a la fecha actual (ej. created:30d)"""
+    if isinstance(definition, dict):
+        tokens = [f"{field}:{value}" for field, value in definition.items()]
+    else:
+        tokens = shlex.split(definition or '')
+    for token in tokens:
+        name, _, raw = token.lstrip('-').partition(':')
+        if FIELDS.get(name.lower()) == 'created_at' and _RELATIVE_WINDOW.match(raw):
+            return True
+    return False
+
+
+def compile_segment(definition):
+    """
+    Traduce una definición a una condición SQL sobre la tabla leads
+
+    Cada filtro usa una columna indexada (status, source, score, language,
+    created_at) o el índice lead_interests, así que no recorre toda la tabla.
+
+    Returns:
+        (sql, params) — sql es "1" si la definición no tiene filtros
+    """
+    clauses, params = [], []
+    for field, op, value, negated in parse_segment(definition):
+        if field == 'interest':
+            placeholders = ', '.join('?' for _ in value)
+            clause = f"id IN (SELECT lead_id FROM lead_interests WHERE interest IN ({placeholders}))"
+            params.extend(value)
+        elif op == 'in':
+            placeholders = ', '.join('?' for _ in value)
+            clause = f"{field} IN ({placeholders})"
+            params.extend(value)
+        else:
+            clause = f"{field} {op} ?"
+            params.append(value)
+
+        if negated:
+            clause = f"NOT ({clause})" if field == 'interest' else f"({field} IS NULL OR NOT ({clause}))"
+        clauses.append(clause)
+
+    return (' AND '.join(clauses) or '1'), params
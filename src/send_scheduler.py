@@ -0,0 +1,179 @@
+"""
+Cola de salida de emails con ritmo diario
+
+Las campañas se encolan como trabajos (src/campaign_jobs.py) y un
+despachador periódico envía en cada turno solo la porción que corresponde:
+la cuota restante del día (MAX_EMAILS_PER_DAY) repartida entre los minutos
+que quedan de las ventanas de envío (EMAIL_SEND_WINDOWS). Lo que no cabe
+hoy queda pendiente y sale en las ventanas del día siguiente.
+
+Opcionalmente cada lead recibe su email a partir de la hora en que suele
+abrirlos (eventos email_open de la línea de tiempo) o, si no hay historial,
+al inicio de la primera ventana en su propia zona horaria.
+"""
+import math
+from datetime import datetime, timedelta, time as dt_time
+import pytz
+from config.settings import TIMEZONE, EMAIL_SEND_WINDOWS, EMAIL_DISPATCH_MINUTES, EMAIL_SEND_TIME_OPTIMIZATION
+from src.activity_timeline import ActivityTimeline
+from src.campaign_jobs import quota_day, recipient_key
+from src.email_campaign import EmailCampaignManager
+
+
+def parse_windows(spec):
+    """'09:00-12:00,16:00-19:00' -> [(540, 720), (960, 1140)] en minutos del día"""
+    windows = []
+    for part in (spec or '').split(','):
+        if not part.strip():
+            continue
+        start, _, end = part.strip().partition('-')
+        try:
+            start_h, start_m = (int(x) for x in start.split(':'))
+            end_h, end_m = (int(x) for x in end.split(':'))
+        except ValueError:
+            raise ValueError(f"Ventana de envío inválida: '{part}' (formato HH:MM-HH:MM)")
+        windows.append((start_h * 60 + start_m, end_h * 60 + end_m))
+    return sorted(windows) or [(0, 24 * 60)]
+
+
+class SendScheduler:
+    """
+    Encola campañas y las despacha a ritmo constante dentro de las ventanas de envío
+    """
+
+    def __init__(self, manager=None, windows=None, tick_minutes=None, optimize_send_time=None, timeline=None):
+        """
+        Args:
+            manager: EmailCampaignManager que envía (por defecto uno nuevo)
+            windows: Ventanas 'HH:MM-HH:MM,...' (EMAIL_SEND_WINDOWS)
+            tick_minutes: Minutos entre despachos (EMAIL_DISPATCH_MINUTES)
+            optimize_send_time: Hora de envío por lead (EMAIL_SEND_TIME_OPTIMIZATION)
+            timeline: ActivityTimeline para el historial de aperturas
+        """
+        self.manager = manager or EmailCampaignManager()
+        self.timezone = pytz.timezone(TIMEZONE)
+        self.windows = parse_windows(windows or EMAIL_SEND_WINDOWS)
+        self.tick_minutes = tick_minutes or EMAIL_DISPATCH_MINUTES
+        self.optimize_send_time = EMAIL_SEND_TIME_OPTIMIZATION if optimize_send_time is None else optimize_send_time
+        self.timeline = timeline
+
+    def now(self):
+        """Hora actual del negocio (TIMEZONE), sin zona para comparar con el registro"""
+        return datetime.now(self.timezone).replace(tzinfo=None, microsecond=0)
+
+    # ===== ENCOLAR =====
+    def enqueue(self, leads, subject, html_template, campaign_id=None, segment=None):
+        """
+        Encola una campaña sin enviarla; el despachador la irá enviando
+
+        Returns:
+            campaign_id
+        """
+        send_after = self.send_times(leads) if self.optimize_send_time else {}
+        source = html_template if isinstance(html_template, str) else html_template.render()
+        campaign_id = self.manager.jobs.create_job(subject, source, leads, campaign_id, segment, send_after)
+        self.manager.jobs.set_status(campaign_id, 'scheduled')
+        counts = self.manager.jobs.progress(campaign_id)
+        print(f"📬 Campaña {campaign_id} encolada: {counts.get('pending', 0)} destinatarios "
+              f"({len(send_after)} con hora personalizada)")
+        return campaign_id
+
+    def send_times(self, leads, now=None):
+        """
+        Hora mínima de envío por destinatario
+
+        Usa la hora con más aperturas del lead; si no hay historial y el lead
+        tiene 'timezone', el inicio de la primera ventana en su hora local.
+        Una hora fuera de EMAIL_SEND_WINDOWS se lleva a la ventana más cercana.
+
+        Returns:
+            Diccionario clave de destinatario -> ISO (hora del negocio)
+        """
+        now = now or self.now()
+        lead_ids = [lead['id'] for lead in leads if lead.get('id')]
+        timeline = self.timeline = self.timeline or ActivityTimeline()
+        open_hours = timeline.peak_hours(lead_ids) if lead_ids else {}
+        first_window = self.windows[0][0]
+
+        send_after = {}
+        for lead in leads:
+            hour, minute = open_hours.get(lead.get('id')), 0
+            if hour is None and lead.get('timezone'):
+                try:
+                    lead_tz = pytz.timezone(lead['timezone'])
+                except pytz.UnknownTimeZoneError:
+                    continue
+                local_start = lead_tz.localize(datetime.combine(now.date(), dt_time(first_window // 60, first_window % 60)))
+                business = local_start.astimezone(self.timezone)
+                hour, minute = business.hour, business.minute
+            if hour is None:
+                continue
+            hour, minute = divmod(self.clamp_to_windows(hour * 60 + minute), 60)
+            moment = now.replace(hour=hour, minute=minute, second=0)
+            if moment < now:
+                moment += timedelta(days=1)
+            send_after[recipient_key(lead)] = moment.isoformat()
+        return send_after
+
+    def clamp_to_windows(self, minute):
+        """
+        Minuto del día dentro de la ventana de envío más cercana
+
+        Antes de una ventana se adelanta a su inicio; después, se lleva al
+        último turno del despachador que aún cae dentro de ella.
+        """
+        best = None
+        for start, end in self.windows:
+            if start <= minute < end:
+                return minute
+            last_tick = max(end - self.tick_minutes, start)
+            candidate = start if minute < start else last_tick
+            if best is None or abs(candidate - minute) < abs(best - minute):
+                best = candidate
+        return best
+
+    # ===== DESPACHAR =====
+    def budget(self, now=None):
+        """
+        Envíos permitidos en este turno: la cuota restante del día repartida
+        entre los minutos que quedan de las ventanas de envío
+        """
+        now = now or self.now()
+        minute = now.hour * 60 + now.minute
+        if not any(start <= minute < end for start, end in self.windows):
+            return 0
+        # El día de la cuota sigue a TIMEZONE, como las ventanas: no se reinicia a media ventana
+        remaining = self.manager.remaining_today(quota_day(now))
+        if not remaining:
+            return 0
+        minutes_left = sum(max(end - max(start, minute), 0) for start, end in self.windows)
+        ticks_left = max(math.ceil(minutes_left / self.tick_minutes), 1)
+        return min(remaining, math.ceil(remaining / ticks_left))
+
+    def dispatch(self, now=None):
+        """
+        Un turno del despachador: envía la porción que toca, campaña por campaña
+
+        Returns:
+            Emails enviados en este turno
+        """
+        now = now or self.now()
+        budget = self.budget(now)
+        if not budget:
+            return 0
+        sent = 0
+        for campaign_id in self.manager.jobs.active_jobs():
+            if sent >= budget:
+                break
+            job = self.manager.run_campaign(campaign_id, max_emails=budget - sent, due=now.isoformat())
+            sent += job['sent_now'] if job else 0
+        if sent:
+            print(f"📤 [{now:%H:%M}] Cola de emails: {sent}/{budget} enviados en este turno")
+        return sent
+
+    def status(self):
+        """Campañas con pendientes y cuota restante del día"""
+        return {
+            'remaining_today': self.manager.remaining_today(),
+            'campaigns': [self.manager.jobs.get_job(campaign_id) for campaign_id in self.manager.jobs.active_jobs()]
+        }
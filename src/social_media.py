@@ -1,137 +1,212 @@
 """
 Publicación automática en redes sociales (Instagram y Facebook)
 """
-import requests
 from config.settings import (
     META_ACCESS_TOKEN,
     INSTAGRAM_BUSINESS_ACCOUNT_ID,
     FACEBOOK_PAGE_ID,
-    BUSINESS_INFO
+    BUSINESS_INFO,
+    GRAPH_API_URL,
+    META_GRAPH_API_VERSION
 )
+from src.graph_api import (GraphAPIError, get_client, post_insights, publish_instagram_post, publish_page_posts,
+                           recent_post_insights, run_sync)
+from src.post_scheduler import PostScheduler
 import json
 from datetime import datetime
 
+# Métricas por post que se piden a la Graph API
+FACEBOOK_POST_METRICS = ['post_impressions', 'post_impressions_unique', 'post_engaged_users', 'post_clicks']
+INSTAGRAM_MEDIA_METRICS = ['impressions', 'reach', 'engagement', 'saved']
+
 class SocialMediaManager:
     def __init__(self):
         self.access_token = META_ACCESS_TOKEN
         self.instagram_account_id = INSTAGRAM_BUSINESS_ACCOUNT_ID
         self.facebook_page_id = FACEBOOK_PAGE_ID
-        self.graph_api_url = "https://graph.facebook.com/v18.0"
+        self.graph_api_url = f"{GRAPH_API_URL}/{META_GRAPH_API_VERSION}"
+        self._post_scheduler = None
+    
+    @property
+    def post_scheduler(self):
+        """Posts programados (src/post_scheduler.py); el despachador se arranca con post_scheduler.start()"""
+        if self._post_scheduler is None:
+            self._post_scheduler = PostScheduler(manager=self)
+        return self._post_scheduler
     
     def post_to_instagram(self, caption, image_url=None):
         """
-        Publica en Instagram Business Account
+        Publica en Instagram Business Account (síncrono; ver post_to_instagram_async)
         
         Args:
             caption: Texto del post
-            image_url: URL de la imagen (opcional)
+            image_url: URL de la imagen, o lista de URLs para un carrusel
+        """
+        if not self.access_token or not self.instagram_account_id:
+            print("❌ Error: Configura META_ACCESS_TOKEN e INSTAGRAM_BUSINESS_ACCOUNT_ID")
+            return None
+        return run_sync(self.post_to_instagram_async(caption, image_url))
+    
+    async def post_to_instagram_async(self, caption, image_url=None):
+        """
+        Publica en Instagram: crea los contenedores (en paralelo si es carrusel),
+        espera a que Meta los procese y publica una sola vez (src/graph_api.py)
         """
         if not self.access_token or not self.instagram_account_id:
             print("❌ Error: Configura META_ACCESS_TOKEN e INSTAGRAM_BUSINESS_ACCOUNT_ID")
             return None
         
         try:
-            # Crear contenedor de medios
-            container_url = f"{self.graph_api_url}/{self.instagram_account_id}/media"
-            
-            params = {
-                'access_token': self.access_token,
-                'caption': caption
-            }
-            
-            if image_url:
-                params['image_url'] = image_url
-            
-            # Crear contenedor
-            response = requests.post(container_url, params=params)
-            response.raise_for_status()
-            container_id = response.json().get('id')
-            
-            # Publicar contenedor
-            publish_url = f"{self.graph_api_url}/{self.instagram_account_id}/media_publish"
-            publish_params = {
-                'access_token': self.access_token,
-                'creation_id': container_id
-            }
-            
-            publish_response = requests.post(publish_url, params=publish_params)
-            publish_response.raise_for_status()
-            
-            post_id = publish_response.json().get('id')
-            
-            print(f"✅ Post publicado en Instagram: {post_id}")
-            return {
-                'platform': 'instagram',
-                'post_id': post_id,
-                'published_at': datetime.now().isoformat(),
-                'status': 'published'
-            }
-            
-        except requests.exceptions.RequestException as e:
+            result = await publish_instagram_post(
+                self.instagram_account_id, caption, image_url, access_token=self.access_token
+            )
+        except GraphAPIError as e:
             print(f"❌ Error publicando en Instagram: {e}")
-            if hasattr(e.response, 'text'):
-                print(f"Respuesta: {e.response.text}")
             return None
+        
+        print(f"✅ Post publicado en Instagram: {result['post_id']}"
+              + (f" (carrusel de {len(result['children'])} imágenes)" if result['children'] else ''))
+        return {
+            'platform': 'instagram',
+            'post_id': result['post_id'],
+            'published_at': datetime.now().isoformat(),
+            'status': 'published'
+        }
     
     def post_to_facebook(self, message, link=None, image_url=None):
         """
-        Publica en Facebook Page
+        Publica en Facebook Page (síncrono; ver post_to_facebook_async)
         
         Args:
             message: Texto del post
             link: URL para compartir (opcional)
             image_url: URL de imagen (opcional)
         """
+        if not self.access_token or not self.facebook_page_id:
+            print("❌ Error: Configura META_ACCESS_TOKEN y FACEBOOK_PAGE_ID")
+            return None
+        return run_sync(self.post_to_facebook_async(message, link, image_url))
+    
+    async def post_to_facebook_async(self, message, link=None, image_url=None):
+        """Publica en Facebook Page con el cliente compartido de la Graph API (src/graph_api.py)"""
         if not self.access_token or not self.facebook_page_id:
             print("❌ Error: Configura META_ACCESS_TOKEN y FACEBOOK_PAGE_ID")
             return None
         
         try:
-            url = f"{self.graph_api_url}/{self.facebook_page_id}/feed"
-            
-            params = {
-                'access_token': self.access_token,
-                'message': message
-            }
-            
-            if link:
-                params['link'] = link
-            
-            if image_url:
-                params['picture'] = image_url
-            
-            response = requests.post(url, params=params)
-            response.raise_for_status()
-            
-            post_id = response.json().get('id')
-            
-            print(f"✅ Post publicado en Facebook: {post_id}")
-            return {
-                'platform': 'facebook',
-                'post_id': post_id,
-                'published_at': datetime.now().isoformat(),
-                'status': 'published'
-            }
-            
-        except requests.exceptions.RequestException as e:
+            result = await get_client().publish_page_post(
+                message, page_id=self.facebook_page_id, link=link, image_url=image_url,
+                access_token=self.access_token
+            )
+        except GraphAPIError as e:
             print(f"❌ Error publicando en Facebook: {e}")
-            if hasattr(e.response, 'text'):
-                print(f"Respuesta: {e.response.text}")
             return None
+        
+        print(f"✅ Post publicado en Facebook: {result['post_id']}")
+        return {
+            'platform': 'facebook',
+            'post_id': result['post_id'],
+            'published_at': datetime.now().isoformat(),
+            'status': 'published'
+        }
     
-    def schedule_post(self, platform, content, scheduled_time, image_url=None):
+    def publish_facebook_posts(self, posts):
+        """
+        Publica varios posts en Facebook con peticiones batch (50 por llamada)
+        
+        Args:
+            posts: Lista de {'message', 'link' (opcional), 'image_url' (opcional)}
+        
+        Returns:
+            Lista en el mismo orden: {'platform', 'post_id', 'status'} o {'platform', 'error', 'status'}
+            con status 'failed' (Meta lo rechazó) o 'unconfirmed' (timeout/5xx: pudo publicarse,
+            revisar la página antes de repetirlo)
+        """
+        if not self.access_token or not self.facebook_page_id:
+            print("❌ Error: Configura META_ACCESS_TOKEN y FACEBOOK_PAGE_ID")
+            return []
+        
+        results = run_sync(publish_page_posts(posts, page_id=self.facebook_page_id, access_token=self.access_token))
+        published_at = datetime.now().isoformat()
+        records = []
+        for result in results:
+            if 'error' in result:
+                records.append({'platform': 'facebook', 'error': str(result['error']),
+                                'status': 'unconfirmed' if result['unconfirmed'] else 'failed'})
+            else:
+                records.append({'platform': 'facebook', 'post_id': result['post_id'],
+                                'published_at': published_at, 'status': 'published'})
+        published = sum(1 for r in records if r['status'] == 'published')
+        print(f"✅ {published}/{len(posts)} posts publicados en Facebook")
+        unconfirmed = sum(1 for r in records if r['status'] == 'unconfirmed')
+        if unconfirmed:
+            print(f"❔ {unconfirmed} posts sin confirmar (timeout de Meta): revisa la página antes de repetirlos")
+        return records
+    
+    def facebook_post_insights(self, post_ids=None, metrics=None, limit=25):
+        """
+        Métricas de posts de Facebook con peticiones batch
+        
+        Args:
+            post_ids: Posts a consultar; si no se indican, los últimos `limit` de la página
+                      (ids y métricas en una sola llamada)
+            metrics: Métricas (por defecto FACEBOOK_POST_METRICS)
+        
+        Returns:
+            {post_id: {métrica: valor}}
+        """
+        if not self.access_token or not self.facebook_page_id:
+            print("❌ Error: Configura META_ACCESS_TOKEN y FACEBOOK_PAGE_ID")
+            return {}
+        
+        metrics = metrics or FACEBOOK_POST_METRICS
+        try:
+            if post_ids is None:
+                return run_sync(recent_post_insights(self.facebook_page_id, metrics, limit=limit,
+                                                     access_token=self.access_token))
+            return run_sync(post_insights(list(post_ids), metrics, access_token=self.access_token))
+        except GraphAPIError as e:
+            print(f"❌ Error consultando métricas de Facebook: {e}")
+            return {}
+    
+    def schedule_post(self, platform, content, scheduled_time, image_url=None, link=None):
         """
         Programa un post para publicación futura
-        (Requiere permisos adicionales de Meta Business)
+        
+        Se guarda en la base de datos y lo publica el despachador de
+        post_scheduler (arrancado por MarketingScheduler.run) a su hora.
+        
+        Args:
+            platform: 'facebook' o 'instagram'
+            content: Texto del post
+            scheduled_time: datetime o ISO (sin zona = hora de TIMEZONE)
+            image_url: URL de la imagen, o lista de URLs (carrusel de Instagram)
+            link: URL para compartir (Facebook)
+        
+        Returns:
+            {'id', 'platform', 'content', 'scheduled_time', 'status'} o None si los datos no son válidos
         """
-        print(f"📅 Post programado para {platform} en {scheduled_time}")
-        # Esta funcionalidad requiere configuración adicional en Meta Business Suite
+        try:
+            post = self.post_scheduler.schedule(platform, content, scheduled_time, image_url, link)
+        except ValueError as e:
+            print(f"❌ Error programando post: {e}")
+            return None
+        print(f"📅 Post #{post['id']} programado para {post['platform']} en {post['scheduled_at']}")
         return {
-            'platform': platform,
-            'content': content,
-            'scheduled_time': scheduled_time,
-            'status': 'scheduled'
+            'id': post['id'],
+            'platform': post['platform'],
+            'content': post['content'],
+            'scheduled_time': post['scheduled_at'],
+            'status': post['status']
         }
+    
+    def reschedule_post(self, schedule_id, scheduled_time):
+        """Cambia la hora de un post programado (True si seguía pendiente)"""
+        return self.post_scheduler.reschedule(schedule_id, scheduled_time)
+    
+    def cancel_post(self, schedule_id):
+        """Cancela un post programado (True si seguía pendiente)"""
+        return self.post_scheduler.cancel(schedule_id)
 
 
 # Ejemplo de uso
@@ -0,0 +1,166 @@
+"""
+Estado durable en memoria: snapshot + registro de operaciones (append log)
+
+El estado vive en un diccionario en memoria. Cada cambio se agrega como una
+línea al registro (<nombre>.log); periódicamente se escribe un snapshot
+completo de forma atómica (<nombre>.snapshot.json) y se vacía el registro.
+Al reiniciar se carga el snapshot y se reaplican las operaciones pendientes.
+"""
+import json
+import os
+import threading
+import time
+from config.settings import STATE_DIR, STATE_CHECKPOINT_SECONDS, STATE_CHECKPOINT_OPS
+
+
+class DurableState:
+    """
+    Diccionario persistente con operaciones set / incr / append / update_item
+
+    Cada operación lleva un número de secuencia; el snapshot guarda la última
+    secuencia incluida, así una caída entre escribir el snapshot y vaciar el
+    registro nunca reaplica dos veces la misma operación.
+    """
+
+    def __init__(self, name, defaults=None, state_dir=None, checkpoint_ops=None):
+        """
+        Args:
+            name: Nombre del estado (prefijo de los archivos)
+            defaults: Valores iniciales de las claves que aún no existan
+            state_dir: Carpeta de los archivos (STATE_DIR)
+            checkpoint_ops: Operaciones en el registro que disparan un checkpoint
+        """
+        self.state_dir = state_dir or STATE_DIR
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.snapshot_path = os.path.join(self.state_dir, f"{name}.snapshot.json")
+        self.log_path = os.path.join(self.state_dir, f"{name}.log")
+        self.checkpoint_ops = checkpoint_ops or STATE_CHECKPOINT_OPS
+        self._lock = threading.RLock()
+        self._timer = None
+
+        started = time.perf_counter()
+        self.data, self.seq, replayed = self._restore()
+        for key, value in (defaults or {}).items():
+            self.data.setdefault(key, value)
+        self._log = open(self.log_path, 'a', encoding='utf-8')
+        self._pending_ops = replayed
+        if self._log.tell():
+            # Compacta el registro reaplicado (y descarta una línea a medio escribir)
+            self.checkpoint()
+        self.restore_ms = round((time.perf_counter() - started) * 1000, 2)
+        print(f"💾 Estado '{name}' restaurado en {self.restore_ms} ms "
+              f"(snapshot seq {self.seq - replayed} + {replayed} operaciones)")
+
+    # ===== LECTURA =====
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    # ===== OPERACIONES =====
+    def set(self, key, value):
+        """Asigna un valor"""
+        self._apply({'op': 'set', 'key': key, 'value': value})
+
+    def incr(self, key, amount=1):
+        """Suma a un contador y devuelve el nuevo valor"""
+        self._apply({'op': 'incr', 'key': key, 'value': amount})
+        return self.data[key]
+
+    def append(self, key, item):
+        """Agrega un elemento a una lista"""
+        self._apply({'op': 'append', 'key': key, 'value': item})
+
+    def update_item(self, key, index, changes):
+        """Actualiza campos de un elemento (dict) de una lista"""
+        self._apply({'op': 'update_item', 'key': key, 'index': index, 'value': changes})
+
+    def _apply(self, operation):
+        with self._lock:
+            self.seq += 1
+            operation['seq'] = self.seq
+            self._mutate(self.data, operation)
+            self._log.write(json.dumps(operation, ensure_ascii=False, default=str) + '\n')
+            self._log.flush()
+            self._pending_ops += 1
+            if self._pending_ops >= self.checkpoint_ops:
+                self.checkpoint()
+
+    @staticmethod
+    def _mutate(data, operation):
+        op, key, value = operation['op'], operation['key'], operation.get('value')
+        if op == 'set':
+            data[key] = value
+        elif op == 'incr':
+            data[key] = data.get(key, 0) + value
+        elif op == 'append':
+            data.setdefault(key, []).append(value)
+        elif op == 'update_item':
+            data[key][operation['index']].update(value)
+        else:
+            raise ValueError(f"Operación desconocida: {op}")
+
+    # ===== PERSISTENCIA =====
+    def checkpoint(self):
+        """
+        Escribe un snapshot atómico (archivo temporal + fsync + rename) y vacía el registro
+        """
+        with self._lock:
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'seq': self.seq, 'data': self.data}, f, ensure_ascii=False, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            self._log.close()
+            self._log = open(self.log_path, 'w', encoding='utf-8')
+            self._pending_ops = 0
+
+    def start_checkpointing(self, interval=None):
+        """Programa checkpoints periódicos en un hilo en segundo plano"""
+        interval = interval or STATE_CHECKPOINT_SECONDS
+
+        def tick():
+            try:
+                if self._pending_ops:
+                    self.checkpoint()
+            except OSError as e:
+                print(f"⚠️ Checkpoint fallido: {e}")
+            self.start_checkpointing(interval)
+
+        self._timer = threading.Timer(interval, tick)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def close(self):
+        """Último checkpoint y cierre del registro"""
+        if self._timer:
+            self._timer.cancel()
+        self.checkpoint()
+        self._log.close()
+
+    def _restore(self):
+        """Carga el snapshot y reaplica las operaciones posteriores del registro"""
+        data, seq = {}, 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            data, seq = snapshot['data'], snapshot['seq']
+
+        replayed = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        operation = json.loads(line)
+                    except ValueError:
+                        # Última línea a medio escribir durante una caída
+                        break
+                    if operation['seq'] <= seq:
+                        continue
+                    self._mutate(data, operation)
+                    seq = operation['seq']
+                    replayed += 1
+        return data, seq, replayed
@@ -0,0 +1,266 @@
+"""
+Lista de supresión de emails (bajas, rebotes, quejas de spam)
+
+Las direcciones suprimidas viven en SQLite (conjunto exacto) y en un
+filtro de Bloom en memoria. En el envío, cada destinatario se revisa
+primero en el filtro: si no está (casi todos) la respuesta es inmediata
+sin tocar la base; solo los posibles positivos se confirman con una
+búsqueda por clave primaria. Así la revisión es de tiempo constante para
+toda la lista de leads sin cargar las direcciones en diccionarios.
+
+Otros procesos (el webhook, la página de baja) escriben en la misma tabla:
+refresh() compara PRAGMA data_version y recarga el filtro si cambió.
+"""
+import hashlib
+import hmac
+import html
+import math
+import threading
+from datetime import datetime
+from urllib.parse import quote, urlencode
+from flask import Blueprint, request
+from config.settings import SUPPRESSION_BLOOM_CAPACITY, EMAIL_UNSUBSCRIBE_SECRET, PUBLIC_BASE_URL
+from src.db import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS email_suppressions (
+    email TEXT PRIMARY KEY,
+    reason TEXT NOT NULL,
+    source TEXT,
+    created_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Eventos del proveedor que suprimen la dirección (ver src/email_events.py)
+SUPPRESSING_EVENTS = {
+    'bounce': 'bounce',
+    'spamreport': 'spam',
+    'unsubscribe': 'unsubscribe',
+    'group_unsubscribe': 'unsubscribe'
+}
+
+# Tasa de falsos positivos del filtro (los positivos se confirman en SQLite)
+BLOOM_ERROR_RATE = 0.001
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom sobre un bytearray (doble hashing con blake2b)
+
+    might_contain() nunca da falsos negativos; los falsos positivos rondan
+    error_rate mientras no se supere la capacidad.
+    """
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        self.capacity = max(capacity, 1000)
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class SuppressionList:
+    """
+    Conjunto exacto de direcciones suprimidas (SQLite) con filtro de Bloom delante
+    """
+
+    def __init__(self, db_path=None, capacity=None):
+        """
+        Args:
+            db_path: Ruta de la base de datos (por defecto DATABASE_PATH)
+            capacity: Direcciones previstas para dimensionar el filtro (SUPPRESSION_BLOOM_CAPACITY)
+        """
+        self.conn = connect(db_path)
+        self.capacity = capacity or SUPPRESSION_BLOOM_CAPACITY
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.executescript(SCHEMA)
+        self._rebuild()
+
+    def _rebuild(self):
+        """Carga el filtro recorriendo la tabla (sin guardar las direcciones en memoria)"""
+        with self._lock:
+            self._data_version = self._current_version()
+            total = self.conn.execute("SELECT COUNT(*) FROM email_suppressions").fetchone()[0]
+            bloom = BloomFilter(max(self.capacity, total * 2))
+            for (email,) in self.conn.execute("SELECT email FROM email_suppressions"):
+                bloom.add(email)
+            self.bloom = bloom
+
+    def _current_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def refresh(self):
+        """
+        Recarga el filtro si otra conexión modificó la tabla desde la última carga
+
+        data_version solo cambia con commits de otras conexiones; las altas
+        propias ya entran al filtro en add_many(). Se llama una vez por tanda
+        de envío, no por destinatario.
+        """
+        with self._lock:
+            stale = self._current_version() != self._data_version
+        if stale:
+            self._rebuild()
+        return stale
+
+    # ===== CONSULTA =====
+    def is_suppressed(self, email):
+        """True si la dirección no debe recibir emails"""
+        email = normalize_email(email)
+        if not email or not self.bloom.might_contain(email):
+            return False
+        with self._lock:
+            return self.conn.execute(
+                "SELECT 1 FROM email_suppressions WHERE email = ?", (email,)
+            ).fetchone() is not None
+
+    def reason(self, email):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT reason FROM email_suppressions WHERE email = ?", (normalize_email(email),)
+            ).fetchone()
+        return row['reason'] if row else None
+
+    def stats(self):
+        """Conteo por motivo"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT reason, COUNT(*) AS total FROM email_suppressions GROUP BY reason"
+            ).fetchall()
+        return {row['reason']: row['total'] for row in rows}
+
+    # ===== ALTAS / BAJAS =====
+    def add(self, email, reason='unsubscribe', source=None):
+        return self.add_many([(email, reason)], source)
+
+    def add_many(self, entries, source=None):
+        """
+        Suprime varias direcciones en una transacción
+
+        Args:
+            entries: Iterable de (email, motivo)
+            source: Origen (webhook, unsubscribe_link, bounce_feed...)
+
+        Returns:
+            Direcciones nuevas en la lista
+        """
+        now = datetime.now().isoformat()
+        added = 0
+        with self._lock, self.conn:
+            for email, reason in entries:
+                email = normalize_email(email)
+                if not email:
+                    continue
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO email_suppressions (email, reason, source, created_at) VALUES (?, ?, ?, ?)",
+                    (email, reason, source, now)
+                )
+                if cursor.rowcount:
+                    self.bloom.add(email)
+                    added += 1
+        if self.bloom.count > self.bloom.capacity:
+            self._rebuild()
+        return added
+
+    def remove(self, email):
+        """
+        Reactiva una dirección (ej. el lead volvió a suscribirse)
+
+        El filtro no admite borrados: la dirección queda como posible
+        positivo y la búsqueda exacta responde que ya no está suprimida.
+        """
+        with self._lock, self.conn:
+            return self.conn.execute(
+                "DELETE FROM email_suppressions WHERE email = ?", (normalize_email(email),)
+            ).rowcount > 0
+
+    def ingest_events(self, events, source='webhook'):
+        """Suprime las direcciones de eventos de rebote, queja o baja del proveedor"""
+        return self.add_many(
+            ((event.get('email'), SUPPRESSING_EVENTS[event.get('event')])
+             for event in events if event.get('event') in SUPPRESSING_EVENTS),
+            source
+        )
+
+    def import_bounce_feed(self, entries, reason='bounce', source='bounce_feed'):
+        """
+        Importa una lista de rebotes/bajas del proveedor
+        (ej. GET /v3/suppression/bounces de SendGrid: [{email, reason, created}, ...])
+        """
+        return self.add_many(((entry.get('email'), reason) for entry in entries), source)
+
+    # ===== LINK DE BAJA =====
+    @staticmethod
+    def unsubscribe_token(email):
+        """
+        Firma HMAC de la dirección: el link de baja no sirve para otra dirección
+
+        Usa solo EMAIL_UNSUBSCRIBE_SECRET; sin él devuelve None (no se firman links).
+        """
+        if not EMAIL_UNSUBSCRIBE_SECRET:
+            return None
+        return hmac.new(EMAIL_UNSUBSCRIBE_SECRET.encode('utf-8'), normalize_email(email).encode('utf-8'),
+                        hashlib.sha256).hexdigest()[:32]
+
+    @classmethod
+    def unsubscribe_url(cls, email):
+        """Link de baja personal (se inserta en el footer de cada email); '' sin EMAIL_UNSUBSCRIBE_SECRET"""
+        token = cls.unsubscribe_token(email)
+        if not token:
+            return ''
+        return (f"{PUBLIC_BASE_URL.rstrip('/')}/email/unsubscribe"
+                f"?email={quote(normalize_email(email))}&token={token}")
+
+
+def unsubscribe_blueprint(suppression=None):
+    """
+    Endpoint /email/unsubscribe del link del footer
+
+    GET solo muestra la confirmación (los escáneres de enlaces y las vistas
+    previas abren el link sin que el lead lo pida); la baja se hace con POST,
+    sea el botón de esa página o el "one-click" de List-Unsubscribe
+    (RFC 8058) que usan Gmail y Outlook.
+    """
+    blueprint = Blueprint('unsubscribe', __name__)
+    state = {'suppression': suppression}
+
+    @blueprint.route('/email/unsubscribe', methods=['GET', 'POST'])
+    def unsubscribe():
+        if not EMAIL_UNSUBSCRIBE_SECRET:
+            return "Bajas no configuradas (EMAIL_UNSUBSCRIBE_SECRET)", 503
+        email = request.args.get('email', '')
+        token = request.args.get('token', '')
+        if not email or not hmac.compare_digest(token, SuppressionList.unsubscribe_token(email)):
+            return "Link de baja inválido", 400
+        if request.method == 'GET':
+            action = f"?{urlencode({'email': email, 'token': token})}"
+            return ("<html><body style=\"font-family: Arial, sans-serif; text-align: center; padding: 40px;\">"
+                    f"<h2>🌿 ¿Dejar de recibir emails?</h2><p>{html.escape(normalize_email(email))}</p>"
+                    f"<form method=\"post\" action=\"{html.escape(action)}\">"
+                    "<button type=\"submit\">Confirmar baja</button></form></body></html>"), 200
+        state['suppression'] = state['suppression'] or SuppressionList()
+        state['suppression'].add(email, 'unsubscribe', source='unsubscribe_link')
+        print(f"🚫 Baja de emails: {normalize_email(email)}")
+        return ("<html><body style=\"font-family: Arial, sans-serif; text-align: center; padding: 40px;\">"
+                "<h2>🌿 Listo</h2><p>Ya no recibirás más emails de Sacred Rebirth.</p></body></html>"), 200
+
+    return blueprint
@@ -155,12 +155,15 @@ def create_leads_nurture_task(agent, segment='interested', context=None):
         description=f"""Ejecuta una campaña de nutrición para leads en segmento: {segment}
         
         Pasos:
-        1. Usa LeadsManagerTool para obtener leads del segmento '{segment}'
-        2. Analiza el perfil y estado de cada lead
-        3. Crea email personalizado según su etapa del customer journey
-        4. Para leads en etapa temprana: contenido educativo
-        5. Para leads interesados: información sobre próximo retiro
-        6. Para leads casi convertidos: incentivos y urgencia suave
+        1. Usa LeadsManagerTool (action='segment', segment_criteria='{segment}') para obtener
+           el tamaño y una muestra del segmento; para enviar usa EmailCampaignTool con segment='{segment}'
+        2. Para los leads de la muestra, consulta su historia con LeadsManagerTool
+           (action='timeline', lead_data con el 'id' del lead): mensajes, intenciones, emails y clics
+        3. Analiza el perfil, estado y actividad reciente de cada lead
+        4. Crea email personalizado según su etapa del customer journey
+        5. Para leads en etapa temprana: contenido educativo
+        6. Para leads interesados: información sobre próximo retiro
+        7. Para leads casi convertidos: incentivos y urgencia suave
         
         Objetivo:
         - Mover leads al siguiente estado del funnel
@@ -210,11 +213,13 @@ def create_analytics_task(agent, metric_type='engagement', context=None):
         description=f"""Analiza métricas de {metric_type} y proporciona recomendaciones
         
         Analiza:
-        1. Contenido del calendario y su performance
+        1. Contenido del calendario y su performance (Métricas de Redes Sociales: usa solo esos números,
+           no inventes cifras)
         2. Patrones de engagement por tipo de contenido
         3. Mejores horarios de publicación
         4. Hashtags más efectivos
         5. Temas que generan más interacción
+        6. Tasas de apertura, clic y rebote de las campañas de email (Métricas de Email)
         
         Proporciona:
         - Top 3 contenidos con mejor performance
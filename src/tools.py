@@ -7,6 +7,12 @@ from datetime import datetime
 from src.content_generator import ContentGenerator
 from src.social_media import SocialMediaManager
 from src.email_campaign import EmailCampaignManager
+from src.lead_store import LeadStore
+from src.lead_scoring import LeadScoringEngine
+from src.lead_io import format_leads_table
+from src.activity_timeline import ActivityTimeline, format_timeline
+from src.email_events import EmailEventStore, format_campaign_stats
+from src.insights_sync import InsightsStore, format_insights_report
 
 
 @tool("Generador de Contenido")
@@ -45,22 +51,30 @@ def content_generator_tool(platform: str, topic: str) -> str:
 
 
 @tool("Publicador en Redes Sociales")
-def social_media_publish_tool(platform: str, content: str, image_url: str = None) -> str:
+def social_media_publish_tool(platform: str, content: str, image_url: str = None, scheduled_time: str = None) -> str:
     """
-    Publica contenido en Instagram o Facebook.
+    Publica contenido en Instagram o Facebook, ahora o a una hora programada.
     
     Args:
         platform: Plataforma ('instagram' o 'facebook')
         content: Contenido a publicar
-        image_url: URL de la imagen (opcional)
+        image_url: URL de la imagen (opcional; en Instagram varias URLs separadas por coma publican un carrusel)
+        scheduled_time: Fecha y hora de publicación 'YYYY-MM-DDTHH:MM' (opcional; si se indica, se programa)
     
     Returns:
         Confirmación de publicación o error
     """
     manager = SocialMediaManager()
+    image_urls = [url.strip() for url in (image_url or '').split(',') if url.strip()]
+    
+    if scheduled_time:
+        scheduled = manager.schedule_post(platform, content, scheduled_time, image_urls)
+        if not scheduled:
+            return f"❌ Error programando en {platform} (fecha 'YYYY-MM-DDTHH:MM', Instagram requiere imagen)"
+        return f"📅 Programado en {platform} para {scheduled['scheduled_time']} (#{scheduled['id']})"
     
     if platform.lower() == 'instagram':
-        result = manager.post_to_instagram(content, image_url)
+        result = manager.post_to_instagram(content, image_urls)
     elif platform.lower() == 'facebook':
         result = manager.post_to_facebook(content, image_url=image_url)
     else:
@@ -73,40 +87,119 @@ def social_media_publish_tool(platform: str, content: str, image_url: str = None
 
 
 @tool("Gestor de Campañas Email")
-def email_campaign_tool(subject: str, html_content: str, send_to_all: bool = False) -> str:
+def email_campaign_tool(subject: str, html_content: str, send_to_all: bool = False, segment: str = None,
+                        campaign_id: str = None) -> str:
     """
     Envía campañas de email a leads.
     
+    Cada campaña queda registrada por destinatario: repetir la misma
+    campaña (mismo asunto y contenido, o mismo campaign_id) solo envía a
+    quienes aún no la recibieron, así que es seguro reintentarla.
+    
     Args:
         subject: Asunto del email
         html_content: Contenido HTML del email
         send_to_all: Enviar a todos (True) o solo testear (False)
+        segment: Segmento destino (nombre guardado o definición, ej. 'premium'
+                 o 'status:interested lang:es'); por defecto todos los leads
+        campaign_id: Id de la campaña para reanudarla o ampliarla (opcional)
     
     Returns:
         Resumen del envío
     """
     manager = EmailCampaignManager()
+    store = LeadStore()
+    segment = segment or 'all'
     
-    # Cargar leads
     try:
-        with open('data/leads.json', 'r') as f:
-            leads = json.load(f)
-    except:
-        leads = []
-    
-    if not leads:
-        return "⚠️ No hay leads disponibles en data/leads.json"
+        total = store.segment_count(segment)
+    except ValueError as e:
+        return f"❌ Segmento inválido: {e}"
+    if not total:
+        return f"⚠️ No hay leads en el segmento '{segment}'"
     
     if send_to_all:
         template = manager.create_email_template(html_content)
-        results = manager.send_bulk_campaign(leads, subject, template)
-        return f"✅ Campaña enviada a {len(results)} leads"
+        results = manager.send_bulk_campaign(list(store.iter_segment(segment)), subject, template,
+                                             campaign_id=campaign_id, segment=segment)
+        counts = {}
+        for record in results:
+            counts[record['status']] = counts.get(record['status'], 0) + 1
+        summary = f"✅ Campaña enviada a {counts.get('sent', 0)} leads del segmento '{segment}'"
+        if results:
+            summary += f"\n🆔 Campaña: {results[0]['campaign_id']}"
+        if counts.get('failed'):
+            summary += f"\n❌ Fallidos: {counts['failed']}"
+        if counts.get('deferred'):
+            summary += f"\n⏸️ Pendientes por el límite diario (MAX_EMAILS_PER_DAY): {counts['deferred']}"
+        if counts.get('unconfirmed'):
+            summary += f"\n❔ Sin confirmar por una ejecución interrumpida: {counts['unconfirmed']}"
+        return summary
     else:
-        # Modo test: enviar solo al primer lead
+        # Modo test: enviar solo al primer lead del segmento
         template = manager.create_email_template(html_content)
-        test_lead = [leads[0]]
-        result = manager.send_bulk_campaign(test_lead, subject, template)
-        return f"📧 Email de prueba enviado a {leads[0]['email']}"
+        test_lead = store.find_segment(segment, limit=1)
+        # Id propio para que la prueba no marque al lead como enviado en la campaña real
+        test_id = f"test-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        result = manager.send_bulk_campaign(test_lead, subject, template, campaign_id=test_id)
+        if not result or result[0]['status'] != 'sent':
+            return f"❌ No se pudo enviar el email de prueba: {result[0].get('error') if result else 'sin API key'}"
+        return f"📧 Email de prueba enviado a {test_lead[0]['email']}"
+
+
+@tool("Métricas de Email")
+def email_stats_tool(campaign_id: str = None, lead_id: int = None) -> str:
+    """
+    Consulta entregas, aperturas, clics y rebotes de las campañas de email.
+    
+    Args:
+        campaign_id: Campaña a consultar (el id que devuelve el gestor de campañas);
+                     sin campaign_id ni lead_id muestra las campañas recientes
+        lead_id: Lead a consultar (eventos de email de ese lead)
+    
+    Returns:
+        Métricas con tasas de apertura, clic y rebote
+    """
+    events = EmailEventStore()
+    
+    if lead_id:
+        stats = events.lead_stats(int(lead_id))
+        if not stats:
+            return f"⚠️ Sin eventos de email para el lead {lead_id}"
+        lines = [f"📧 Eventos de email del lead {lead_id}:"]
+        for event, info in sorted(stats.items()):
+            lines.append(f"   • {event}: {info['total']} (último: {(info['last'] or '')[:16].replace('T', ' ')})")
+        return "\n".join(lines)
+    
+    if campaign_id:
+        stats = events.campaign_stats(campaign_id)
+        if not stats['last_event_at']:
+            return f"⚠️ Aún no hay eventos para la campaña '{campaign_id}'"
+        return f"📊 {format_campaign_stats(stats)}\n🖱️ Clics totales: {stats.get('click', 0)} | 👀 Aperturas totales: {stats.get('open', 0)}"
+    
+    recent = events.recent_campaigns()
+    if not recent:
+        return "⚠️ Aún no hay eventos de email registrados"
+    return "📊 Campañas recientes:\n" + "\n".join(f"   • {format_campaign_stats(stats)}" for stats in recent)
+
+
+@tool("Métricas de Redes Sociales")
+def social_insights_tool(days: int = 30, metric: str = None, platform: str = None) -> str:
+    """
+    Consulta impresiones, alcance y engagement de los posts de Facebook e Instagram
+    (copia local sincronizada periódicamente; no llama a Meta).
+    
+    Args:
+        days: Posts publicados en los últimos N días (por defecto 30)
+        metric: Métrica para ordenar los mejores posts (ej. 'post_impressions', 'reach');
+                por defecto el engagement de cada plataforma
+        platform: 'facebook' o 'instagram' (por defecto ambas)
+    
+    Returns:
+        Totales por plataforma y mejores posts
+    """
+    return format_insights_report(InsightsStore(), int(days or 30), metric or None,
+                                  platform.lower() if platform else None)
 
 
 @tool("Gestor de Calendario de Contenido")
@@ -166,54 +259,94 @@ def content_calendar_tool(action: str, content_item: dict = None) -> str:
 
 
 @tool("Gestor de Leads")
-def leads_manager_tool(action: str, lead_data: dict = None, segment_criteria: str = None) -> str:
+def leads_manager_tool(action: str, lead_data: dict = None, segment_criteria: str = None, cursor: str = None) -> str:
     """
     Gestiona la base de datos de leads y clientes potenciales.
     
     Args:
-        action: Acción ('view', 'add' o 'segment')
-        lead_data: Datos del lead para agregar
-        segment_criteria: Criterio de segmentación
+        action: Acción ('view', 'add', 'timeline', 'segment', 'save_segment', 'segments', 'dedup' o 'rescore')
+        lead_data: Datos del lead para agregar (en 'timeline': {'id': <id del lead>})
+        segment_criteria: Segmento guardado ('interested', 'premium'...) o definición
+            (ej. 'status:interested source:instagram score:>=7 lang:es created:30d');
+            en 'save_segment': 'nombre = definición'; en 'rescore': perfil de pesos
+        cursor: En 'view', cursor 'next'/'prev' devuelto por la página anterior
     
     Returns:
         Información de leads
     """
-    leads_path = 'data/leads.json'
-    
-    try:
-        with open(leads_path, 'r') as f:
-            leads = json.load(f)
-    except:
-        leads = []
+    store = LeadStore()
     
     if action == 'view':
-        if not leads:
+        # Página de tamaño fijo: el contexto no crece con la base de leads
+        try:
+            page = store.page(segment=segment_criteria, limit=10, cursor=cursor)
+        except ValueError as e:
+            return f"❌ {e}"
+        if not page['leads']:
             return "👥 No hay leads en la base de datos"
-        return f"👥 Total de leads: {len(leads)}\n\n{json.dumps(leads[:5], indent=2, ensure_ascii=False)}\n\n(Mostrando primeros 5)"
+        navigation = [f"siguiente: cursor='{page['next']}'" if page['next'] else None,
+                      f"anterior: cursor='{page['prev']}'" if page['prev'] else None]
+        navigation = ' | '.join(n for n in navigation if n) or 'sin más páginas'
+        return f"👥 Leads ({segment_criteria or 'todos'}, más recientes primero)\n\n{format_leads_table(page['leads'])}\n\n➡️ {navigation}"
     
     elif action == 'add':
         if not lead_data:
             return "❌ Error: Se requiere lead_data para agregar"
         
-        lead_data['id'] = len(leads) + 1
-        lead_data['created_at'] = datetime.now().isoformat()
-        leads.append(lead_data)
+        lead, created = store.upsert(lead_data)
+        LeadScoringEngine().rescore(store, lead_ids=[lead['id']])
         
-        with open(leads_path, 'w') as f:
-            json.dump(leads, f, ensure_ascii=False, indent=2)
-        
-        return f"✅ Lead agregado: {lead_data.get('email', 'Sin email')}"
+        if not created:
+            return f"🔁 Lead existente actualizado (duplicado fusionado): {lead.get('email') or 'Sin email'} (ID: {lead['id']})"
+        return f"✅ Lead agregado: {lead.get('email') or 'Sin email'} (ID: {lead['id']})"
+    
+    elif action == 'timeline':
+        lead_id = (lead_data or {}).get('id')
+        lead = store.get(int(lead_id)) if str(lead_id or '').isdigit() else None
+        if lead is None:
+            return f"❌ Lead no encontrado: {lead_id}"
+        events = ActivityTimeline().timeline(lead['id'], limit=20)
+        header = (f"🧭 Lead {lead['id']}: {lead.get('name') or lead.get('email') or lead.get('phone') or 'sin nombre'} | "
+                  f"estado {lead.get('status')} | score {lead.get('score')} | intereses {', '.join(lead.get('interests') or []) or '-'}")
+        return f"{header}\n\n{format_timeline(events) or 'Sin actividad registrada'}"
     
     elif action == 'segment':
-        # Segmentación básica
-        if segment_criteria == 'interested':
-            segmented = [l for l in leads if l.get('status') == 'interested']
-        elif segment_criteria == 'converted':
-            segmented = [l for l in leads if l.get('status') == 'converted']
-        else:
-            segmented = leads
+        # Segmento guardado (membresía materializada) o definición ad hoc sobre índices
+        segment = segment_criteria or 'all'
+        try:
+            total = store.segment_count(segment)
+        except ValueError as e:
+            return f"❌ Segmento inválido: {e}"
+        segmented = store.find_segment(segment, limit=3)
         
-        return f"📊 Segmento '{segment_criteria}': {len(segmented)} leads\n\n{json.dumps(segmented[:3], indent=2, ensure_ascii=False)}"
+        return f"📊 Segmento '{segment}': {total} leads\n\n{json.dumps(segmented, indent=2, ensure_ascii=False)}"
+    
+    elif action == 'save_segment':
+        name, _, definition = (segment_criteria or '').partition('=')
+        if not name.strip() or not definition.strip():
+            return "❌ Error: usa segment_criteria='nombre = definición'"
+        try:
+            members = store.define_segment(name.strip(), definition.strip())
+        except ValueError as e:
+            return f"❌ Segmento inválido: {e}"
+        return f"✅ Segmento '{name.strip()}' guardado: {members} leads"
+    
+    elif action == 'segments':
+        lines = [f"- {s['name']}: {s['members']} leads ({s['definition']})" for s in store.list_segments()]
+        return "📊 Segmentos guardados:\n" + "\n".join(lines)
+    
+    elif action == 'dedup':
+        result = store.rededup()
+        return f"🧹 Deduplicación completa: {result['merged']} duplicados fusionados de {result['scanned']} leads ({result['seconds']}s)"
+    
+    elif action == 'rescore':
+        try:
+            engine = LeadScoringEngine(segment_criteria)
+        except ValueError as e:
+            return f"❌ {e}"
+        result = engine.rescore(store)
+        return (f"🎯 Scoring '{result['profile']}': {result['scored']} leads puntuados | "
+                f"promedio {result['average']} | {result['premium']} premium (≥7)")
     
     else:
         return f"❌ Acción no válida: {action}"
@@ -4,18 +4,23 @@ Bot de Telegram para Sacred Rebirth AI Agent
 Permite interactuar con el agente de marketing a través de Telegram
 """
 import os
-import requests
+import asyncio
+import tempfile
 import json
 from datetime import datetime
 from dotenv import load_dotenv
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 from src.crew import MarketingCrew
 from chat import ChatAgent
 from src.appointment_setter import AppointmentSetterAgent
 from src.image_generator import SacredRebirthImageGenerator
 from src.campaign_manager import MarketingCampaignManager
 from src.daily_content import DailyContentAutomation
+from src.lead_io import export_leads, format_leads_table
+from src.lead_store import LeadStore, PAGE_SORTS
+from src.activity_timeline import ActivityTimeline, format_timeline
+from src.publish_queue import PublishQueue, format_publish_result
 
 load_dotenv()
 
@@ -24,58 +29,42 @@ TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 AUTHORIZED_USERS = os.getenv('TELEGRAM_AUTHORIZED_USERS', '').split(',')
 FACEBOOK_PAGE_ACCESS_TOKEN = os.getenv('FACEBOOK_PAGE_ACCESS_TOKEN')
 
-def post_to_facebook(message_text, image_path=None):
+def with_call_to_action(message_text):
+    """Siempre añadir call to action al contenido"""
+    if "book your discovery call" not in message_text.lower():
+        message_text += "\n\n💫 Book your discovery call now: https://sacred-rebirth.com/appointment.html"
+    return message_text
+
+
+async def queue_facebook_post(update, message_text, image_path=None):
     """
-    Publica contenido en la página de Facebook de Sacred Rebirth
-    Incluye texto y opcionalmente una imagen
+    Encola la publicación en Facebook y responde de inmediato (src/publish_queue.py)
+    
+    El Post ID llega en un segundo mensaje cuando el worker publica.
     """
-    if not FACEBOOK_PAGE_ACCESS_TOKEN:
-        return {"success": False, "error": "Facebook token not configured"}
+    job, created = publish_queue.enqueue(with_call_to_action(message_text), image_path=image_path,
+                                         notify_chat_id=update.effective_chat.id)
+    if created or (job['status'] == 'queued' and not job['attempts']):
+        await update.message.reply_text(
+            f"📥 En cola para Facebook (#{job['job_id']}). Te aviso con el Post ID cuando se publique.")
+    elif job['status'] == 'published':
+        await update.message.reply_text(f"✅ Este contenido ya está publicado en Facebook\n📱 Post ID: {job['post_id']}")
+    else:
+        await update.message.reply_text(f"⏳ Este contenido ya está en la cola de Facebook (#{job['job_id']})")
+
+
+async def start_publish_queue(application):
+    """Arranca los workers de la cola de publicación con el bot (post_init)"""
+    async def notify(job):
+        if job['notify_chat_id']:
+            await application.bot.send_message(chat_id=job['notify_chat_id'], text=format_publish_result(job))
     
-    try:
-        # URL de la Graph API para publicar en página
-        url = f"https://graph.facebook.com/v18.0/me/feed"
-        
-        # Siempre añadir call to action al contenido
-        if "book your discovery call" not in message_text.lower():
-            message_text += "\n\n💫 Book your discovery call now: https://sacred-rebirth.com/appointment.html"
-        
-        if image_path and os.path.exists(image_path):
-            # Publicar con imagen
-            url = f"https://graph.facebook.com/v18.0/me/photos"
-            
-            with open(image_path, 'rb') as image_file:
-                files = {'source': image_file}
-                data = {
-                    'message': message_text,
-                    'access_token': FACEBOOK_PAGE_ACCESS_TOKEN
-                }
-                response = requests.post(url, data=data, files=files)
-        else:
-            # Publicar solo texto
-            data = {
-                'message': message_text,
-                'access_token': FACEBOOK_PAGE_ACCESS_TOKEN
-            }
-            response = requests.post(url, data=data)
-        
-        result = response.json()
-        
-        if response.status_code == 200 and 'id' in result:
-            return {
-                "success": True, 
-                "post_id": result['id'],
-                "message": "✅ Post publicado en Facebook exitosamente",
-                "has_image": image_path is not None
-            }
-        else:
-            return {
-                "success": False, 
-                "error": f"Error de Facebook: {result.get('error', {}).get('message', 'Unknown error')}"
-            }
-            
-    except Exception as e:
-        return {"success": False, "error": f"Error de conexión: {str(e)}"}
+    publish_queue.notifier = notify
+    await publish_queue.start()
+
+
+async def stop_publish_queue(application):
+    await publish_queue.stop()
 
 # Inicializar agentes
 print("🤖 Inicializando Marketing Crew para Telegram...")
@@ -86,6 +75,7 @@ appointment_agent = AppointmentSetterAgent()
 image_generator = SacredRebirthImageGenerator()
 campaign_manager = MarketingCampaignManager()
 daily_content = DailyContentAutomation()
+publish_queue = PublishQueue(access_token=FACEBOOK_PAGE_ACCESS_TOKEN)
 print("✅ Bot de Telegram con sistemas completos listo!")
 
 
@@ -138,6 +128,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /stats - Ver uso y costos 💰
 /models - Ver modelos de IA disponibles
 /teach - Enseñarme algo nuevo
+/leads [score] [segmento] - Ver leads paginados 👥
+/lead <id> - Ficha y actividad de un lead 🧭
+/leads export [csv|jsonl] - Descargar leads 📤
 
 **📱 FACEBOOK AUTOMATION:**
 /setup_facebook - Configurar respuestas automáticas FB
@@ -375,17 +368,7 @@ Si el usuario te pide que aprendas algo nuevo sobre el negocio, di que has actua
             
         # 📱 PUBLICAR AUTOMÁTICAMENTE EN FACEBOOK SI SE SOLICITA
         if wants_to_publish and FACEBOOK_PAGE_ACCESS_TOKEN:
-            await update.message.reply_text("📱 Publicando en Facebook...")
-            
-            facebook_result = post_to_facebook(bot_response, generated_image)
-            if facebook_result["success"]:
-                success_msg = f"🎉 {facebook_result['message']}"
-                if facebook_result.get('has_image'):
-                    success_msg += " (con imagen)"
-                success_msg += f"\n📱 Post ID: {facebook_result['post_id']}"
-                await update.message.reply_text(success_msg)
-            else:
-                await update.message.reply_text(f"❌ Error al publicar en Facebook: {facebook_result['error']}")
+            await queue_facebook_post(update, bot_response, generated_image)
                 
         elif (is_content and not wants_to_publish) and FACEBOOK_PAGE_ACCESS_TOKEN:
             # Ofrecer publicar
@@ -458,10 +441,135 @@ async def calendar(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"❌ Error: {str(e)}")
 
 
+LEADS_PAGE_SIZE = 10
+
+
 async def leads(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Comando /leads - Ver leads"""
+    """
+    Comando /leads - Ver leads paginados o exportarlos
+    
+    /leads [recent|oldest|created|score] [segmento o definición]
+    /leads export [csv|jsonl]
+    """
+    user_id = str(update.effective_user.id)
+    if AUTHORIZED_USERS and user_id not in AUTHORIZED_USERS:
+        await update.message.reply_text("⛔ No estás autorizado para ver los leads.")
+        return
+    
+    if context.args and context.args[0].lower() == 'export':
+        await leads_export(update, context)
+        return
+    
+    args = list(context.args or [])
+    sort = args.pop(0).lower() if args and args[0].lower() in PAGE_SORTS else 'recent'
+    segment = ' '.join(args) or None
+    # El segmento y el orden quedan en la sesión; los botones solo llevan el cursor
+    context.user_data['leads_view'] = {'segment': segment, 'sort': sort}
+    
     await update.message.chat.send_action("typing")
-    await update.message.reply_text("📊 Función de leads en desarrollo. Por ahora usa el comando general para gestionar leads.")
+    text, keyboard = await leads_page(segment, sort)
+    await update.message.reply_text(text, parse_mode='Markdown', reply_markup=keyboard)
+
+
+async def leads_page(segment, sort, cursor=None):
+    """Renderiza una página de leads como tabla con botones anterior/siguiente"""
+    try:
+        page = await asyncio.to_thread(LeadStore().page, segment, sort, LEADS_PAGE_SIZE, cursor)
+    except ValueError as e:
+        return f"❌ {e}", None
+    
+    if not page['leads']:
+        return f"👥 No hay leads en '{segment or 'todos'}'", None
+    
+    buttons = []
+    if page['prev']:
+        buttons.append(InlineKeyboardButton("⬅️ Anterior", callback_data=f"leads:{page['prev']}"))
+    if page['next']:
+        buttons.append(InlineKeyboardButton("Siguiente ➡️", callback_data=f"leads:{page['next']}"))
+    
+    # Todo dentro del bloque de código: los nombres de segmento pueden llevar "_"
+    text = f"```\n👥 Leads: {segment or 'todos'} ({sort})\n\n{format_leads_table(page['leads'])}\n```"
+    return text, InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+async def leads_navigate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Botones anterior/siguiente de /leads"""
+    query = update.callback_query
+    await query.answer()
+    
+    user_id = str(update.effective_user.id)
+    if AUTHORIZED_USERS and user_id not in AUTHORIZED_USERS:
+        return
+    
+    view = context.user_data.get('leads_view', {'segment': None, 'sort': 'recent'})
+    cursor = query.data.split(':', 1)[1]
+    text, keyboard = await leads_page(view['segment'], view['sort'], cursor)
+    await query.edit_message_text(text, parse_mode='Markdown', reply_markup=keyboard)
+
+
+async def lead_detail(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Comando /lead <id> - Ficha del lead con su línea de tiempo de actividad"""
+    user_id = str(update.effective_user.id)
+    if AUTHORIZED_USERS and user_id not in AUTHORIZED_USERS:
+        await update.message.reply_text("⛔ No estás autorizado para ver los leads.")
+        return
+    
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("📝 Uso: `/lead <id>` (los ids aparecen en /leads)", parse_mode='Markdown')
+        return
+    
+    lead_id = int(context.args[0])
+    
+    def load():
+        return LeadStore().get(lead_id), ActivityTimeline().timeline(lead_id, limit=15)
+    
+    lead, events = await asyncio.to_thread(load)
+    if lead is None:
+        await update.message.reply_text(f"❌ No existe el lead {lead_id}")
+        return
+    
+    card = "\n".join([
+        f"👤 {lead.get('name') or 'Sin nombre'} (#{lead['id']})",
+        f"📧 {lead.get('email') or '-'}  📱 {lead.get('phone') or '-'}",
+        f"📊 {lead.get('status')} | {lead.get('source') or '-'} | score {lead.get('score') if lead.get('score') is not None else '-'}",
+        f"🌿 {', '.join(lead.get('interests') or []) or '-'}"
+    ])
+    # Bloque de código: los eventos pueden traer texto con caracteres de Markdown
+    await update.message.reply_text(
+        f"```\n{card}\n\n🧭 Actividad reciente\n{format_timeline(events) or 'Sin actividad registrada'}\n```",
+        parse_mode='Markdown'
+    )
+
+
+async def leads_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Exporta los leads y los envía como documento"""
+    file_format = context.args[1].lower() if len(context.args) > 1 else 'csv'
+    if file_format not in ('csv', 'jsonl'):
+        await update.message.reply_text("❌ Formato no válido. Usa: `/leads export csv` o `/leads export jsonl`", parse_mode='Markdown')
+        return
+    
+    await update.message.chat.send_action("upload_document")
+    
+    export_dir = tempfile.mkdtemp(prefix='leads_export_')
+    filename = f"leads_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_format}"
+    filepath = os.path.join(export_dir, filename)
+    
+    try:
+        # La exportación corre en un hilo para no bloquear el event loop
+        report = await asyncio.to_thread(export_leads, filepath, file_format)
+        
+        with open(filepath, 'rb') as document:
+            await update.message.reply_document(
+                document=document,
+                filename=filename,
+                caption=f"📤 {report['rows']} leads exportados ({report['rows_per_second']} filas/s)"
+            )
+    except Exception as e:
+        await update.message.reply_text(f"❌ Error exportando leads: {str(e)}")
+    finally:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        os.rmdir(export_dir)
 
 
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -720,24 +828,8 @@ async def facebook_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     content = ' '.join(context.args)
     
-    await update.message.chat.send_action("typing")
-    await update.message.reply_text("📱 Publicando en Facebook...")
-    
-    # Publicar en Facebook
-    result = post_to_facebook(content)
-    
-    if result["success"]:
-        await update.message.reply_text(
-            f"🎉 **¡Post publicado exitosamente!**\n\n"
-            f"📱 Post ID: `{result['post_id']}`\n"
-            f"📝 Contenido: _{content}_",
-            parse_mode='Markdown'
-        )
-    else:
-        await update.message.reply_text(
-            f"❌ **Error al publicar:**\n{result['error']}\n\n"
-            "Intenta de nuevo o contacta al administrador."
-        )
+    # Publicar en Facebook (en segundo plano; el Post ID llega en otro mensaje)
+    await queue_facebook_post(update, content)
 
 
 async def campaign(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1059,7 +1151,8 @@ def main():
     print("🚀 Iniciando bot de Telegram...")
     
     # Crear aplicación
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = (Application.builder().token(TELEGRAM_BOT_TOKEN)
+                   .post_init(start_publish_queue).post_shutdown(stop_publish_queue).build())
     
     # Registrar handlers
     application.add_handler(CommandHandler("start", start))
@@ -1068,6 +1161,8 @@ def main():
     application.add_handler(CommandHandler("stats", stats))
     application.add_handler(CommandHandler("calendar", calendar))
     application.add_handler(CommandHandler("leads", leads))
+    application.add_handler(CommandHandler("lead", lead_detail))
+    application.add_handler(CallbackQueryHandler(leads_navigate, pattern=r'^leads:'))
     application.add_handler(CommandHandler("models", models))
     application.add_handler(CommandHandler("teach", teach))
     application.add_handler(CommandHandler("facebook", facebook_post))
@@ -10,6 +10,7 @@ from datetime import datetime
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from src.conversation_memory import ConversationMemory, make_openai_summarizer
 
 # Try to import OpenAI, fallback if not available
 try:
@@ -43,6 +44,11 @@ class SmartMaya:
             except Exception as e:
                 logger.error(f"❌ OpenAI initialization failed: {e}")
         
+        # Conversation memory per Telegram user (token-bounded, rolling summary)
+        self.memory = ConversationMemory(
+            summarizer=make_openai_summarizer(self.openai_client) if self.openai_client else None
+        )
+        
         # Updated retreat information from website
         self.retreat_info = {
             "name": "Sacred Plant Medicine Retreat",
@@ -75,8 +81,8 @@ CRITICAL RULES:
 6. Give complete retreat information when asked
 7. Be intelligent and understand context"""
 
-    async def get_ai_response(self, user_message: str, user_name: str = "") -> str:
-        """Get intelligent response from OpenAI"""
+    async def get_ai_response(self, user_message: str, user_name: str = "", sender_id: str = None) -> str:
+        """Get intelligent response from OpenAI, keeping per-sender conversation context"""
         
         if not self.openai_client:
             # Fallback to basic responses if OpenAI not available
@@ -125,6 +131,7 @@ CRITICAL INSTRUCTIONS:
                 model="gpt-4o-mini",  # Most cost-effective model
                 messages=[
                     {"role": "system", "content": system_prompt},
+                    *self.memory.get_context(sender_id),
                     {"role": "user", "content": f"User {user_name} writes: {user_message}"}
                 ],
                 max_tokens=300,  # More space for detailed responses
@@ -139,7 +146,8 @@ CRITICAL INSTRUCTIONS:
                     ai_response += f"\n\n💫 Agenda tu discovery call: https://sacred-rebirth.com/appointment.html"
                 else:
                     ai_response += f"\n\n💫 Book your discovery call: https://sacred-rebirth.com/appointment.html"
-                
+            
+            self.memory.record_exchange(sender_id, user_message, ai_response)
             return ai_response
             
         except Exception as e:
@@ -252,7 +260,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"💬 {user.first_name}: {user_message[:50]}...")
     
     # Get AI response
-    response = await maya.get_ai_response(user_message, user.first_name)
+    response = await maya.get_ai_response(user_message, user.first_name, str(user.id))
     
     await update.message.reply_text(response)
 
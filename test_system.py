@@ -115,6 +115,1023 @@ def test_facebook_integration():
     
     return bool(facebook_token)
 
+def test_conversation_memory():
+    """Memoria de conversación: el contexto nunca pasa del presupuesto, ni con un resumen en curso"""
+    print("\n🧠 PROBANDO MEMORIA DE CONVERSACIÓN...")
+    
+    import threading
+    
+    try:
+        from src.conversation_memory import ConversationMemory, estimate_tokens
+        
+        started, release, calls = threading.Event(), threading.Event(), []
+        
+        def slow_summarizer(previous, turns, max_tokens):
+            """Resumen de prueba: se queda esperando hasta que el test lo suelte"""
+            calls.append(len(turns))
+            started.set()
+            release.wait(5)
+            return f"{previous} resumidos {len(turns)} turnos".strip()
+        
+        memory = ConversationMemory(token_budget=200, summary_tokens=50, summarizer=slow_summarizer)
+        
+        def context_tokens():
+            return sum(estimate_tokens(m['content']) for m in memory.get_context('ana'))
+        
+        # Mensajes de ~40 tokens: la quinta ronda desborda la ventana de 150 y dispara el resumen
+        exchange = lambda i: memory.record_exchange('ana', f"pregunta {i} " + 'sí ' * 60, f"respuesta {i} " + 'ok ' * 60)
+        writer = threading.Thread(target=lambda: [exchange(i) for i in range(5)])
+        writer.start()
+        assert started.wait(5)
+        # Durante el resumen llegan más mensajes de otro hilo: el contexto sigue dentro del límite
+        for i in range(5, 8):
+            exchange(i)
+            assert context_tokens() <= 200, context_tokens()
+        release.set()
+        writer.join(5)
+        
+        context = memory.get_context('ana')
+        print(f"📝 Resúmenes: {calls} | contexto: {context_tokens()} tokens en {len(context)} mensajes")
+        assert calls and context[0]['role'] == 'system' and 'resumidos' in context[0]['content']
+        assert context_tokens() <= 200 and context[-1]['role'] == 'assistant'
+        
+        print("✅ Memoria de conversación correcta")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en memoria de conversación: {str(e)}")
+        return False
+
+def test_embedding_cache():
+    """Caché de embeddings: el memmap se reabre con sus vectores y desaloja por LRU al llenarse"""
+    print("\n🧮 PROBANDO CACHÉ DE EMBEDDINGS...")
+    
+    import tempfile
+    import numpy as np
+    
+    try:
+        from src.embedding_cache import EmbeddingCache
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = EmbeddingCache(cache_dir=cache_dir, model='modelo-prueba', dimensions=4, capacity=10)
+            keys = [EmbeddingCache.content_key('modelo-prueba', f"texto {i}") for i in range(10)]
+            for i, key in enumerate(keys):
+                cache.put(key, [i, i + 0.5, -i, 1.0])
+            cache.flush()
+            
+            # Reabrir: índice y vectores salen del disco
+            cache = EmbeddingCache(cache_dir=cache_dir, model='modelo-prueba', dimensions=4, capacity=10)
+            assert np.allclose(cache.get(keys[3]), [3, 3.5, -3, 1.0])
+            assert cache.get(EmbeddingCache.content_key('modelo-prueba', 'otro texto')) is None
+            assert EmbeddingCache.content_key('otro-modelo', 'texto 3') != keys[3]
+            
+            # Caché llena: entra uno nuevo y sale el usado hace más tiempo (texto 0, no texto 3)
+            for key in keys[:3]:
+                cache.get(key)
+            cache.put(EmbeddingCache.content_key('modelo-prueba', 'texto nuevo'), [9, 9, 9, 9])
+            assert cache.get(keys[4]) is None
+            assert all(cache.get(key) is not None for key in keys[:4] + keys[5:])
+            stats = cache.stats()
+            print(f"📦 {stats['entries']}/{stats['capacity']} entradas | aciertos {stats['hits']} | "
+                  f"fallos {stats['misses']} | desalojos {stats['evictions']}")
+            assert stats['entries'] == 10 and stats['evictions'] == 1
+            assert stats['hits'] == 13 and stats['misses'] == 2
+            
+            # Otra dimensión no reutiliza vectores incompatibles
+            cache.flush()
+            resized = EmbeddingCache(cache_dir=cache_dir, model='modelo-prueba', dimensions=8, capacity=10)
+            assert resized.stats()['entries'] == 0
+        
+        print("✅ Caché de embeddings correcta")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en caché de embeddings: {str(e)}")
+        return False
+
+def test_lead_store():
+    """Base de leads: deduplicación al ingresar, iteración por lotes y paginación por cursor"""
+    print("\n👥 PROBANDO BASE DE LEADS...")
+    
+    import tempfile
+    
+    try:
+        from src.lead_store import LeadStore
+        with tempfile.TemporaryDirectory() as data_dir:
+            store = LeadStore(os.path.join(data_dir, 'test.db'), json_path=os.path.join(data_dir, 'leads.json'))
+            results = store.upsert_many([{'name': f"Lead {i}", 'email': f"lead{i}@example.com", 'source': 'test'}
+                                         for i in range(25)])
+            assert all(created for _, created in results)
+            lead, created = store.upsert({'email': ' LEAD3@Example.com ', 'interests': ['kambo']})
+            assert not created and lead['id'] == results[3][0] and lead['name'] == 'Lead 3'
+            assert store.count() == 25
+            
+            # La iteración por lotes sigue en orden aunque se escriba entre lote y lote
+            seen = []
+            for lead in store.iter_leads(batch_size=7):
+                seen.append(lead['id'])
+                if len(seen) == 7:
+                    store.add({'name': 'Nuevo', 'email': 'nuevo@example.com'})
+            assert seen == sorted(seen) and len(seen) == 26
+            segment = []
+            for lead in store.iter_segment('source:test', batch_size=7):
+                segment.append(lead['id'])
+                if len(segment) == 7:
+                    seen.append(store.add({'name': 'Nuevo', 'email': 'otro@example.com', 'source': 'test'})['id'])
+            assert segment == sorted(segment) and len(segment) == 26
+            
+            # Paginación: cada lead aparece una sola vez y 'prev' regresa a la página anterior
+            pages, cursor = [], None
+            while True:
+                page = store.page(sort='recent', limit=10, cursor=cursor)
+                pages.append([lead['id'] for lead in page['leads']])
+                cursor = page['next']
+                if not cursor:
+                    break
+            ids = [lead_id for page_ids in pages for lead_id in page_ids]
+            print(f"📄 Páginas: {[len(p) for p in pages]}")
+            assert ids == sorted(seen, reverse=True)
+            second = store.page(sort='recent', limit=10, cursor=store.page(sort='recent', limit=10)['next'])
+            back = store.page(sort='recent', limit=10, cursor=second['prev'])
+            assert [lead['id'] for lead in back['leads']] == pages[0]
+            
+            # Cambiar el email a uno de otro lead no le quita la clave; la clave vieja deja de apuntar aquí
+            store.update(results[5][0], {'email': 'lead6@example.com'})
+            assert store.upsert({'email': 'lead6@example.com'})[0]['id'] == results[6][0]
+            assert store.upsert({'email': 'lead5@example.com'})[1]
+            
+            # Abrir una base anterior a lead_keys no borra nada: fusionar es un paso explícito
+            store.add({'name': 'Copia', 'email': 'lead0@example.com'})
+            with store.conn:
+                store.conn.execute("DELETE FROM lead_keys")
+                store.conn.execute("DELETE FROM store_meta WHERE key = 'identity_keys_indexed'")
+            before = store.count()
+            reopened = LeadStore(os.path.join(data_dir, 'test.db'), json_path=os.path.join(data_dir, 'leads.json'))
+            assert reopened.count() == before
+            assert reopened.rededup()['merged'] == 2 and reopened.count() == before - 2
+        
+        print("✅ Base de leads correcta")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en base de leads: {str(e)}")
+        return False
+
+def test_lead_scoring():
+    """Scoring: las palabras clave cuentan solo como palabras completas"""
+    print("\n🎯 PROBANDO SCORING DE LEADS...")
+    
+    try:
+        from src.lead_scoring import LeadScoringEngine, KEYWORD_GROUPS
+        engine = LeadScoringEngine('retreat_push')
+        booking = list(KEYWORD_GROUPS).index('booking_intent')
+        texts = ["te vi en facebook", "update de mi agenda", "vivo en la costa", "a priceless moment",
+                 "¿cuál es el precio?", "quiero reservar una fecha", "booking for march", "what are the dates?"]
+        hits = engine.keyword_features(texts)[:, booking].tolist()
+        print(f"🔎 Intención de reserva: {dict(zip(texts, hits))}")
+        assert hits == [0, 0, 0, 0, 1, 1, 1, 1]
+        assert engine.keyword_features([]).shape == (0, len(KEYWORD_GROUPS))
+        
+        print("✅ Scoring de leads correcto")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en scoring de leads: {str(e)}")
+        return False
+
+def test_lead_import():
+    """Importación JSONL/CSV: las líneas dañadas se reportan y no detienen la importación"""
+    print("\n📥 PROBANDO IMPORTACIÓN DE LEADS...")
+    
+    import tempfile
+    
+    try:
+        from src.lead_io import import_leads, export_leads
+        from src.lead_store import LeadStore
+        with tempfile.TemporaryDirectory() as data_dir:
+            store = LeadStore(os.path.join(data_dir, 'test.db'), json_path=os.path.join(data_dir, 'leads.json'))
+            path = os.path.join(data_dir, 'registro.jsonl')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('{"nombre": "Ana", "correo": "ana@example.com"}\n'
+                        '{"nombre": "Roto", "correo": \n'
+                        '\n'
+                        '["no", "es", "objeto"]\n'
+                        '{"nombre": "Sin contacto"}\n'
+                        '{"nombre": "Luis", "telefono": "+52 722 512 3413"}\n'
+                        '{"name": "Ana otra vez", "email": "ANA@example.com", "intereses": "kambo; qigong"}\n'
+                        '{"nombre": "Número", "email": 5}\n'
+                        '{"nombre": "Lista", "telefono": ["722"]}\n'
+                        '{"nombre": "Eva", "telefono": 7225550101}\n')
+            report = import_leads(path, store=store, batch_size=100)
+            print(f"⚠️ {report['errors']}")
+            assert (report['rows'], report['created'], report['merged'], report['invalid']) == (9, 3, 1, 5)
+            assert [error.split(':')[0] for error in report['errors']] == ['fila 2', 'fila 4', 'fila 5', 'fila 8', 'fila 9']
+            
+            export_path = os.path.join(data_dir, 'audiencia.csv')
+            assert export_leads(export_path, store=store)['rows'] == 3
+            again = import_leads(export_path, store=store)
+            assert again['merged'] == 3 and store.count() == 3
+        
+        print("✅ Importación de leads correcta")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en importación de leads: {str(e)}")
+        return False
+
+def test_lead_capture():
+    """Captura de leads: la cola guarda por lotes y deduplica remitentes de Messenger"""
+    print("\n📥 PROBANDO CAPTURA DE LEADS...")
+    
+    import tempfile
+    
+    try:
+        from src.activity_timeline import ActivityTimeline
+        from src.lead_capture import LeadCaptureQueue
+        from src.lead_store import LeadStore
+        with tempfile.TemporaryDirectory() as data_dir:
+            db_path = os.path.join(data_dir, 'test.db')
+            store = LeadStore(db_path, json_path=os.path.join(data_dir, 'leads.json'))
+            timeline = ActivityTimeline(os.path.join(data_dir, 'timeline'), db_path)
+            capture = LeadCaptureQueue(store, timeline, batch_size=4, flush_seconds=1)
+            
+            capture.capture('messenger', sender_id='psid-1', message='Hola', language='spanish')
+            capture.capture('messenger', sender_id='psid-1', message='¿Cuánto cuesta?', intent='price')
+            capture.capture('messenger', sender_id='psid-2', message='Info')
+            capture.capture('whatsapp', phone='5215512345678', name='Ana', message='Hola')
+            capture.capture('messenger', sender_id='psid-1', message='Gracias')
+            capture.capture('whatsapp', phone='+52 1 55 1234 5678', message='¿Qué incluye?', intent='included')
+            assert capture.flush()
+            
+            stats = capture.stats()
+            print(f"📦 {stats['written']} eventos en {stats['batches']} lotes | errores {stats['errors']}")
+            assert stats['written'] == 6 and stats['batches'] >= 2 and stats['errors'] == 0
+            
+            # Tres remitentes distintos: el id de Messenger (clave m:) identifica al prospecto
+            assert store.count() == 3, store.count()
+            lead = next(l for l in store.find(source='messenger') if l.get('messenger_id') == 'psid-1')
+            assert lead['message_count'] == 3 and lead['status'] == 'interested'
+            assert lead['language'] == 'es' and 'price' in lead['intents']
+            events = timeline.timeline(lead['id'])
+            assert [e['text'] for e in events] == ['Gracias', '¿Cuánto cuesta?', 'Hola']
+            
+            whatsapp = next(l for l in store.find(source='whatsapp'))
+            assert whatsapp['message_count'] == 2 and whatsapp['name'] == 'Ana'
+            capture.close()
+        
+        print("✅ Captura de leads correcta")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en captura de leads: {str(e)}")
+        return False
+
+def test_activity_timeline():
+    """Línea de tiempo: varios procesos escribiendo el mismo día no corrompen el índice"""
+    print("\n🗂️ PROBANDO LÍNEA DE TIEMPO DE ACTIVIDAD...")
+    
+    import multiprocessing
+    import tempfile
+    
+    try:
+        from src.activity_timeline import ActivityTimeline
+        
+        def writer(base_dir, db_path, lead_id):
+            timeline = ActivityTimeline(base_dir, db_path)
+            for i in range(500):
+                timeline.record(lead_id, 'message', {'text': f"{lead_id}-{i}-" + 'x' * (i % 40)})
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            db_path = os.path.join(data_dir, 'test.db')
+            ActivityTimeline(data_dir, db_path)
+            context = multiprocessing.get_context('fork')
+            processes = [context.Process(target=writer, args=(data_dir, db_path, lead_id)) for lead_id in range(1, 5)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            assert all(process.exitcode == 0 for process in processes)
+            
+            timeline = ActivityTimeline(data_dir, db_path)
+            for lead_id in range(1, 5):
+                events = timeline.timeline(lead_id, limit=1000)
+                assert all(e['lead_id'] == lead_id for e in events)
+                assert sorted(e['text'] for e in events) == sorted(f"{lead_id}-{i}-" + 'x' * (i % 40)
+                                                                   for i in range(500))
+            print(f"📝 4 procesos: {sum(timeline.summary(i)['message']['total'] for i in range(1, 5))} eventos legibles")
+            
+            # Un momento con zona (ej. UTC del servidor) se guarda en la hora del negocio, igual que su partición
+            import pytz
+            from datetime import datetime
+            from config.settings import TIMEZONE
+            utc_moment = pytz.utc.localize(datetime(2026, 10, 20, 0, 30))
+            local = utc_moment.astimezone(pytz.timezone(TIMEZONE)).replace(tzinfo=None)
+            timeline.record(9, 'email_open', timestamp=utc_moment.isoformat())
+            [event] = timeline.timeline(9)
+            assert event['ts'] == local.isoformat()
+            assert os.path.exists(os.path.join(data_dir, f"{local:%Y-%m-%d}.jsonl"))
+            assert timeline.peak_hours([9]) == {9: local.hour}
+        
+        print("✅ Línea de tiempo correcta")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en línea de tiempo: {str(e)}")
+        return False
+
+def test_email_batching():
+    """Valida el envío por lotes (personalizations) contra un SendGrid local de prueba"""
+    print("\n📧 PROBANDO ENVÍO DE EMAILS POR LOTES...")
+    
+    import json
+    import tempfile
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    requests_seen = []
+    emails_seen = set()
+    
+    class FakeSendGrid(BaseHTTPRequestHandler):
+        """Imita POST /v3/mail/send: 400 con errors[].field como lo devuelve SendGrid"""
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            emails = [p['to'][0]['email'] for p in body['personalizations']]
+            requests_seen.append(len(emails))
+            emails_seen.update(emails)
+            errors = [{'message': 'invalid email', 'field': f"personalizations.{i}.to.0.email"}
+                      for i, e in enumerate(emails) if e.startswith('invalid')]
+            if body['subject'] == 'Rechazado':
+                errors.append({'message': 'invalid subject', 'field': 'subject'})
+            valid = (self.path == '/v3/mail/send' and len(emails) <= 1000
+                     and all('-name-' in p['substitutions'] and '-unsubscribe_url-' in p['substitutions']
+                             for p in body['personalizations'])
+                     and 'font-family' not in body['content'][0]['value']
+                     and not errors)
+            self.send_response(202 if valid else 400)
+            self.end_headers()
+            if not valid:
+                self.wfile.write(json.dumps({'errors': errors or [{'message': 'bad request'}]}).encode())
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSendGrid)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    
+    import src.suppression as suppression_module
+    unsubscribe_secret = suppression_module.EMAIL_UNSUBSCRIBE_SECRET
+    suppression_module.EMAIL_UNSUBSCRIBE_SECRET = unsubscribe_secret or 'secreto-de-prueba'
+    
+    try:
+        from src.email_campaign import EmailCampaignManager
+        with tempfile.TemporaryDirectory() as state_dir:
+            manager = EmailCampaignManager(host=f"http://127.0.0.1:{server.server_port}",
+                                           rate_per_second=1000, daily_limit=10000,
+                                           db_path=os.path.join(state_dir, 'test.db'))
+            manager.api_key = 'test-key'
+            leads = [{'email': f"lead{i}@example.com", 'name': f"Lead {i}"} for i in range(2500)]
+            leads[1500]['email'] = 'invalid@example'
+            
+            # El template completo incluye CSS con llaves: debe compilarse sin errores
+            template = manager.create_email_template("<p>Hola {name} ({email})</p>")
+            results = manager.send_bulk_campaign(leads, "Prueba", template)
+            sent = [r for r in results if r['status'] == 'sent']
+            failed = [r for r in results if r['status'] == 'failed']
+            
+            print(f"📨 Peticiones: {len(requests_seen)} (lotes: {sorted(requests_seen, reverse=True)[:3]}...)")
+            assert len(results) == len(leads)
+            assert len(sent) == 2499 and [r['to'] for r in failed] == ['invalid@example']
+            assert max(requests_seen) == 1000
+            assert manager.remaining_today() == 10000 - 2499
+            # La cuota vive en SQLite: otra instancia (otro proceso) ve el mismo gasto
+            from src.campaign_jobs import DailyQuota
+            other = DailyQuota(10000, manager.db_path)
+            assert other.remaining() == 10000 - 2499
+            assert other.reserve(10000) == 10000 - 2499 and manager.remaining_today() == 0
+            other.release(10000 - 2499)
+            
+            # Dos procesos reanudando la misma campaña nunca toman el mismo destinatario
+            from concurrent.futures import ThreadPoolExecutor
+            from src.campaign_jobs import CampaignJobStore
+            stores = [CampaignJobStore(manager.db_path) for _ in range(4)]
+            job = stores[0].create_job("Reclamo", "<p>x</p>", leads[:400])
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                claimed = list(pool.map(lambda store: [lead['recipient'] for _ in range(10)
+                                                       for lead in store.claim(job, 15)], stores))
+            everyone = [recipient for part in claimed for recipient in part]
+            assert len(everyone) == len(set(everyone)) == 400
+            
+            # Relanzar la misma campaña no reenvía a nadie (registro por destinatario)
+            before = len(requests_seen)
+            results = manager.send_bulk_campaign(leads, "Prueba", template)
+            assert len(requests_seen) == before
+            assert sum(1 for r in results if r['status'] == 'sent') == 2499
+            
+            # Un error del mensaje (no de un destinatario) falla el lote sin dividirlo
+            before = len(requests_seen)
+            results = manager.send_bulk_campaign(leads[:100], "Rechazado", template)
+            assert len(requests_seen) == before + 1
+            assert all(r['status'] == 'failed' for r in results)
+            
+            # Baja por el link del footer y rebote por el webhook: no vuelven a recibir emails
+            from flask import Flask
+            from src.email_events import EmailEventStore
+            from src.suppression import SuppressionList, unsubscribe_blueprint
+            app = Flask(__name__)
+            app.register_blueprint(unsubscribe_blueprint(manager.suppression))
+            unsubscribe_url = SuppressionList.unsubscribe_url('lead0@example.com')
+            unsubscribe_path = unsubscribe_url.split('5000', 1)[-1]
+            # GET solo muestra la confirmación; la baja es el POST (botón o one-click RFC 8058)
+            page = app.test_client().get(unsubscribe_path)
+            assert page.status_code == 200 and b'method="post"' in page.data
+            assert not manager.suppression.is_suppressed('lead0@example.com')
+            assert app.test_client().post(unsubscribe_path, data={'List-Unsubscribe': 'One-Click'}).status_code == 200
+            assert app.test_client().get('/email/unsubscribe?email=lead2@example.com&token=x').status_code == 400
+            # Sin secreto propio no se firman links ni se aceptan bajas
+            suppression_module.EMAIL_UNSUBSCRIBE_SECRET = None
+            assert SuppressionList.unsubscribe_url('lead2@example.com') == ''
+            assert app.test_client().post(unsubscribe_path).status_code == 503
+            suppression_module.EMAIL_UNSUBSCRIBE_SECRET = unsubscribe_secret or 'secreto-de-prueba'
+            # El webhook corre en otro proceso con su propia lista: el envío debe ver el rebote
+            EmailEventStore(manager.db_path, suppression=SuppressionList(manager.db_path)).ingest(
+                [{'email': 'lead1@example.com', 'event': 'bounce', 'sg_event_id': 'b1'}])
+            
+            emails_seen.clear()
+            results = manager.send_bulk_campaign(leads, "Prueba 2", template)
+            suppressed = [r['to'] for r in results if r['status'] == 'suppressed']
+            assert sorted(suppressed) == ['lead0@example.com', 'lead1@example.com']
+            assert not emails_seen & set(suppressed) and 'lead2@example.com' in emails_seen
+        
+        print("✅ Envío por lotes correcto")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en envío por lotes: {str(e)}")
+        return False
+    finally:
+        server.shutdown()
+        suppression_module.EMAIL_UNSUBSCRIBE_SECRET = unsubscribe_secret
+
+def test_email_events():
+    """Envía lotes sintéticos de eventos de SendGrid al webhook y valida los contadores"""
+    print("\n📈 PROBANDO EVENTOS DE EMAIL...")
+    
+    import tempfile
+    from flask import Flask
+    
+    try:
+        from src.activity_timeline import ActivityTimeline
+        from src.email_events import EmailEventStore, email_events_blueprint, synthetic_events, format_campaign_stats
+        with tempfile.TemporaryDirectory() as data_dir:
+            db_path = os.path.join(data_dir, 'test.db')
+            timeline = ActivityTimeline(base_dir=os.path.join(data_dir, 'timeline'), db_path=db_path)
+            store = EmailEventStore(db_path, timeline=timeline)
+            app = Flask(__name__)
+            app.register_blueprint(email_events_blueprint(store, token='secreto'))
+            client = app.test_client()
+            
+            recipients = [(f"lead:{i}", f"lead{i}@example.com") for i in range(1, 2001)]
+            events = synthetic_events('campana-prueba', recipients, seed=7)
+            batches = [events[i:i + 500] for i in range(0, len(events), 500)]
+            for batch in batches:
+                response = client.post('/email/events?token=secreto', json=batch)
+                assert response.status_code == 200
+            # SendGrid reintenta lotes: los eventos repetidos no cuentan dos veces
+            assert client.post('/email/events?token=secreto', json=batches[0]).get_json()['duplicates'] == len(batches[0])
+            assert client.post('/email/events', json=batches[0]).status_code == 401
+            # Sin token configurado el endpoint no acepta eventos; basura en la lista no rompe el lote
+            unconfigured = Flask(__name__)
+            unconfigured.register_blueprint(email_events_blueprint(store, token=''))
+            assert unconfigured.test_client().post('/email/events', json=batches[0]).status_code == 503
+            assert client.post('/email/events?token=secreto', json=["x", 1, None, batches[0][0]]).status_code == 200
+            
+            stats = store.campaign_stats('campana-prueba')
+            print(f"📊 {format_campaign_stats(stats)}")
+            opened = {e['recipient'] for e in events if e['event'] == 'open'}
+            assert stats['open'] == sum(1 for e in events if e['event'] == 'open')
+            assert stats['unique_open'] == len(opened)
+            assert stats['open_rate'] == round(len(opened) * 100 / stats['unique_delivered'], 1)
+            
+            lead_id = int(next(iter(opened)).split(':')[1])
+            assert store.lead_stats(lead_id)['open']['total'] >= 1
+            assert timeline.timeline(lead_id, event_types=['email_open'])
+        
+        print("✅ Eventos de email correctos")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en eventos de email: {str(e)}")
+        return False
+
+def test_send_budget():
+    """Ritmo de la cola de emails: el día de la cuota sigue a TIMEZONE aunque el servidor esté en UTC"""
+    print("\n⏱️ PROBANDO RITMO DE ENVÍO...")
+    
+    import tempfile
+    from datetime import datetime
+    import pytz
+    
+    try:
+        from config.settings import TIMEZONE
+        from src.campaign_jobs import quota_day
+        from src.email_campaign import EmailCampaignManager
+        from src.send_scheduler import SendScheduler
+        with tempfile.TemporaryDirectory() as data_dir:
+            manager = EmailCampaignManager(daily_limit=100, db_path=os.path.join(data_dir, 'test.db'))
+            scheduler = SendScheduler(manager, windows='09:00-12:00,16:00-19:00', tick_minutes=10)
+            
+            # 00:30 UTC es aún el día anterior en México: la cuota de ese día sigue casi gastada
+            utc_moment = pytz.utc.localize(datetime(2026, 10, 20, 0, 30))
+            local = utc_moment.astimezone(pytz.timezone(TIMEZONE)).replace(tzinfo=None)
+            assert quota_day(utc_moment) == quota_day(local) == local.strftime('%Y-%m-%d')
+            evening = local.replace(hour=18, minute=30)
+            manager.quota.add(90, day=quota_day(evening))
+            print(f"🕕 {utc_moment:%Y-%m-%d %H:%M} UTC = {local:%Y-%m-%d %H:%M} ({TIMEZONE})")
+            assert scheduler.budget(evening) == 4      # 10 restantes entre 3 turnos
+            # La mañana siguiente empieza con la cuota completa repartida en 36 turnos
+            morning = evening.replace(day=evening.day + 1, hour=9, minute=0)
+            assert scheduler.budget(morning) == 3
+        
+        print("✅ Ritmo de envío correcto")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en ritmo de envío: {str(e)}")
+        return False
+
+def test_state_store():
+    """Estado durable: snapshot + registro se recuperan tras una caída a mitad de escritura"""
+    print("\n💾 PROBANDO ESTADO DURABLE...")
+    
+    import json
+    import shutil
+    import tempfile
+    
+    try:
+        from src.state_store import DurableState
+        with tempfile.TemporaryDirectory() as state_dir:
+            state = DurableState('prueba', defaults={'enviados': 0, 'campañas': []},
+                                 state_dir=state_dir, checkpoint_ops=1000)
+            state.incr('enviados', 5)
+            state.append('campañas', {'id': 1, 'status': 'sending'})
+            state.checkpoint()
+            
+            # Operaciones posteriores al snapshot: solo quedan en el registro
+            state.incr('enviados', 3)
+            state.update_item('campañas', 0, {'status': 'sent'})
+            state.set('ultima', 'newsletter')
+            expected = json.loads(json.dumps(state.data))
+            
+            # Caída: sin close() y con la última línea del registro a medio escribir
+            state._log.write('{"op": "incr", "key": "enviados", "val')
+            state._log.close()
+            
+            restored = DurableState('prueba', state_dir=state_dir, checkpoint_ops=1000)
+            assert restored.data == expected, restored.data
+            assert restored.seq == 5
+            assert os.path.getsize(restored.log_path) == 0   # el registro reaplicado se compacta
+            
+            # Caída entre escribir el snapshot y vaciar el registro: nada se aplica dos veces
+            restored.incr('enviados')
+            log_copy = f"{restored.log_path}.copia"
+            shutil.copy(restored.log_path, log_copy)
+            restored.checkpoint()
+            restored._log.close()
+            shutil.copy(log_copy, restored.log_path)
+            
+            again = DurableState('prueba', state_dir=state_dir, checkpoint_ops=1000)
+            assert again.get('enviados') == 9, again.get('enviados')
+            assert again.seq == 6
+            again.close()
+        
+        print("✅ Estado durable correcto")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en estado durable: {str(e)}")
+        return False
+
+def test_graph_api():
+    """Graph API local de prueba: versión, fotos, errores, timeout, carrusel de Instagram y batch"""
+    print("\n📘 PROBANDO CLIENTE DE LA GRAPH API...")
+    
+    import asyncio
+    import json
+    import tempfile
+    import time
+    from aiohttp import web
+    
+    try:
+        from src.graph_api import GraphAPIClient, GraphAuthError, GraphTransientError
+        
+        async def run():
+            seen = []
+            
+            async def feed(request):
+                form = await request.post()
+                seen.append((request.path, request.query.get('access_token'), 'source' in form))
+                if request.query.get('access_token') == 'expired':
+                    return web.json_response({'error': {'message': 'Session has expired', 'type': 'OAuthException',
+                                                        'code': 190}}, status=400)
+                if form.get('message') == 'lento':
+                    await asyncio.sleep(1)
+                if request.path.endswith('/photos'):
+                    return web.json_response({'id': 'photo1', 'post_id': 'page_post1'})
+                return web.json_response({'id': 'page_post2'})
+            
+            # Instagram: cada contenedor queda IN_PROGRESS durante 2 consultas; publicar antes falla
+            containers = {}
+            
+            async def create_container(request):
+                form = await request.post()
+                container_id = f"c{len(containers) + 1}"
+                children = form.get('children', '').split(',') if form.get('children') else []
+                assert all(containers[child]['polls'] >= 2 for child in children)
+                containers[container_id] = {'polls': 0, 'children': children,
+                                            'item': form.get('is_carousel_item') == 'true'}
+                return web.json_response({'id': container_id})
+            
+            async def container_status(request):
+                container = containers[request.match_info['container']]
+                container['polls'] += 1
+                return web.json_response({'status_code': 'FINISHED' if container['polls'] > 2 else 'IN_PROGRESS'})
+            
+            async def media_publish(request):
+                container = containers[(await request.post())['creation_id']]
+                if container['polls'] <= 2:
+                    return web.json_response({'error': {'message': 'Media ID is not available', 'code': 9007}},
+                                             status=400)
+                return web.json_response({'id': 'ig_post1'})
+            
+            # Batch: resuelve {result=nombre:$.data.*.id} y responde una entrada por operación
+            batch_calls = []
+            
+            async def batch(request):
+                operations = json.loads((await request.post())['batch'])
+                batch_calls.append(len(operations))
+                if any('caida' in (op.get('body') or '') for op in operations):
+                    return web.json_response({'error': {'message': 'Service unavailable', 'code': 2}}, status=503)
+                named, responses = {}, []
+                for op in operations:
+                    url = op['relative_url']
+                    for name, body in named.items():
+                        url = url.replace(f"{{result={name}:$.data.*.id}}", ','.join(p['id'] for p in body['data']))
+                    if url.startswith('borrado'):
+                        responses.append({'code': 400, 'body': json.dumps({'error': {'message': 'Unsupported get request',
+                                                                                     'code': 100}})})
+                        continue
+                    if '/posts' in url:
+                        body = {'data': [{'id': f"page_p{i}"} for i in range(3)]}
+                    elif url.startswith('?ids='):
+                        body = {i: {'id': i, 'insights': {'data': [{'name': 'post_clicks', 'values': [{'value': 7}]}]}}
+                                for i in url[5:].split('&')[0].split(',')}
+                    elif '/insights' in url:
+                        body = {'data': [{'name': 'post_clicks', 'values': [{'value': 1}, {'value': 5}]}]}
+                    else:
+                        body = {'id': f"page_post{len(responses)}"}
+                    if op.get('name'):
+                        named[op['name']] = body
+                    responses.append({'code': 200, 'body': json.dumps(body)})
+                return web.json_response(responses)
+            
+            app = web.Application()
+            app.router.add_post('/{version}/', batch)
+            app.router.add_post('/{version}/ig/media', create_container)
+            app.router.add_post('/{version}/ig/media_publish', media_publish)
+            app.router.add_get('/{version}/{container}', container_status)
+            app.router.add_post('/{version}/{page}/{edge}', feed)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            
+            async with GraphAPIClient('token', version='v99.0', base_url=f"http://127.0.0.1:{port}",
+                                      timeout=0.5, poll_seconds=0.05) as client:
+                assert (await client.publish_page_post('hola', page_id='123'))['post_id'] == 'page_post2'
+                with tempfile.NamedTemporaryFile(suffix='.png') as image:
+                    image.write(b'png')
+                    image.flush()
+                    result = await client.publish_page_post('con foto', image_path=image.name)
+                assert result == {'post_id': 'page_post1', 'has_image': True}
+                assert seen == [('/v99.0/123/feed', 'token', False), ('/v99.0/me/photos', 'token', True)]
+                
+                for message, token, expected in (('hola', 'expired', GraphAuthError), ('lento', None, GraphTransientError)):
+                    try:
+                        await client.publish_page_post(message, access_token=token)
+                        raise AssertionError(f"se esperaba {expected.__name__}")
+                    except expected as e:
+                        print(f"⚠️ {type(e).__name__}: {e}")
+                
+                started = time.perf_counter()
+                urls = [f"https://example.com/{i}.jpg" for i in range(3)]
+                result = await client.publish_instagram_post('ig', 'Carrusel', urls)
+                elapsed = time.perf_counter() - started
+                print(f"📸 Carrusel {result['post_id']}: {len(result['children'])} imágenes en {elapsed:.2f}s")
+                assert result['post_id'] == 'ig_post1' and len(result['children']) == 3
+                assert all(containers[child]['item'] for child in result['children'])
+                
+                # 120 posts: 3 llamadas batch en lugar de 120; el post con error no tumba a los demás
+                post_ids = [f"page_p{i}" for i in range(119)] + ['borrado1']
+                insights = await client.post_insights(post_ids, ['post_clicks'])
+                published = await client.publish_page_posts([{'message': f"Día {i}"} for i in range(60)])
+                recent = await client.recent_post_insights('me', ['post_clicks'])
+                print(f"📦 Batch: {len(batch_calls)} llamadas para {sum(batch_calls)} operaciones")
+                assert sorted(batch_calls) == [2, 10, 20, 50, 50, 50]
+                assert len(insights) == 119 and insights['page_p0'] == {'post_clicks': 5}
+                assert len(published) == 60 and all('post_id' in p for p in published)
+                assert recent == {f"page_p{i}": {'post_clicks': 7} for i in range(3)}
+                
+                # Un 5xx de la llamada completa: las escrituras quedan sin confirmar (no 'fallidas')
+                lost = await client.publish_page_posts([{'message': 'caida'}])
+                assert lost[0]['unconfirmed'] and isinstance(lost[0]['error'], GraphTransientError)
+            await runner.cleanup()
+        
+        asyncio.run(run())
+        print("✅ Cliente de la Graph API correcto")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en cliente de la Graph API: {str(e)}")
+        return False
+
+def test_publish_queue():
+    """Cola de publicación: un timeout que sí publicó no genera un segundo post"""
+    print("\n📤 PROBANDO COLA DE PUBLICACIÓN...")
+    
+    import asyncio
+    import tempfile
+    from aiohttp import web
+    
+    try:
+        from src.graph_api import GraphAPIClient
+        from src.publish_queue import PublishQueue
+        
+        async def run(db_path):
+            posts = []
+            
+            async def publish(request):
+                form = await request.post()
+                posts.append({'id': f"page_post{len(posts) + 1}", 'message': form['message']})
+                if len(posts) == 1:
+                    await asyncio.sleep(1)   # Meta publica pero la respuesta no llega a tiempo
+                return web.json_response({'id': posts[-1]['id']})
+            
+            async def feed(request):
+                return web.json_response({'data': posts})
+            
+            app = web.Application()
+            app.router.add_post('/v18.0/me/feed', publish)
+            app.router.add_get('/v18.0/me/feed', feed)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            
+            notified = []
+            done = asyncio.Event()
+            
+            async def notifier(job):
+                notified.append(job)
+                done.set()
+            
+            async with GraphAPIClient('token', version='v18.0', base_url=f"http://127.0.0.1:{port}",
+                                      timeout=0.3) as client:
+                queue = PublishQueue(db_path, access_token='token', retry_seconds=0.05, poll_seconds=0.05,
+                                     notifier=notifier, client=client)
+                job, created = queue.enqueue('Retiro 11 de enero 🌿', notify_chat_id=42)
+                assert created and not queue.enqueue('Retiro 11 de enero 🌿')[1]
+                await queue.start()
+                await asyncio.wait_for(done.wait(), timeout=10)
+                await queue.stop()
+            await runner.cleanup()
+            
+            job = queue.get(job['job_id'])
+            print(f"📨 Intentos: {job['attempts']} | posts en la página: {len(posts)} | post_id: {job['post_id']}")
+            assert job['status'] == 'published' and job['post_id'] == 'page_post1'
+            assert len(posts) == 1 and notified[0]['notify_chat_id'] == '42'
+            
+            # El mismo contenido otra vez devuelve el trabajo publicado
+            again, created = queue.enqueue('Retiro 11 de enero 🌿')
+            assert not created and again['post_id'] == 'page_post1'
+            
+            # Un error inesperado no deja el trabajo en 'publishing' y un notifier roto no cambia el resultado
+            class FlakyClient:
+                def __init__(self):
+                    self.calls = 0
+                
+                async def publish_page_post(self, message, **kwargs):
+                    self.calls += 1
+                    if self.calls == 1:
+                        raise RuntimeError("respuesta inesperada")
+                    return {'post_id': 'page_post9'}
+                
+                async def get(self, path, params=None, **kwargs):
+                    return {'data': []}
+            
+            async def broken_notifier(job):
+                raise ValueError("Telegram caído")
+            
+            flaky = PublishQueue(db_path, access_token='token', retry_seconds=0, notifier=broken_notifier,
+                                 client=FlakyClient())
+            job, _ = flaky.enqueue('Otro anuncio')
+            job = await flaky.process(flaky.claim())
+            assert job['status'] == 'queued' and job['uncertain']
+            job = await flaky.process(flaky.claim())
+            assert job['status'] == 'published' and job['post_id'] == 'page_post9'
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            asyncio.run(run(os.path.join(data_dir, 'test.db')))
+        print("✅ Cola de publicación correcta")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en cola de publicación: {str(e)}")
+        return False
+
+def test_post_scheduler():
+    """Posts programados: salen a su hora, se reprograman/cancelan y sobreviven un reinicio"""
+    print("\n📅 PROBANDO POSTS PROGRAMADOS...")
+    
+    import tempfile
+    import time
+    from datetime import timedelta
+    
+    class RecordingPublisher:
+        """Publicador de prueba: registra qué se publicó y cuándo"""
+        def __init__(self):
+            self.published = []
+        
+        def post_to_facebook(self, message, link=None, image_url=None):
+            self.published.append((message, time.monotonic()))
+            return {'post_id': f"fb_{len(self.published)}"}
+        
+        def post_to_instagram(self, caption, image_url=None):
+            self.published.append((caption, time.monotonic()))
+            return {'post_id': f"ig_{len(self.published)}"}
+    
+    try:
+        from src.post_scheduler import PostScheduler, format_scheduled_post
+        with tempfile.TemporaryDirectory() as data_dir:
+            db_path = os.path.join(data_dir, 'test.db')
+            publisher = RecordingPublisher()
+            scheduler = PostScheduler(db_path, manager=publisher)
+            scheduler.start()
+            now, started = scheduler.now(), time.monotonic()
+            first = scheduler.schedule('facebook', 'segundo', now + timedelta(seconds=0.4))
+            scheduler.schedule('instagram', 'primero', now + timedelta(seconds=0.2), 'https://example.com/a.jpg')
+            cancelled = scheduler.schedule('facebook', 'cancelado', now + timedelta(seconds=0.3))
+            moved = scheduler.schedule('facebook', 'tercero', now + timedelta(hours=5))
+            assert scheduler.cancel(cancelled['id'])
+            assert scheduler.reschedule(moved['id'], now + timedelta(seconds=0.6))
+            for post in scheduler.upcoming():
+                print(f"   {format_scheduled_post(post)}")
+            
+            deadline = time.time() + 5
+            while len(publisher.published) < 3 and time.time() < deadline:
+                time.sleep(0.05)
+            time.sleep(0.2)
+            scheduler.stop()
+            
+            order = [message for message, _ in publisher.published]
+            lateness = max(at - started - offset for (_, at), offset in zip(publisher.published, (0.2, 0.4, 0.6)))
+            print(f"📤 Publicados: {order} (retraso máximo {lateness:.2f}s)")
+            assert order == ['primero', 'segundo', 'tercero'] and lateness < 1
+            assert scheduler.get(cancelled['id'])['status'] == 'cancelled'
+            assert scheduler.get(first['id'])['post_id'] == 'fb_2'
+            
+            # Reinicio: lo programado con el despachador apagado sale al arrancar otro proceso;
+            # lo que venció hace más del margen se marca como perdido
+            pending = scheduler.schedule('facebook', 'tras reinicio', scheduler.now() + timedelta(seconds=0.2))
+            stale = scheduler.schedule('facebook', 'vencido', scheduler.now() - timedelta(hours=3))
+            restarted = PostScheduler(db_path, manager=publisher, max_wait_seconds=0.2)
+            restarted.start()
+            deadline = time.time() + 5
+            while restarted.get(pending['id'])['status'] != 'published' and time.time() < deadline:
+                time.sleep(0.05)
+            assert restarted.get(pending['id'])['status'] == 'published'
+            assert restarted.get(stale['id'])['status'] == 'missed'
+            
+            # Otro proceso (sin despachador propio) programa en la misma base: el despachador lo publica
+            other = PostScheduler(db_path, manager=publisher)
+            remote = other.schedule('facebook', 'desde otro proceso', other.now() + timedelta(seconds=0.3))
+            deadline = time.time() + 5
+            while restarted.get(remote['id'])['status'] != 'published' and time.time() < deadline:
+                time.sleep(0.05)
+            restarted.stop()
+            assert restarted.get(remote['id'])['status'] == 'published'
+        
+        print("✅ Posts programados correctos")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en posts programados: {str(e)}")
+        return False
+
+def test_insights_sync():
+    """Métricas de redes: sincronización incremental (since + ETag) y consultas locales"""
+    print("\n📊 PROBANDO SINCRONIZACIÓN DE MÉTRICAS...")
+    
+    import asyncio
+    import hashlib
+    import json
+    import tempfile
+    from datetime import datetime, timedelta, timezone
+    from urllib.parse import parse_qs, urlsplit
+    from aiohttp import web
+    
+    try:
+        from src.graph_api import GraphAPIClient
+        from src.insights_sync import InsightsStore, format_insights_report
+        
+        def graph_time(hours_ago):
+            return (datetime.now(timezone.utc) - timedelta(hours=hours_ago)).strftime('%Y-%m-%dT%H:%M:%S+0000')
+        
+        posts = {'page': [{'id': 'fb1', 'message': 'Retiro de enero', 'created_time': graph_time(30)},
+                          {'id': 'fb2', 'message': 'Qué es el Kambo', 'created_time': graph_time(5)}],
+                 'ig': [{'id': 'ig1', 'caption': 'Valle de Bravo', 'timestamp': graph_time(10)}]}
+        metrics = {'fb1': {'post_impressions': 900, 'post_engaged_users': 40},
+                   'fb2': {'post_impressions': 300, 'post_engaged_users': 12},
+                   'ig1': {'impressions': 500, 'reach': 420, 'engagement': 55}}
+        listings, served = [], []
+        
+        # Batch con ETags: una operación con If-None-Match igual al ETag actual responde 304 sin cuerpo
+        async def batch(request):
+            form = await request.post()
+            assert form['include_headers'] == 'true'
+            responses = []
+            for op in json.loads(form['batch']):
+                url = urlsplit(op['relative_url'])
+                account, edge = url.path.split('/')
+                if edge == 'insights':
+                    names = parse_qs(url.query)['metric'][0].split(',')
+                    body = {'data': [{'name': name, 'values': [{'value': metrics[account][name]}]}
+                                     for name in names if name in metrics[account]]}
+                else:
+                    since = int(parse_qs(url.query)['since'][0])
+                    listings.append(since)
+                    field = 'created_time' if edge == 'posts' else 'timestamp'
+                    body = {'data': [p for p in posts[account] if datetime.strptime(
+                        p[field], '%Y-%m-%dT%H:%M:%S%z').timestamp() >= since]}
+                etag = '"' + hashlib.md5(json.dumps(body, sort_keys=True).encode()).hexdigest() + '"'
+                sent = {h['name']: h['value'] for h in op.get('headers', [])}.get('If-None-Match')
+                if sent == etag:
+                    responses.append({'code': 304, 'headers': [{'name': 'ETag', 'value': etag}], 'body': None})
+                    continue
+                served.append(op['relative_url'])
+                responses.append({'code': 200, 'headers': [{'name': 'ETag', 'value': etag}], 'body': json.dumps(body)})
+            return web.json_response(responses)
+        
+        async def run(db_path):
+            app = web.Application()
+            app.router.add_post('/{version}/', batch)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            
+            async with GraphAPIClient('token', version='v18.0', base_url=f"http://127.0.0.1:{port}") as client:
+                store = InsightsStore(db_path, access_token='token', page_id='page', ig_user_id='ig', client=client)
+                first = await store.sync()
+                assert first['facebook'] == {'new_posts': 2, 'updated': 2, 'unchanged': 0, 'points': 4}
+                assert first['instagram']['new_posts'] == 1 and first['instagram']['points'] == 3
+                
+                # Sin cambios: las métricas responden 304 y no se agregan puntos
+                served.clear()
+                second = await store.sync()
+                assert not any('/insights' in url for url in served)
+                assert second['facebook'] == {'new_posts': 0, 'updated': 0, 'unchanged': 2, 'points': 0}
+                
+                # Un post nuevo y una métrica que cambió: solo eso viaja con cuerpo
+                posts['page'].append({'id': 'fb3', 'message': 'Testimonios', 'created_time': graph_time(1)})
+                metrics['fb3'] = {'post_impressions': 2000, 'post_engaged_users': 150}
+                metrics['fb1']['post_engaged_users'] = 65
+                served.clear()
+                third = await store.sync()
+                print(f"🔄 Sincronizaciones: {first['facebook']} → {second['facebook']} → {third['facebook']}")
+                assert third['facebook'] == {'new_posts': 1, 'updated': 2, 'unchanged': 1, 'points': 3}
+                assert sorted(url.split('/')[0] for url in served) == ['fb1', 'fb3', 'page']
+            await runner.cleanup()
+            
+            # El cursor avanza a la fecha del post más nuevo
+            newest = int(datetime.strptime(posts['page'][1]['created_time'], '%Y-%m-%dT%H:%M:%S%z').timestamp())
+            assert listings[2] == newest
+            assert [v for _, v in store.history('facebook', 'fb1', 'post_engaged_users')] == [40, 65]
+            totals = store.totals(days=7)
+            assert totals['facebook'] == {'posts': 3, 'post_impressions': 3200, 'post_engaged_users': 227}
+            assert [p['post_id'] for p in store.top_posts(days=7, limit=3)] == ['fb3', 'fb1', 'ig1']
+            print(format_insights_report(store, days=7))
+        
+        with tempfile.TemporaryDirectory() as data_dir:
+            asyncio.run(run(os.path.join(data_dir, 'test.db')))
+        print("✅ Sincronización de métricas correcta")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en sincronización de métricas: {str(e)}")
+        return False
+
 def show_usage_examples():
     """Muestra ejemplos de uso"""
     print("\n📱 EJEMPLOS DE USO EN TELEGRAM:")
@@ -153,7 +1170,22 @@ def main():
         "image_generator": test_image_generator(), 
         "campaign_manager": test_campaign_manager(),
         "daily_content": test_daily_content(),
-        "facebook_config": test_facebook_integration()
+        "facebook_config": test_facebook_integration(),
+        "conversation_memory": test_conversation_memory(),
+        "embedding_cache": test_embedding_cache(),
+        "lead_store": test_lead_store(),
+        "lead_scoring": test_lead_scoring(),
+        "lead_import": test_lead_import(),
+        "lead_capture": test_lead_capture(),
+        "activity_timeline": test_activity_timeline(),
+        "email_batching": test_email_batching(),
+        "email_events": test_email_events(),
+        "send_budget": test_send_budget(),
+        "state_store": test_state_store(),
+        "graph_api": test_graph_api(),
+        "publish_queue": test_publish_queue(),
+        "post_scheduler": test_post_scheduler(),
+        "insights_sync": test_insights_sync()
     }
     
     print("\n" + "=" * 50)
@@ -164,9 +1196,9 @@ def main():
         print(f"{status_emoji} {component.replace('_', ' ').title()}")
     
     total_working = sum(results.values())
-    print(f"\n🎯 {total_working}/5 componentes funcionando")
+    print(f"\n🎯 {total_working}/{len(results)} componentes funcionando")
     
-    if total_working >= 4:
+    if total_working >= len(results) - 1:
         print("🎉 Sistema prácticamente listo!")
         if not results["facebook_config"]:
             print("💡 Solo falta agregar FACEBOOK_PAGE_ACCESS_TOKEN a Railway")